@@ -1,7 +1,13 @@
+import os
+import sys
 from essentia.standard import MonoLoader, FrameGenerator, Windowing, Spectrum, SpectralPeaks, HPCP
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import gate   # silent / near-silent frames are skipped
+import pcp    # --batched: the whole chain over blocks of frames in numpy
+
 audio_path = "/data/My_Song.mp3"
 output_image = "/data/hpcp.png"
 
@@ -9,6 +15,7 @@ sr = 44100
 frame_size = 4096
 hop_size = 2048
 hpcp_size = 36
+BATCHED = "--batched" in sys.argv
 
 loader = MonoLoader(filename=audio_path, sampleRate=sr)
 audio = loader()
@@ -20,12 +27,21 @@ peaks = SpectralPeaks(sampleRate=sr, magnitudeThreshold=1e-6, minFrequency=20, m
 
 accum = np.zeros(hpcp_size, dtype=float)
 
-for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True):
-    w = window(frame)
-    spec = spectrum(w)
-    magFreqs, magVals = peaks(spec)
-    if len(magFreqs) > 0:
-        accum += hpcp(magFreqs, magVals)
+active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True)
+gate.report(active, hop_size, sr)
+
+if BATCHED:
+    accum += pcp.hpcp_frames(audio, sr, frame_size, hop_size, hpcp_size, magnitude_threshold=1e-6,
+                             min_frequency=20, max_frequency=5000, active=active).sum(axis=0)
+else:
+    for i, frame in enumerate(FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)):
+        if not active[i]:
+            continue
+        w = window(frame)
+        spec = spectrum(w)
+        magFreqs, magVals = peaks(spec)
+        if len(magFreqs) > 0:
+            accum += hpcp(magFreqs, magVals)
 
 if accum.sum() > 0:
     accum = accum / np.max(accum)
@@ -1,3 +1,5 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from essentia.standard import (
@@ -9,12 +11,18 @@ from essentia.standard import (
     TuningFrequency
 )
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import presets   # --preset fast|balanced|accurate (see tools/param_sweep.py)
+import gate      # silent / near-silent frames do not vote
+
+settings = presets.settings("tuning", {"sr": 44100, "frame_size": 4096, "hop_size": 2048, "gate_db": gate.GATE_DB})
+
 print("Loading audio...")
-audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=settings["sr"])()
 
 window = Windowing(type='hann')
 spectrum = Spectrum()
-peaks = SpectralPeaks()
+peaks = SpectralPeaks(sampleRate=settings["sr"])
 tuning = TuningFrequency()
 
 tuning_hz_list = []
@@ -22,7 +30,13 @@ tuning_cents_list = []
 
 print("Estimating tuning frequency...")
 
-for frame in FrameGenerator(audio, frameSize=4096, hopSize=2048):
+active = gate.active_frames(audio, settings["frame_size"], settings["hop_size"], threshold_db=settings["gate_db"])
+gate.report(active, settings["hop_size"], settings["sr"])
+
+for i, frame in enumerate(FrameGenerator(audio, frameSize=settings["frame_size"], hopSize=settings["hop_size"])):
+    if not active[i]:
+        continue
+
     mag_spectrum = spectrum(window(frame))
 
     # Extract peaks
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from essentia.standard import MonoLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import ssm
+
+# -------------------------------------------------------
+# Structural novelty (Foote 2000): self-similarity of
+# normalised frame features correlated with a Gaussian-tapered
+# checkerboard kernel along the diagonal; novelty peaks are
+# taken as section boundaries
+# -------------------------------------------------------
+
+FEATURE = "hpcp"             # "hpcp", "mfcc" or "spectrum"
+FRAME_RATE = 10.0            # feature frames per second
+KERNEL_SIZES = (64, 128)     # checkerboard half sizes in frames (6.4 s, 12.8 s)
+MIN_DISTANCE_S = 8.0         # minimum distance between two boundaries
+
+print("Loading audio...")
+audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+
+print(f"Computing {FEATURE} frames at {FRAME_RATE:g} Hz...")
+X = ssm.feature_frames(audio, 44100, kind=FEATURE, frame_rate=FRAME_RATE)
+
+print(f"Computing checkerboard novelty (kernels {KERNEL_SIZES})...")
+t0 = time.perf_counter()
+result = ssm.foote_novelty(X, kernel_sizes=KERNEL_SIZES)
+boundaries = ssm.peak_boundaries(result["novelty"], FRAME_RATE, min_distance_s=MIN_DISTANCE_S)
+elapsed_ms = 1000 * (time.perf_counter() - t0)
+
+times = np.arange(len(X)) / FRAME_RATE
+print(f"{len(X)} frames in {elapsed_ms:.1f} ms")
+print("Section boundaries (s):", ", ".join(f"{b:.1f}" for b in boundaries) or "none")
+
+# --- Save JSON ---
+data = {
+    "feature": FEATURE,
+    "frame_rate": FRAME_RATE,
+    "kernel_sizes": list(KERNEL_SIZES),
+    "boundaries": boundaries.tolist(),
+    "novelty": result["novelty"].tolist(),
+    "analysis_ms": elapsed_ms,
+}
+with open("/data/structure_novelty.json", "w") as f:
+    json.dump(data, f, indent=4)
+
+print("Saved structure_novelty.json")
+
+# --- Plot ---
+# only the band of the self-similarity the largest kernel looks at
+width = 2 * max(KERNEL_SIZES)
+band = ssm.banded_similarity(X, width)
+
+fig, ax = plt.subplots(2, 1, figsize=(14, 8), sharex=True,
+                       gridspec_kw={"height_ratios": [1, 1]})
+
+ax[0].imshow(band.T, origin="lower", aspect="auto", cmap="viridis",
+             extent=[times[0], times[-1] if len(times) > 1 else 1.0, 0, width / FRAME_RATE])
+ax[0].set_ylabel("Lag (s)")
+ax[0].set_title(f"Self-similarity band ({FEATURE})")
+
+for k, curve in result["curves"].items():
+    peak = curve.max() if curve.max() > 0 else 1.0
+    ax[1].plot(times, curve / peak, linewidth=0.8, alpha=0.6, label=f"kernel {k / FRAME_RATE:g} s")
+ax[1].plot(times, result["novelty"], color="black", linewidth=1.2, label="combined")
+for b in boundaries:
+    ax[0].axvline(b, color="red", linestyle="--", linewidth=0.8)
+    ax[1].axvline(b, color="red", linestyle="--", linewidth=0.8)
+ax[1].set_xlabel("Time (s)")
+ax[1].set_ylabel("Novelty")
+ax[1].legend(loc="upper right")
+ax[1].grid(True)
+
+plt.tight_layout()
+plt.savefig("/data/structure_novelty.png", dpi=200)
+
+print("Saved structure_novelty.png")
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from essentia.standard import MonoLoader, MonoWriter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import repetition
+import ssm
+
+# -------------------------------------------------------
+# Repeated sections (chorus, loops) from key-invariant HPCP
+# matching: LSH nearest neighbours of stacked HPCP frames,
+# runs along constant lag in the time-lag plane, and the most
+# repeated passage written out as a preview clip
+# -------------------------------------------------------
+
+FRAME_RATE = 10.0            # HPCP frames per second
+THUMBNAIL_S = 20.0           # preview clip length
+KEY_INVARIANT = True         # also match repeats in another key
+
+print("Loading audio...")
+audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+
+print(f"Computing HPCP frames at {FRAME_RATE:g} Hz...")
+X = ssm.feature_frames(audio, 44100, kind="hpcp", frame_rate=FRAME_RATE)
+
+print("Matching repeated frames...")
+t0 = time.perf_counter()
+result = repetition.repetitions(X, FRAME_RATE, key_invariant=KEY_INVARIANT, thumbnail_s=THUMBNAIL_S)
+elapsed_ms = 1000 * (time.perf_counter() - t0)
+
+segments = result["segments"]
+thumb = result["thumbnail"]
+print(f"{len(X)} frames, {len(result['time_lag']['time'])} matches in {elapsed_ms:.1f} ms")
+print("Repeated segments:")
+for seg in segments[:10]:
+    print(f"  {seg['start']:7.1f} - {seg['end']:7.1f} s  repeats at +{seg['lag']:.1f} s"
+          f"  (shift {seg['shift']}, sim {seg['similarity']:.2f})")
+
+# --- Preview clip ---
+if thumb is not None:
+    print(f"Thumbnail: {thumb['start']:.1f} - {thumb['end']:.1f} s ({thumb['repeats']} occurrences)")
+    clip = audio[int(thumb["start"] * 44100):int(thumb["end"] * 44100)]
+    MonoWriter(filename="/data/thumbnail.wav", sampleRate=44100)(clip)
+    print("Saved thumbnail.wav")
+else:
+    print("No repeated sections found")
+
+# --- Save JSON ---
+data = {
+    "frame_rate": FRAME_RATE,
+    "key_invariant": KEY_INVARIANT,
+    "segments": segments,
+    "thumbnail": thumb,
+    "analysis_ms": elapsed_ms,
+}
+with open("/data/repetition.json", "w") as f:
+    json.dump(data, f, indent=4)
+
+print("Saved repetition.json")
+
+# --- Plot ---
+tl = result["time_lag"]
+fig, ax = plt.subplots(figsize=(14, 6))
+sc = ax.scatter(tl["time"], tl["lag"], c=tl["similarity"], s=2, cmap="viridis")
+for seg in segments:
+    ax.plot([seg["start"], seg["end"]], [seg["lag"], seg["lag"]], color="red", linewidth=2)
+if thumb is not None:
+    ax.axvspan(thumb["start"], thumb["end"], color="orange", alpha=0.2, label="Thumbnail")
+    ax.legend(loc="upper right")
+ax.set_xlabel("Time (s)")
+ax.set_ylabel("Lag (s)")
+ax.set_title("Time-lag repetitions (HPCP)")
+fig.colorbar(sc, ax=ax, label="Cosine similarity")
+
+plt.tight_layout()
+plt.savefig("/data/repetition.png", dpi=200)
+
+print("Saved repetition.png")
@@ -1,28 +1,43 @@
 import json
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
-from essentia.standard import (
-    MonoLoader,
-    KeyExtractor,
-    Windowing,
-    Spectrum,
-    SpectralPeaks,
-    HPCP,
-    FrameGenerator
-)
+from essentia.standard import KeyExtractor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import presets   # --preset fast|balanced|accurate (see tools/param_sweep.py)
+import result_cache
+from stage_cache import StageCache
+from fingerprint import canonical_source
+from multirate import MultiRateAudio
+from hop_hierarchy import HopHierarchy   # one shared HPCP pass (chromagram / key / beat chords)
+
+AUDIO_PATH = "/data/My_Song.wav"
+
+settings = presets.settings("key", {"sr": 44100, "frame_size": 4096, "hop_size": 4096, "hpcp_size": 12})
 
 # ---------------------------------------------------------------------
 # 1. LOAD AUDIO
 # ---------------------------------------------------------------------
 print("Loading audio...")
-audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+cache = StageCache()
+source = MultiRateAudio(AUDIO_PATH, cache, upstream=canonical_source(AUDIO_PATH))
+audio = source.at(settings["sr"])
 
 # ---------------------------------------------------------------------
 # 2. KEY EXTRACTION (FAST + ACCURATE)
 # ---------------------------------------------------------------------
 print("Running KeyExtractor...")
-key, scale, strength = KeyExtractor(profileType="edma")(audio)
+key_params = {"profileType": "edma", "sampleRate": settings["sr"], "frameSize": settings["frame_size"],
+              "hopSize": settings["hop_size"], "hpcpSize": settings["hpcp_size"]}
+# the same audio + parameters again -> stored result (tools/result_cache.py)
+key_result, hit = result_cache.ResultCache().cached(result_cache.audio_hash(audio), "KeyExtractor", key_params,
+                                                    lambda: KeyExtractor(**key_params)(audio))
+if hit:
+    print("[result cache] hit")
+key, scale, strength = key_result
 
 # Save JSON result
 result = {"key": key, "scale": scale, "strength": strength}
@@ -36,20 +51,11 @@ print("Key detected:", key, scale, "Strength:", strength)
 # ---------------------------------------------------------------------
 print("Computing HPCP for visualization...")
 
-w = Windowing(type="hann")
-spectrum = Spectrum()
-peaks = SpectralPeaks()
-hpcp_algo = HPCP(size=36)  # 36 bins = 3 bins per semitone
-
-hpcp_accum = []
-
-for frame in FrameGenerator(audio, frameSize=4096, hopSize=2048, startFromZero=True):
-    spec = spectrum(w(frame))
-    freqs, mags = peaks(spec)
-    if len(freqs) > 0:
-        hpcp_accum.append(hpcp_algo(freqs, mags))
-
-hpcp_accum = np.array(hpcp_accum)
+# 36 bins = 3 bins per semitone, frame 4096 / hop 2048: the shared 44.1 kHz
+# HPCP pass itself (exact), pooled from it when a preset changes the rate
+hierarchy = HopHierarchy(source.at(44100), cache=cache, upstream=[source.fingerprint(44100)])
+hpcp_accum = hierarchy.grid(2048, 4096, sample_rate=settings["sr"], name="key_visual")
+hierarchy.report()
 avg_hpcp = np.mean(hpcp_accum, axis=0)
 
 # Normalize for visualization
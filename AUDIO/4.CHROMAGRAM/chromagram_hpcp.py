@@ -1,57 +1,86 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
-from essentia.standard import (
-    MonoLoader,
-    FrameGenerator,
-    Windowing,
-    Spectrum,
-    SpectralPeaks,
-    HPCP
-)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+from stage_cache import StageCache
+from fingerprint import canonical_source   # re-encodes of a known track reuse its cache
+import profiling   # --profile or ESSENTIA_PROFILE=1 -> per-stage timings + Chrome trace
+from multirate import MultiRateAudio   # one native-rate decode shared by all rates
+from hop_hierarchy import HopHierarchy   # one shared HPCP pass (chromagram / key / beat chords)
+import pipelines
+import gate   # silent / near-silent frames: zero HPCP column
+
+AUDIO_PATH = "/data/My_Song.wav"
+
+# --pooled: derive the chromagram from the shared 44.1 kHz HPCP pass of the
+# key and beat-chord scripts instead of computing its own grid (faster when
+# that pass is cached, but approximate: ~0.996 cosine to the direct frames)
+POOLED = "--pooled" in sys.argv
+
+# decode and the HPCP frames are cached
+cache = StageCache()
 
 # ------------------------------
 # 1. Load audio
 # ------------------------------
 print("Loading audio...")
-audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=22050)()
+source = MultiRateAudio(AUDIO_PATH, cache, upstream=canonical_source(AUDIO_PATH))
+decode_rate = 44100 if POOLED else 22050
+with profiling.stage("decode"):
+    audio = source.at(decode_rate)          # 22.05 kHz: polyphase 2:1 from the native-rate PCM
+decode_fp = source.fingerprint(decode_rate)
 
 # ------------------------------
 # 2. Set up algorithms
 # ------------------------------
+sample_rate = 22050      # the grid of the chromagram: frame 4096 / hop 1024 at 22.05 kHz
 frame_size = 4096
 hop_size = 1024          # smaller hop = smoother time resolution
 hpcp_size = 36           # 36 bins = 3 per semitone
 
-window = Windowing(type="hann")
-spectrum = Spectrum()
-peaks = SpectralPeaks()
-hpcp_algo = HPCP(size=hpcp_size)
-
-hpcp_frames = []
-
 # ------------------------------
 # 3. Compute HPCP for each frame
 # ------------------------------
 print("Computing chromagram (HPCP over time)...")
 
-for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True):
-    spec = spectrum(window(frame))
-    freqs, mags = peaks(spec)
-    if len(freqs) > 0:
-        hpcp_frames.append(hpcp_algo(freqs, mags))
-    else:
-        hpcp_frames.append(np.zeros(hpcp_size))
+if POOLED:
+    # 4096 / 1024 at 22.05 kHz spans 8192 / 2048 samples at 44.1 kHz: each
+    # chromagram frame is the mean of the three shared 4096 / 2048 HPCP frames
+    # inside it
+    with profiling.stage("hpcp"):
+        hierarchy = HopHierarchy(audio, hpcp_size=hpcp_size, cache=cache, upstream=[decode_fp])
+        hpcp = hierarchy.grid(hop_size, frame_size, sample_rate=sample_rate, name="chromagram")
+    hierarchy.report()
+    # all-zero columns: gated (silent) frames or frames without spectral peaks
+    active = hpcp.any(axis=1)
+else:
+    # frames far below the track loudness (intro / fade-out / gaps) skip
+    # Spectrum -> SpectralPeaks -> HPCP and stay zero columns
+    active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True)
+    with profiling.stage("hpcp"):
+        # memory-mapped (num_frames, 36) float32 matrix: rows are read when indexed
+        hpcp, _ = cache.matrix("hpcp", {"sampleRate": sample_rate, "frameSize": frame_size, "hopSize": hop_size,
+                                        "size": hpcp_size, "gateDb": gate.GATE_DB},
+                               lambda: pipelines.hpcp_frames(audio, sample_rate, frame_size, hop_size, hpcp_size,
+                                                             active=active),
+                               upstream=[decode_fp], hop=hop_size, sample_rate=sample_rate)
+gate.report(active, hop_size, sample_rate)
+method = "pooled from 44.1 kHz 4096/2048 HPCP frames (approximate)" if POOLED else "direct (exact)"
+print(f"Chromagram frames: {method}")
 
-hpcp_frames = np.array(hpcp_frames)        # shape: (num_frames, 36)
-hpcp_frames = hpcp_frames.T                # (36, num_frames) for imshow
+# the plot cannot show more than a few thousand columns anyway: only every
+# step-th frame is paged in (hours of audio never load the whole matrix)
+step = max(1, len(hpcp) // 4000)
+hpcp_frames = hpcp[::step].T               # (36, shown frames) for imshow
 
 # Normalize for visualization
 hpcp_frames /= (hpcp_frames.max() + 1e-9)
 
 # Time axis in seconds
-num_frames = hpcp_frames.shape[1]
-duration_sec = len(audio) / 22050.0
+num_frames = len(hpcp)
+duration_sec = len(audio) / float(decode_rate)
 times = np.linspace(0, duration_sec, num_frames)
 
 # ------------------------------
@@ -59,20 +88,25 @@ times = np.linspace(0, duration_sec, num_frames)
 # ------------------------------
 print("Plotting chromagram...")
 
-plt.figure(figsize=(12, 6))
-plt.imshow(
-    hpcp_frames,
-    aspect='auto',
-    origin='lower',
-    interpolation='nearest',
-    extent=[times[0], times[-1], 0, hpcp_size]
-)
+with profiling.stage("matplotlib"):
+    plt.figure(figsize=(12, 6))
+    plt.imshow(
+        hpcp_frames,
+        aspect='auto',
+        origin='lower',
+        interpolation='nearest',
+        extent=[times[0], times[-1], 0, hpcp_size]
+    )
 
-plt.colorbar(label="Normalized Intensity")
-plt.xlabel("Time (s)")
-plt.ylabel("HPCP Bins (36 = 3 per semitone)")
-plt.title("HPCP Chromagram – My_Song.wav")
+    plt.colorbar(label="Normalized Intensity")
+    # no-signal regions (gated frames) are marked explicitly
+    for start, end in gate.silent_regions(active, hop_size, sample_rate):
+        plt.axvspan(start, end, color="white", alpha=0.25, hatch="//", linewidth=0)
+    plt.xlabel("Time (s)")
+    plt.ylabel("HPCP Bins (36 = 3 per semitone)")
+    plt.title("HPCP Chromagram – My_Song.wav" + (" (pooled, approximate)" if POOLED else ""))
 
-plt.tight_layout()
-plt.savefig("/data/chromagram_hpcp.png", dpi=150)
+    plt.tight_layout()
+    plt.savefig("/data/chromagram_hpcp.png", dpi=150,
+                metadata={"Description": f"HPCP {frame_size}/{hop_size} @ {sample_rate} Hz, {method}"})
 print("Saved chromagram to /data/chromagram_hpcp.png")
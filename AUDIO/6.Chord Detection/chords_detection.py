@@ -1,4 +1,6 @@
 import json
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -12,45 +14,72 @@ from essentia.standard import (
     ChordsDetection
 )
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import presets   # --preset fast|balanced|accurate (see tools/param_sweep.py)
+import gate      # silent / near-silent frames -> "N" (no chord)
+import adaptive  # --adaptive: coarse-to-fine hop, fine frames only around chord changes
+
+settings = presets.settings("chords", {"sr": 22050, "frame_size": 4096, "hop_size": 1024, "hpcp_size": 36,
+                                       "gate_db": gate.GATE_DB})
+sample_rate = settings["sr"]
+ADAPTIVE = "--adaptive" in sys.argv
+
 # ------------------------------------------
 # 1. LOAD AUDIO
 # ------------------------------------------
 print("Loading audio...")
-audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=22050)()
+audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=sample_rate)()
 
 # ------------------------------------------
 # 2. SETUP ALGORITHMS
 # ------------------------------------------
 window = Windowing(type="hann")
 spectrum = Spectrum()
-spectral_peaks = SpectralPeaks()
-hpcp_algo = HPCP(size=36)
+spectral_peaks = SpectralPeaks(sampleRate=sample_rate)
+hpcp_algo = HPCP(size=settings["hpcp_size"], sampleRate=sample_rate)
 
 # Essentia 2.1: no parameters!
 chord_detector = ChordsDetection()
 
-frame_size = 4096
-hop_size = 1024
+frame_size = settings["frame_size"]
+hop_size = settings["hop_size"]
 
 chords = []
 
+# frame RMS in one pass: frames far below the track loudness get no
+# Spectrum / SpectralPeaks / HPCP / ChordsDetection call at all
+active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=settings["gate_db"])
+gate.report(active, hop_size, sample_rate)
+
 # ------------------------------------------
 # 3. PROCESS FRAME-BY-FRAME
 # ------------------------------------------
 print("Detecting chords...")
 
-for i, frame in enumerate(FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)):
-    spec = spectrum(window(frame))
-    freqs, mags = spectral_peaks(spec)
-
-    hpcp = hpcp_algo(freqs, mags)
-
-    # IMPORTANT:
-    # ChordsDetection expects a LIST of HPCP vectors → [[hpcp]]
-    chord, strength = chord_detector([hpcp])
-
-    time_sec = i * hop_size / 22050.0
-    chords.append({"time": time_sec, "chord": chord, "strength": float(strength)})
+if ADAPTIVE:
+    # every 8th frame first, all frames only between differing / weak chords
+    out = adaptive.chords(audio, sample_rate, frame_size, hop_size, settings["hpcp_size"], active=active)
+    for t, chord, strength in zip(out["times"], out["chords"], out["strengths"]):
+        chords.append({"time": float(t), "chord": [chord], "strength": float(strength)})
+    print(f"Adaptive hop: {np.count_nonzero(out['computed'])}/{len(chords)} frames analysed")
+else:
+    for i, frame in enumerate(FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)):
+        time_sec = i * hop_size / float(sample_rate)
+        if not active[i]:
+            chords.append({"time": time_sec, "chord": [gate.NO_SIGNAL], "strength": 0.0})
+            continue
+
+        spec = spectrum(window(frame))
+        freqs, mags = spectral_peaks(spec)
+
+        hpcp = hpcp_algo(freqs, mags)
+
+        # IMPORTANT:
+        # ChordsDetection expects a LIST of HPCP vectors → [[hpcp]]
+        chord, strength = chord_detector([hpcp])
+
+        strength = float(strength[0]) if np.ndim(strength) else float(strength)
+        chords.append({"time": time_sec, "chord": chord, "strength": strength})
 
 # ------------------------------------------
 # 4. SAVE JSON
@@ -60,6 +60,7 @@ print(f"Created {len(segments)} chord segments.")
 unique_chords = sorted(set(c for (_, _, c) in segments))
 cmap = plt.get_cmap("tab20")
 colors = {ch: cmap(i % 20) for i, ch in enumerate(unique_chords)}
+colors["N"] = "lightgray"   # no signal (gated silent frames in chords_detection.py)
 
 # -------------------------------------------------
 # 4. Plot as horizontal colored bars with text below
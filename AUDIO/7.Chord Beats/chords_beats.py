@@ -1,25 +1,34 @@
 import json
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
 from essentia.standard import (
-    MonoLoader,
     RhythmExtractor2013,
-    FrameGenerator,
-    Windowing,
-    Spectrum,
-    SpectralPeaks,
-    HPCP,
     ChordsDetectionBeats
 )
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import profiling   # --profile or ESSENTIA_PROFILE=1 -> per-stage timings + Chrome trace
+from stage_cache import StageCache
+from fingerprint import canonical_source
+from multirate import MultiRateAudio
+from hop_hierarchy import HopHierarchy   # one shared HPCP pass (chromagram / key / beat chords)
+
+AUDIO_PATH = "/data/My_Song.wav"
+cache = StageCache()
+
 print("Loading audio...")
-audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+source = MultiRateAudio(AUDIO_PATH, cache, upstream=canonical_source(AUDIO_PATH))
+with profiling.stage("decode"):
+    audio = source.at(44100)
 
 # Beat tracking
 print("Extracting beats...")
 rhythm = RhythmExtractor2013(method="multifeature")
-bpm, beats, beats_conf, onset, onset_conf = rhythm(audio)
+with profiling.stage("RhythmExtractor2013"):
+    bpm, beats, beats_conf, onset, onset_conf = rhythm(audio)
 
 print(f"Detected BPM: {bpm:.2f}")
 print(f"Detected {len(beats)} beats")
@@ -27,25 +36,20 @@ print(f"Detected {len(beats)} beats")
 # Chord detector
 chords_beats = ChordsDetectionBeats()
 
-window = Windowing(type="hann")
-spectrum = Spectrum()
-peaks = SpectralPeaks()
-hpcp = HPCP(size=36)
-
 print("Computing HPCP per frame...")
-frame_hpcp = []
-
-for frame in FrameGenerator(audio, frameSize=4096, hopSize=4096):
-    spec = spectrum(window(frame))
-    f, m = peaks(spec)
-    frame_hpcp.append(hpcp(f, m))
 
-frame_hpcp = np.array(frame_hpcp)
+# centred 4096 / 4096 frames = every other frame of the shared hop-2048
+# HPCP pass (exact), read from the stage cache when another script made it
+with profiling.stage("hpcp_frames"):
+    hierarchy = HopHierarchy(audio, cache=cache, upstream=[source.fingerprint(44100)])
+    frame_hpcp = hierarchy.named("chords_beats")    # float32, passed to Essentia without a copy
+hierarchy.report()
 
 print("Running ChordsDetectionBeats...")
 
 # IMPORTANT: Only TWO arguments!
-chords, strengths = chords_beats(frame_hpcp, beats)
+with profiling.stage("ChordsDetectionBeats"):
+    chords, strengths = chords_beats(frame_hpcp, beats)
 
 # Save results
 results = []
@@ -60,24 +64,25 @@ print("Saved chords_beats.json")
 # Plot
 print("Plotting beat-synchronized chord timeline...")
 
-plt.figure(figsize=(18, 4))
-
-unique = sorted(set(r["chord"] for r in results))
-cmap = plt.get_cmap("tab20")
-colors = {ch: cmap(i % 20) for i, ch in enumerate(unique)}
-
-for i, r in enumerate(results):
-    start = r["time"]
-    end = results[i+1]["time"] if i < len(results)-1 else start + 1
-    plt.barh(0.5, end-start, left=start, height=0.3,
-             color=colors[r["chord"]], edgecolor="black")
-    plt.text((start+end)/2, 0.1, r["chord"],
-             ha="center", va="top", fontsize=8, rotation=90)
-
-plt.yticks([])
-plt.xlabel("Time (s)")
-plt.title("Chord Timeline (Beat-Synchronized)")
-plt.tight_layout()
-plt.savefig("/data/chords_beats_timeline.png", dpi=200)
+with profiling.stage("matplotlib"):
+    plt.figure(figsize=(18, 4))
+
+    unique = sorted(set(r["chord"] for r in results))
+    cmap = plt.get_cmap("tab20")
+    colors = {ch: cmap(i % 20) for i, ch in enumerate(unique)}
+
+    for i, r in enumerate(results):
+        start = r["time"]
+        end = results[i+1]["time"] if i < len(results)-1 else start + 1
+        plt.barh(0.5, end-start, left=start, height=0.3,
+                 color=colors[r["chord"]], edgecolor="black")
+        plt.text((start+end)/2, 0.1, r["chord"],
+                 ha="center", va="top", fontsize=8, rotation=90)
+
+    plt.yticks([])
+    plt.xlabel("Time (s)")
+    plt.title("Chord Timeline (Beat-Synchronized)")
+    plt.tight_layout()
+    plt.savefig("/data/chords_beats_timeline.png", dpi=200)
 
 print("Saved chords_beats_timeline.png")
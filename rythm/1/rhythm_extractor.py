@@ -1,15 +1,29 @@
 import json
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from essentia.standard import MonoLoader, RhythmExtractor2013
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import presets   # --preset fast|balanced|accurate (see tools/param_sweep.py)
+import result_cache
+
+settings = presets.settings("beats", {"method": "multifeature"})
+
 print("Loading audio...")
 audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
 
 print("Running RhythmExtractor2013...")
-rhythm = RhythmExtractor2013(method="multifeature")
-
-result = rhythm(audio)
+rhythm = RhythmExtractor2013(method=settings["method"])
+
+# the same audio + method again -> stored result (tools/result_cache.py)
+result, hit = result_cache.ResultCache().cached(result_cache.audio_hash(audio), "RhythmExtractor2013",
+                                                {"method": settings["method"], "sampleRate": 44100},
+                                                lambda: list(rhythm(audio)))
+if hit:
+    print("[result cache] hit")
+result = tuple(np.asarray(v, dtype=np.float32) if isinstance(v, list) else v for v in result)
 
 print("Raw returned values:", result)
 
@@ -0,0 +1,274 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+# -------------------------------------------------------
+# Incremental onset / beat tracker for live audio blocks
+#
+# Unlike the other scripts in rythm/ this one never sees the whole
+# track: audio arrives in small blocks (hop_size samples), and the
+# STFT frame, the onset function history and the tempo estimate are
+# kept between blocks in fixed-size buffers, so memory stays constant
+# no matter how long the stream runs.
+#
+# Usage:
+#   ffmpeg -i song.mp3 -f f32le -ac 1 -ar 44100 - | python3 realtime_beats.py --stdin
+#   python3 realtime_beats.py --file /data/My_Song.wav [--realtime]
+# -------------------------------------------------------
+
+SAMPLE_RATE = 44100
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+
+
+class StreamingBeatTracker:
+    """Causal spectral-flux onset detector + autocorrelation beat predictor.
+
+    Feed it audio with process(block); it returns the onset / beat events
+    found in that block as dicts ({"type": "onset"|"beat", "time": ...}).
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_size=FRAME_SIZE, hop_size=HOP_SIZE,
+                 min_bpm=60.0, max_bpm=180.0, tempo_window=6.0, tempo_every=8,
+                 onset_delta=0.3, min_onset_interval=0.05):
+        self.sample_rate = float(sample_rate)
+        self.frame_size = frame_size
+        self.hop_size = hop_size
+        self.frame_rate = self.sample_rate / hop_size
+        self.tempo_every = tempo_every
+        self.onset_delta = onset_delta
+        self.min_onset_gap = int(round(min_onset_interval * self.frame_rate))
+
+        # STFT state: last frame_size samples + previous log spectrum
+        self._window = np.hanning(frame_size).astype(np.float32)
+        self._frame = np.zeros(frame_size, dtype=np.float32)
+        self._prev_logmag = np.zeros(frame_size // 2 + 1, dtype=np.float32)
+        self._pending = np.zeros(hop_size, dtype=np.float32)
+        self._n_pending = 0
+
+        # Onset function history (ring buffer, one value per hop)
+        self._hist_len = int(2 ** np.ceil(np.log2(tempo_window * self.frame_rate)))
+        self._odf = np.zeros(self._hist_len, dtype=np.float32)
+        self._n_frames = 0
+        self._last_onset = -self.min_onset_gap
+
+        # Tempo state: lag range and log-Gaussian prior around 120 BPM
+        self._min_lag = int(np.floor(60.0 * self.frame_rate / max_bpm))
+        self._max_lag = int(np.ceil(60.0 * self.frame_rate / min_bpm))
+        lags = np.arange(self._min_lag, self._max_lag + 1)
+        lag_bpm = 60.0 * self.frame_rate / lags
+        self._lag_prior = np.exp(-0.5 * (np.log2(lag_bpm / 120.0) / 0.5) ** 2)
+        self._fft_size = 2 * self._hist_len
+        self.period = 0.0           # beat period in frames (0 = unknown)
+        self.bpm = 0.0
+        self._next_beat = -1.0      # predicted next beat, in frames
+        self._last_beat = -1.0      # last emitted beat, in frames
+
+    # ---------------------------------------------------
+    # public API
+    # ---------------------------------------------------
+    def process(self, block):
+        """Consume a block of mono float samples and return new events."""
+        block = np.asarray(block, dtype=np.float32)
+        events = []
+        pos = 0
+        while pos < len(block):
+            take = min(self.hop_size - self._n_pending, len(block) - pos)
+            self._pending[self._n_pending:self._n_pending + take] = block[pos:pos + take]
+            self._n_pending += take
+            pos += take
+            if self._n_pending == self.hop_size:
+                self._n_pending = 0
+                self._process_hop(self._pending, events)
+        return events
+
+    def time_of(self, frame_index):
+        # frame i ends at sample (i+1)*hop; report the centre of its window
+        return ((frame_index + 1) * self.hop_size - self.frame_size // 2) / self.sample_rate
+
+    # ---------------------------------------------------
+    # internals
+    # ---------------------------------------------------
+    def _process_hop(self, hop, events):
+        self._frame[:-self.hop_size] = self._frame[self.hop_size:]
+        self._frame[-self.hop_size:] = hop
+
+        mag = np.abs(np.fft.rfft(self._frame * self._window))
+        logmag = np.log1p(100.0 * mag).astype(np.float32)
+        flux = float(np.maximum(logmag - self._prev_logmag, 0.0).sum())
+        self._prev_logmag = logmag
+
+        n = self._n_frames
+        self._odf[n % self._hist_len] = flux
+        self._n_frames += 1
+
+        self._detect_onset(n, events)
+        if self._n_frames % self.tempo_every == 0 and self._n_frames >= self._max_lag * 2:
+            self._update_tempo()
+        self._predict_beat(n, events)
+
+    def _recent(self, count):
+        # last `count` onset values in chronological order (no allocation growth)
+        count = min(count, self._n_frames, self._hist_len)
+        idx = (np.arange(self._n_frames - count, self._n_frames)) % self._hist_len
+        return self._odf[idx]
+
+    def _detect_onset(self, n, events):
+        # causal peak picking: frame n-1 is an onset if it is a local maximum
+        # and sits above an adaptive threshold over the last ~0.25 s
+        if n < 2:
+            return
+        recent = self._recent(int(0.25 * self.frame_rate) + 1)
+        prev2, prev, cur = recent[-3], recent[-2], recent[-1]
+        thresh = recent.mean() + self.onset_delta * (recent.max() - recent.min()) + 1e-6
+        if prev > prev2 and prev >= cur and prev > thresh and (n - 1) - self._last_onset >= self.min_onset_gap:
+            self._last_onset = n - 1
+            events.append({"type": "onset", "time": self.time_of(n - 1), "strength": float(prev)})
+
+    def _update_tempo(self):
+        odf = self._recent(self._hist_len)
+        odf = odf - odf.mean()
+        spec = np.fft.rfft(odf, self._fft_size)
+        acf = np.fft.irfft(spec * np.conj(spec), self._fft_size)[:self._max_lag + 1]
+        if acf[0] <= 0:
+            return
+        scores = acf[self._min_lag:self._max_lag + 1] / acf[0] * self._lag_prior
+        k = int(np.argmax(scores))
+        # octave check: a pulse train at lag L also peaks at 2L, so if half the
+        # winning lag scores almost as well, the faster tempo is the real one
+        half = (self._min_lag + k) // 2 - self._min_lag
+        if half >= 0:
+            near = half + int(np.argmax(scores[half:half + 2]))
+            if scores[near] >= 0.8 * scores[k]:
+                k = near
+        lag = float(self._min_lag + k)
+        if 0 < k < len(scores) - 1:
+            # parabolic interpolation -> fractional lag (integer lags are ~1.5 BPM apart)
+            a, b, c = scores[k - 1], scores[k], scores[k + 1]
+            if a - 2 * b + c < 0:
+                lag += 0.5 * (a - c) / (a - 2 * b + c)
+
+        # smooth the period so a single noisy window does not make beats jump,
+        # but follow immediately on an octave-sized change
+        if self.period == 0.0 or abs(np.log2(lag / self.period)) > 0.3:
+            self.period = float(lag)
+        else:
+            self.period = 0.8 * self.period + 0.2 * lag
+        self.bpm = 60.0 * self.frame_rate / self.period
+
+        # phase: comb filter over the history, best offset = last beat position
+        n_pulses = max(1, int(len(odf) // self.period))
+        offsets = np.arange(int(round(self.period)))
+        pulses = np.round(self.period * np.arange(n_pulses)).astype(int)
+        taps = len(odf) - 1 - offsets[:, None] - pulses[None, :]
+        taps = np.where(taps >= 0, taps, 0)
+        phase = int(np.argmax(odf[taps].sum(axis=1)))
+        next_beat = self._n_frames - 1 - phase + self.period
+        # keep exactly one beat per period after the last emitted one: never
+        # schedule closer than half a period to it, and do not skip a beat
+        # that the new phase puts at (or just before) the current frame
+        while self._last_beat >= 0 and next_beat - self._last_beat < 0.5 * self.period:
+            next_beat += self.period
+        while self._last_beat >= 0 and next_beat - self.period - self._last_beat >= 0.5 * self.period:
+            next_beat -= self.period
+        self._next_beat = next_beat
+
+    def _predict_beat(self, n, events):
+        # emit a beat one hop ahead of time so downstream (lights) can schedule it
+        if self.period <= 0 or self._next_beat < 0:
+            return
+        while self._next_beat <= n + 1:
+            events.append({"type": "beat", "time": self.time_of(self._next_beat),
+                           "bpm": float(self.bpm)})
+            self._last_beat = self._next_beat
+            self._next_beat += self.period
+
+
+# -------------------------------------------------------
+# Block sources
+# -------------------------------------------------------
+def stdin_blocks(block_size, sample_format):
+    dtype = np.float32 if sample_format == "f32" else np.int16
+    nbytes = block_size * np.dtype(dtype).itemsize
+    stream = sys.stdin.buffer
+    while True:
+        raw = stream.read(nbytes)
+        if not raw:
+            break
+        raw = raw[:len(raw) - len(raw) % np.dtype(dtype).itemsize]
+        block = np.frombuffer(raw, dtype=dtype)
+        if dtype == np.int16:
+            block = block.astype(np.float32) / 32768.0
+        yield block
+
+
+def file_blocks(path, block_size, sample_rate, realtime):
+    from essentia.standard import MonoLoader
+    audio = MonoLoader(filename=path, sampleRate=sample_rate)()
+    block_dur = block_size / float(sample_rate)
+    start = time.perf_counter()
+    for i, pos in enumerate(range(0, len(audio), block_size)):
+        if realtime:
+            wait = start + i * block_dur - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        yield audio[pos:pos + block_size]
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental onset/beat tracking on audio blocks")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--stdin", action="store_true", help="read raw mono PCM from stdin")
+    src.add_argument("--file", help="simulate a stream from an audio file")
+    parser.add_argument("--format", choices=["f32", "s16"], default="f32", help="stdin sample format")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE)
+    parser.add_argument("--block-size", type=int, default=HOP_SIZE)
+    parser.add_argument("--realtime", action="store_true", help="pace --file input at real time")
+    parser.add_argument("--json-out", default=None, help="save all events + latency stats here")
+    args = parser.parse_args()
+
+    tracker = StreamingBeatTracker(sample_rate=args.sample_rate)
+
+    if args.stdin:
+        blocks = stdin_blocks(args.block_size, args.format)
+    else:
+        blocks = file_blocks(args.file, args.block_size, args.sample_rate, args.realtime)
+
+    # latency stats are kept in a fixed-size ring so long streams do not grow memory
+    lat = np.zeros(4096, dtype=np.float64)
+    n_blocks = 0
+    onsets, beats = [], []
+
+    for block in blocks:
+        t0 = time.perf_counter()
+        events = tracker.process(block)
+        lat[n_blocks % len(lat)] = time.perf_counter() - t0
+        n_blocks += 1
+
+        for ev in events:
+            sys.stdout.write(json.dumps(ev) + "\n")
+            if args.json_out:
+                (onsets if ev["type"] == "onset" else beats).append(ev["time"])
+        if events:
+            sys.stdout.flush()
+
+    recent = lat[:min(n_blocks, len(lat))] * 1000.0
+    stats = {
+        "blocks": n_blocks,
+        "bpm": float(tracker.bpm),
+        "latency_ms_mean": float(recent.mean()) if n_blocks else 0.0,
+        "latency_ms_p99": float(np.percentile(recent, 99)) if n_blocks else 0.0,
+        "latency_ms_max": float(recent.max()) if n_blocks else 0.0,
+        "block_budget_ms": 1000.0 * args.block_size / args.sample_rate,
+    }
+    print(json.dumps(stats), file=sys.stderr)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"onsets": onsets, "beats": beats, "stats": stats}, f, indent=4)
+        print(f"Saved {args.json_out}", file=sys.stderr)
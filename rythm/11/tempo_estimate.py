@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from essentia.standard import MonoLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import tempo
+
+# -------------------------------------------------------
+# Tempo-only mode: global BPM + candidates from the
+# autocorrelation of the spectral-flux novelty curve
+# (no beat tracking, see tools/tempo.py)
+# -------------------------------------------------------
+
+print("Loading audio...")
+audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+
+print("Estimating tempo...")
+t0 = time.perf_counter()
+result = tempo.estimate_tempo(audio, 44100, min_bpm=40.0, max_bpm=240.0, prior_bpm=120.0)
+elapsed_ms = 1000 * (time.perf_counter() - t0)
+
+print(f"BPM: {result['bpm']:.2f}  confidence: {result['confidence']:.2f}  ({elapsed_ms:.1f} ms)")
+print("Candidates:")
+for bpm, conf in result["candidates"]:
+    print(f"  {bpm:7.2f} BPM  {conf:.2f}")
+
+# --- Save JSON ---
+data = {
+    "bpm": result["bpm"],
+    "confidence": result["confidence"],
+    "candidates": [{"bpm": b, "confidence": c} for b, c in result["candidates"]],
+    "analysis_ms": elapsed_ms,
+}
+with open("/data/tempo_estimate.json", "w") as f:
+    json.dump(data, f, indent=4)
+
+print("Saved tempo_estimate.json")
+
+# --- Plot: prior-weighted salience per tempo ---
+plt.figure(figsize=(14, 5))
+plt.plot(result["lag_bpms"], result["salience"], color="black", linewidth=1)
+for i, (bpm, conf) in enumerate(result["candidates"]):
+    plt.axvline(bpm, color="red" if i == 0 else "gray", linestyle="--",
+                label=f"{bpm:.1f} BPM ({conf:.2f})")
+plt.xscale("log")
+ticks = [40, 60, 80, 100, 120, 140, 160, 200, 240]
+plt.xticks(ticks, [str(t) for t in ticks])
+plt.title(f"Tempo salience (BPM = {result['bpm']:.2f})")
+plt.xlabel("BPM")
+plt.ylabel("Weighted autocorrelation")
+plt.legend()
+plt.grid(True)
+plt.tight_layout()
+plt.savefig("/data/tempo_estimate.png", dpi=200)
+
+print("Saved tempo_estimate.png")
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from essentia.standard import MonoLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+import tempogram
+
+# -------------------------------------------------------
+# Tempo over time: Fourier tempogram of the flux novelty
+# curve, smoothed local tempo and tempo-change segments
+# (for DJ mixes / live recordings with drifting tempo)
+# -------------------------------------------------------
+
+KIND = "fourier"          # or "autocorrelation"
+WINDOW_S = 8.0            # analysis window on the novelty curve
+HOP_S = 0.5
+
+print("Loading audio...")
+audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
+
+print(f"Computing {KIND} tempogram...")
+t0 = time.perf_counter()
+result = tempogram.tempogram(audio, 44100, kind=KIND, window_s=WINDOW_S, hop_s=HOP_S)
+elapsed_ms = 1000 * (time.perf_counter() - t0)
+
+times = result["times"]
+local_bpm = result["local_bpm"]
+print(f"{len(times)} windows x {len(result['bpms'])} tempi in {elapsed_ms:.1f} ms")
+print(f"Median local tempo: {np.median(local_bpm):.2f} BPM "
+      f"(range {local_bpm.min():.2f} - {local_bpm.max():.2f})")
+
+print("Tempo segments:")
+for seg in result["changes"]:
+    print(f"  {seg['start']:7.1f} - {seg['end']:7.1f} s  {seg['kind']:6s} "
+          f"{seg['bpm_start']:.2f} -> {seg['bpm_end']:.2f} BPM")
+
+# --- Save JSON ---
+data = {
+    "kind": KIND,
+    "window_s": WINDOW_S,
+    "hop_s": HOP_S,
+    "times": times.tolist(),
+    "local_bpm": local_bpm.tolist(),
+    "segments": result["changes"],
+    "analysis_ms": elapsed_ms,
+}
+with open("/data/tempogram.json", "w") as f:
+    json.dump(data, f, indent=4)
+
+print("Saved tempogram.json")
+
+# --- Plot ---
+fig, ax = plt.subplots(2, 1, figsize=(14, 8), sharex=True,
+                       gridspec_kw={"height_ratios": [3, 1]})
+
+bpms = result["bpms"]
+ax[0].imshow(result["tempogram"].T, origin="lower", aspect="auto", cmap="magma",
+             extent=[times[0], times[-1] if len(times) > 1 else HOP_S, bpms[0], bpms[-1]])
+ax[0].plot(times, local_bpm, color="cyan", linewidth=1.2, label="Local tempo")
+ax[0].set_ylabel("BPM")
+ax[0].set_title(f"{KIND.capitalize()} tempogram")
+ax[0].legend(loc="upper right")
+
+ax[1].plot(times, local_bpm, color="black", linewidth=1)
+for seg in result["changes"]:
+    ax[1].plot([seg["start"], seg["end"]], [seg["bpm_start"], seg["bpm_end"]],
+               color="red" if seg["kind"] == "ramp" else "blue", linewidth=2)
+    ax[1].axvline(seg["start"], color="gray", linestyle="--", linewidth=0.8)
+ax[1].set_xlabel("Time (s)")
+ax[1].set_ylabel("BPM")
+ax[1].grid(True)
+
+plt.tight_layout()
+plt.savefig("/data/tempogram.png", dpi=200)
+
+print("Saved tempogram.png")
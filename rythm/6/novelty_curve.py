@@ -32,7 +32,8 @@ for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, start
 spectra = np.array(spectra)
 
 # -------------------------------------------------------
-# CUSTOM SPECTRAL NOVELTY (Foote 2000)
+# CUSTOM SPECTRAL NOVELTY (cosine distance of consecutive
+# spectra; for Foote checkerboard novelty see AUDIO/11)
 # -------------------------------------------------------
 print("Computing Spectral Novelty Curve...")
 
@@ -64,7 +65,7 @@ t = np.arange(len(novelty_values)) * (hop_size / 44100.0)
 
 plt.figure(figsize=(16, 5))
 plt.plot(t, novelty_values, color='purple')
-plt.title("Spectral Novelty Curve (Foote 2000)")
+plt.title("Spectral Novelty Curve (cosine distance)")
 plt.xlabel("Time (s)")
 plt.ylabel("Novelty")
 plt.grid(True)
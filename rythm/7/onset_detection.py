@@ -1,7 +1,8 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import json
-import essentia
 
 from essentia.standard import (
     MonoLoader,
@@ -12,6 +13,9 @@ from essentia.standard import (
     OnsetDetectionGlobal
 )
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+from frame_matrix import FrameMatrix, as_essentia
+
 print("Loading audio...")
 audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
 
@@ -34,7 +38,8 @@ od_global = OnsetDetectionGlobal()
 # COMPUTE ONSET CURVE (spectral flux)
 # -------------------------------------------------------
 print("Computing onset curve...")
-onset_curve = []
+# one float32 slot per frame, preallocated from the frame count
+onset_curve = FrameMatrix.for_audio(audio, frame_size, hop_size, start_from_zero=True)
 
 for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True):
     win = window(frame)
@@ -48,15 +53,15 @@ for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, start
     onset_val = od_flux(mag, phase)
     onset_curve.append(onset_val)
 
-onset_curve = np.array(onset_curve)
+onset_curve = onset_curve.array
 
 # -------------------------------------------------------
 # PEAK PICKING
 # -------------------------------------------------------
 print("Running OnsetDetectionGlobal...")
 
-# Convert to essentia array (float32)
-onset_curve_ess = essentia.array(onset_curve).astype('float32')
+# Already contiguous float32: passed to Essentia without a copy
+onset_curve_ess = as_essentia(onset_curve)
 
 # Detect onsets (seconds)
 onset_times = od_global(onset_curve_ess)
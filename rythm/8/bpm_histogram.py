@@ -1,50 +1,96 @@
 import json
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import essentia
 import essentia.standard as es
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+from stage_cache import StageCache
+from fingerprint import canonical_source
+import spectra
+import bands
+from frame_matrix import as_essentia
+from multirate import MultiRateAudio
+
+# --fast-tempo: reference BPM από tools/tempo.py (autocorrelation του novelty,
+# ~50 ms) αντί για ολόκληρο το RhythmExtractor2013
+FAST_TEMPO = "--fast-tempo" in sys.argv[1:]
+
 AUDIO_PATH = "/data/My_Song.wav"
 JSON_OUT = "/data/bpm_histogram.json"
 PNG_OUT = "/data/bpm_histogram.png"
 
+# Κάθε στάδιο αποθηκεύεται με fingerprint των παραμέτρων του + των εισόδων του,
+# οπότε π.χ. αλλαγή μόνο στο minBpm/maxBpm ξανατρέχει μόνο το BpmHistogram.
+# Διπλότυπα (π.χ. το .mp3 του ίδιου τραγουδιού) παίρνουν το source fingerprint
+# του πρώτου αντιγράφου (tools/fingerprint.py), άρα και όλα τα cached στάδιά του.
+cache = StageCache()
+
+sample_rate = 44100.0
+
+# Ένα decode στο native rate για όλα τα scripts (tools/multirate.py):
+# τα 22050 Hz του chromagram_hpcp.py βγαίνουν από το ίδιο cached PCM
 print("Loading audio...")
-audio = es.MonoLoader(filename=AUDIO_PATH, sampleRate=44100)()
+source = MultiRateAudio(AUDIO_PATH, cache, upstream=canonical_source(AUDIO_PATH))
+audio = as_essentia(source.at(sample_rate))    # float32 already: no copy
+decode_fp = source.fingerprint(sample_rate)
 
 # -------------------------------------------------------
-# 1. BPM reference με RhythmExtractor2013
+# 1. BPM reference με RhythmExtractor2013 (ή tools/tempo.py με --fast-tempo)
 #    (δεν είναι descriptor, απλώς για βαθμονόμηση)
 # -------------------------------------------------------
-print("Estimating reference BPM with RhythmExtractor2013...")
-rhythm = es.RhythmExtractor2013(method="multifeature")
-bpm_ref, beats, beats_conf, bpm_intervals, bpm_intervals_conf = rhythm(audio)
-print(f"Reference BPM (RhythmExtractor2013): {bpm_ref:.2f}")
+if FAST_TEMPO:
+    import tempo
+
+    print("Estimating reference BPM with tempo.estimate_tempo...")
+    tempo_out, _ = cache.run(
+        "tempo_estimate", {"maxSampleRate": 22050},
+        lambda: {"bpm": tempo.estimate_tempo(audio, sample_rate)["bpm"]},
+        upstream=[decode_fp],
+    )
+    bpm_ref = float(tempo_out["bpm"])
+    reference_name = "tempo.estimate_tempo"
+else:
+    print("Estimating reference BPM with RhythmExtractor2013...")
+
+    def run_rhythm():
+        rhythm = es.RhythmExtractor2013(method="multifeature")
+        bpm, beats, beats_conf, _, _ = rhythm(audio)
+        return {"bpm": bpm, "beats": beats, "beats_conf": beats_conf}
+
+    rhythm_out, _ = cache.run("rhythm_extractor", {"method": "multifeature"},
+                              run_rhythm, upstream=[decode_fp])
+    bpm_ref = float(rhythm_out["bpm"])
+    reference_name = "RhythmExtractor2013"
+print(f"Reference BPM ({reference_name}): {bpm_ref:.2f}")
 
 # -------------------------------------------------------
 # 2. Novelty curve για BpmHistogram
 # -------------------------------------------------------
 frame_size = 2048
 hop_size = 512
-sample_rate = 44100.0
 
-window = es.Windowing(type="hann")
-spectrum = es.Spectrum()
-freqBands = es.FrequencyBands()
-noveltyAlgo = es.NoveltyCurve()
+def run_bands():
+    # ίδια frames/τιμές με FrameGenerator -> Windowing("hann") -> Spectrum ->
+    # FrequencyBands(), αλλά ένα batched STFT και ένα sparse matrix product
+    # αντί για χιλιάδες κλήσεις ανά frame
+    spec = spectra.magnitude_spectrogram(audio, frame_size, hop_size)
+    return {"bands": bands.band_energies(spec, sample_rate)}
 
 print("Computing frequency bands for NoveltyCurve...")
+bands_out, bands_fp = cache.run(
+    "frequency_bands",
+    {"frameSize": frame_size, "hopSize": hop_size, "window": "hann", "sampleRate": sample_rate},
+    run_bands, upstream=[decode_fp], version=2,
+)
 
-bands_list = []
-for frame in es.FrameGenerator(audio,
-                               frameSize=frame_size,
-                               hopSize=hop_size,
-                               startFromZero=True):
-    spec = spectrum(window(frame))
-    bands = freqBands(spec)
-    bands_list.append(bands)
-
-bands_mat = np.array(bands_list, dtype="float32")
-novelty = noveltyAlgo(essentia.array(bands_mat))
+novelty_out, novelty_fp = cache.run(
+    "novelty_curve", {},
+    lambda: {"novelty": es.NoveltyCurve()(as_essentia(bands_out["bands"]))},
+    upstream=[bands_fp],
+)
+novelty = as_essentia(novelty_out["novelty"])
 
 # -------------------------------------------------------
 # 3. BpmHistogram στο εύρος γύρω από bpm_ref
@@ -56,19 +102,27 @@ maxBpm = min(220.0, bpm_ref * 1.8)
 
 print(f"Running BpmHistogram in range [{minBpm:.1f}, {maxBpm:.1f}] BPM...")
 
-bpmHist = es.BpmHistogram(
-    frameRate=frame_rate_novelty,
-    minBpm=minBpm,
-    maxBpm=maxBpm,
-    constantTempo=False,
+def run_bpm_histogram():
+    bpmHist = es.BpmHistogram(
+        frameRate=frame_rate_novelty,
+        minBpm=minBpm,
+        maxBpm=maxBpm,
+        constantTempo=False,
+    )
+    bpm_mean, bpmCandidates, bpmMagnitudes, _, frameBpms, _, _, _ = bpmHist(novelty)
+    return {"bpm_mean": bpm_mean, "bpmCandidates": bpmCandidates,
+            "bpmMagnitudes": bpmMagnitudes, "frameBpms": frameBpms}
+
+hist_out, _ = cache.run(
+    "bpm_histogram",
+    {"frameRate": frame_rate_novelty, "minBpm": minBpm, "maxBpm": maxBpm, "constantTempo": False},
+    run_bpm_histogram, upstream=[novelty_fp],
 )
-
-bpm_mean_raw, bpmCandidates_raw, bpmMagnitudes_raw, tempogram, \
-    frameBpms_raw, ticks, ticksMagnitude, sinusoid = bpmHist(novelty)
-
-bpmCandidates_raw = np.array(bpmCandidates_raw, dtype=float)
-bpmMagnitudes_raw = np.array(bpmMagnitudes_raw, dtype=float)
-frameBpms_raw = np.array(frameBpms_raw, dtype=float)
+bpm_mean_raw = float(hist_out["bpm_mean"])
+# float32 όπως τα δίνει το Essentia (καμία μετατροπή σε float64 και πίσω)
+bpmCandidates_raw = np.asarray(hist_out["bpmCandidates"])
+bpmMagnitudes_raw = np.asarray(hist_out["bpmMagnitudes"])
+frameBpms_raw = np.asarray(hist_out["frameBpms"])
 
 print(f"Raw mean BPM (BpmHistogram): {bpm_mean_raw:.2f}")
 
@@ -116,6 +170,7 @@ print(f"Scaled peak BPM (hist): {peak_bpm_scaled:.2f}")
 # -------------------------------------------------------
 data = {
     "reference_bpm_rhythmExtractor": float(bpm_ref),
+    "reference_bpm_source": reference_name,
 
     "bpm_mean_raw": float(bpm_mean_raw),
     "peak_bpm_raw": float(peak_bpm_raw),
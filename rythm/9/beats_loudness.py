@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import json
+import os
+import sys
 
 from essentia.standard import (
     MonoLoader,
@@ -10,6 +12,9 @@ from essentia.standard import (
     BeatTrackerMultiFeature
 )
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+from frame_matrix import FrameMatrix
+
 print("Loading audio...")
 audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
 
@@ -18,12 +23,12 @@ hop_size = 512
 
 print("Computing loudness envelope...")
 loudness = Loudness()
-loudness_vals = []
+loudness_vals = FrameMatrix.for_audio(audio, frame_size, hop_size, start_from_zero=True)
 
 for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True):
-    loudness_vals.append(float(loudness(frame)))
+    loudness_vals.append(loudness(frame))
 
-loudness_vals = np.array(loudness_vals)
+loudness_vals = loudness_vals.array
 
 print("Detecting beats...")
 beats, beat_conf = BeatTrackerMultiFeature()(audio)
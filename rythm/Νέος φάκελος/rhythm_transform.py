@@ -1,7 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import json
-import essentia
+import os
+import sys
 from essentia.standard import (
     MonoLoader,
     FrameGenerator,
@@ -11,6 +12,9 @@ from essentia.standard import (
     RhythmTransform
 )
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+from frame_matrix import FrameMatrix
+
 print("Loading audio...")
 audio = MonoLoader(filename="/data/My_Song.wav", sampleRate=44100)()
 
@@ -30,7 +34,7 @@ rhythm_transform = RhythmTransform()
 # ============================================================
 print("Computing onset curve...")
 
-onset_curve = []
+onset_curve = FrameMatrix.for_audio(audio, frame_size, hop_size, start_from_zero=True)
 
 for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True):
     win = window(frame)
@@ -41,17 +45,18 @@ for frame in FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, start
     onset_value = onset_det(mag, phase)
     onset_curve.append(onset_value)
 
-onset_curve = np.array(onset_curve, dtype=float)
+onset_curve = onset_curve.array
 
 # ============================================================
 # 2) FIX: OLD ESSENTIA EXPECTS VectorVectorReal FORMAT
 # ============================================================
 # RhythmTransform DOES NOT accept a 1D array
-# It expects a LIST OF LISTS → [[val], [val], [val]...]
+# It expects a matrix of frames → [[val], [val], [val]...]
+# (a float32 column view is accepted as is, no list of lists needed)
 
 print("Formatting onset curve for RhythmTransform...")
 
-onset_frames = [[float(v)] for v in onset_curve]
+onset_frames = onset_curve.reshape(-1, 1)
 
 # ============================================================
 # 3) RHYTHM TRANSFORM
@@ -0,0 +1,123 @@
+import sys
+import time
+import numpy as np
+import essentia
+import essentia.standard as es
+
+import gate
+import spectra
+
+# -------------------------------------------------------
+# Coarse-to-fine chord analysis: fine hop only around changes
+#
+#   out = adaptive.chords(audio, 22050, hop_size=1024, step=8)
+#   out["chords"], out["strengths"]       # full hop_size timeline
+#   out["computed"]                       # frames actually analysed
+#
+# 1. analyse every step-th frame of the fine grid (hop = step x hop_size)
+# 2. between two neighbouring coarse frames with different chords, or
+#    where the chord strength drops below min_strength, analyse every
+#    fine frame
+# 3. spans with the same confident chord at both ends are filled: the
+#    label is held and the strength interpolated
+# Chords are per frame (one HPCP frame -> ChordsDetection, as in
+# chords_detection.py), so every computed frame is exactly the frame
+# of a uniform run; only a chord shorter than one coarse hop between
+# two identical ones can be missed. Melodia is left out on purpose:
+# its contour tracking needs seconds of context and a uniform hop, so
+# re-running it on short regions does not reproduce the full run.
+# -------------------------------------------------------
+
+
+def refine_spans(coarse, differs, weak):
+    """Indices i of coarse pairs (i, i + 1) that need the fine hop."""
+    flagged = []
+    for i in range(len(coarse) - 1):
+        if differs(coarse[i], coarse[i + 1]) or weak[i] or weak[i + 1]:
+            flagged.append(i)
+    return flagged
+
+
+def _coarse_index(n_fine, step):
+    idx = np.arange(0, n_fine, step)
+    if len(idx) and idx[-1] != n_fine - 1:
+        idx = np.append(idx, n_fine - 1)
+    return idx
+
+
+def _interp(values, idx, n_fine):
+    return np.interp(np.arange(n_fine), idx, values).astype(np.float32)
+
+
+# -------------------------------------------------------
+# Chords
+# -------------------------------------------------------
+def chords(audio, sr=22050, frame_size=4096, hop_size=1024, hpcp_size=36, step=8, min_strength=0.6,
+           gate_db=gate.GATE_DB, active=None):
+    """pipelines.chords() on the fine grid, computing only the frames around chord changes."""
+    window = es.Windowing(type="hann")
+    spectrum = es.Spectrum()
+    peaks = es.SpectralPeaks(sampleRate=sr)
+    hpcp = es.HPCP(size=hpcp_size, sampleRate=sr)
+    detector = es.ChordsDetection(hopSize=hop_size, sampleRate=sr)
+
+    frames = spectra.frames(audio, frame_size, hop_size)     # the FrameGenerator(startFromZero) frames
+    if active is None:
+        active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=gate_db)
+    n = len(frames)
+    labels = np.empty(n, dtype=object)
+    strengths = np.zeros(n, dtype=np.float32)
+    computed = np.zeros(n, dtype=bool)
+
+    def evaluate(j):
+        computed[j] = True
+        if not active[j]:
+            labels[j], strengths[j] = gate.NO_SIGNAL, 0.0
+            return
+        freqs, mags = peaks(spectrum(window(np.ascontiguousarray(frames[j]))))
+        h = hpcp(freqs, mags) if len(freqs) > 0 else np.zeros(hpcp_size, dtype=np.float32)
+        c, s = detector(essentia.array([h]))
+        labels[j] = c[0] if isinstance(c, (list, tuple)) else c
+        strengths[j] = float(s[0]) if np.ndim(s) else float(s)
+
+    idx = _coarse_index(n, step)
+    for j in idx:
+        evaluate(j)
+    weak = [labels[j] != gate.NO_SIGNAL and strengths[j] < min_strength for j in idx]
+    for i in refine_spans([labels[j] for j in idx], lambda a, b: a != b, weak):
+        for j in range(idx[i] + 1, idx[i + 1]):
+            evaluate(j)
+
+    # unrefined spans: same chord at both ends
+    filled_strength = _interp(strengths[idx], idx, n)
+    for i in range(len(idx) - 1):
+        a, b = idx[i], idx[i + 1]
+        if b > a + 1 and not computed[a + 1]:
+            labels[a + 1:b] = labels[a]
+            strengths[a + 1:b] = filled_strength[a + 1:b]
+    times = np.arange(n) * hop_size / float(sr)
+    return {"times": times, "chords": list(labels), "strengths": strengths, "computed": computed}
+
+
+# -------------------------------------------------------
+# MAIN: adaptive vs uniform fine-hop run
+#   python3 adaptive.py /data/My_Song.wav [step]
+# -------------------------------------------------------
+if __name__ == "__main__":
+    import pipelines
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "/data/My_Song.wav"
+    step = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    essentia.log.infoActive = False
+
+    audio = es.MonoLoader(filename=path, sampleRate=22050)()
+    t0 = time.perf_counter()
+    ref = pipelines.chords(audio, 22050)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    out = chords(audio, 22050, step=step)
+    t_out = time.perf_counter() - t0
+    n = min(len(ref["chords"]), len(out["chords"]))
+    agree = np.mean([a == b for a, b in zip(ref["chords"][:n], out["chords"][:n])])
+    print(f"step {step}: {np.count_nonzero(out['computed'])}/{n} frames computed, "
+          f"{1000 * t_out:.0f} ms vs {1000 * t_ref:.0f} ms uniform, labels agree on {100 * agree:.1f}%")
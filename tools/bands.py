@@ -0,0 +1,71 @@
+import functools
+import numpy as np
+
+import lazy
+
+try:
+    sparse = lazy.module("scipy.sparse")
+    HAVE_SCIPY = True
+except ImportError:
+    HAVE_SCIPY = False
+
+# -------------------------------------------------------
+# FrequencyBands as one (sparse) matrix product
+#
+#   spectrogram = spectra.magnitude_spectrogram(audio, 2048, 512)     # magnitudes, not power
+#   energies = bands.band_energies(spectrogram, sample_rate=44100)    # squared inside
+#
+# FrequencyBands sums the squared magnitudes of bins
+# [int(f_lo / scale + 0.5), int(f_hi / scale + 0.5)) per band, with
+# scale = (sampleRate / 2) / (n_bins - 1). That is a 0/1 matrix of
+# n_bins x n_bands with one non-zero per bin, built once per
+# (sampleRate, n_bins, band edges) and kept in an lru_cache, so a whole
+# track (or many tracks) costs one product per block of frames.
+# -------------------------------------------------------
+
+# FrequencyBands() default edges (Hz)
+DEFAULT_BANDS = (0.0, 50.0, 100.0, 150.0, 200.0, 300.0, 400.0, 510.0, 630.0, 770.0, 920.0, 1080.0,
+                 1270.0, 1480.0, 1720.0, 2000.0, 2320.0, 2700.0, 3150.0, 3700.0, 4400.0, 5300.0,
+                 6400.0, 7700.0, 9500.0, 12000.0, 15500.0, 20500.0, 27000.0)
+
+
+def band_bins(sample_rate, n_bins, edges=DEFAULT_BANDS):
+    """[start, end) bin range of every band, exactly as FrequencyBands rounds them."""
+    scale = (sample_rate / 2.0) / (n_bins - 1)
+    ranges = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        start, end = int(lo / scale + 0.5), int(hi / scale + 0.5)
+        if start >= n_bins:
+            # FrequencyBands stops here: the remaining bands stay 0
+            start = end = n_bins
+        ranges.append((start, min(end, n_bins)))
+    return ranges
+
+
+@functools.lru_cache(maxsize=32)
+def band_matrix(sample_rate, n_bins, edges=DEFAULT_BANDS):
+    """n_bins x n_bands float32 weights (scipy CSC if available, else dense)."""
+    ranges = band_bins(sample_rate, n_bins, edges)
+    rows = np.concatenate([np.arange(a, b) for a, b in ranges] + [np.zeros(0, dtype=int)])
+    cols = np.concatenate([np.full(b - a, i) for i, (a, b) in enumerate(ranges)] + [np.zeros(0, dtype=int)])
+    data = np.ones(len(rows), dtype=np.float32)
+    shape = (n_bins, len(ranges))
+    if HAVE_SCIPY:
+        return sparse.csc_matrix((data, (rows, cols)), shape=shape)
+    dense = np.zeros(shape, dtype=np.float32)
+    dense[rows, cols] = 1.0
+    return dense
+
+
+def band_energies(spectrogram, sample_rate=44100.0, edges=DEFAULT_BANDS, block=4096):
+    """(n_frames x n_bands) FrequencyBands output for a (n_frames x n_bins) magnitude matrix."""
+    spectrogram = np.asarray(spectrogram, dtype=np.float32)
+    single = spectrogram.ndim == 1
+    spectrogram = np.atleast_2d(spectrogram)
+    m = band_matrix(float(sample_rate), spectrogram.shape[1], tuple(float(e) for e in edges))
+    out = np.empty((len(spectrogram), m.shape[1]), dtype=np.float32)
+    for start in range(0, len(spectrogram), block):
+        power = np.square(spectrogram[start:start + block])
+        # sparse @ dense: (n_bands x n_bins) @ (n_bins x block)
+        out[start:start + block] = (m.T @ power.T).T if HAVE_SCIPY else power @ m
+    return out[0] if single else out
@@ -0,0 +1,276 @@
+import argparse
+import inspect
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+import synth_signals as synth
+from pipelines import PIPELINES
+
+# -------------------------------------------------------
+# Speed + accuracy benchmark on synthetic signals
+#
+# Every pipeline of tools/pipelines.py is run on deterministic audio
+# with known ground truth (see synth_signals.py) at several lengths,
+# each case in a fresh process so peak RSS is per case. Results go to
+# JSON; --compare flags wall-time / accuracy regressions against an
+# older results file (exit code 1 if any).
+#
+#   python3 benchmark.py --lengths 10 30 120 --out bench_results.json
+#   python3 benchmark.py --only key chords --compare old_results.json
+# -------------------------------------------------------
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# -------------------------------------------------------
+# Signals
+# -------------------------------------------------------
+def make_signal(kind, length, sr):
+    if kind == "clicks":
+        return synth.click_track(120.0, length, sr=sr, seed=1)
+    if kind == "chords":
+        return synth.chord_progression("D", "major", length, sr=sr, tuning_cents=15.0, seed=2)
+    if kind == "sweep":
+        return synth.pitch_sweep(110.0, 880.0, length, sr=sr, seed=3)
+    raise ValueError(f"Unknown signal kind: {kind}")
+
+
+def default_sr(fn):
+    return int(inspect.signature(fn).parameters["sr"].default)
+
+
+# -------------------------------------------------------
+# Scoring against ground truth
+# -------------------------------------------------------
+def f_measure(estimated, reference, tolerance):
+    estimated = np.sort(np.asarray(estimated, dtype=float))
+    reference = np.asarray(reference, dtype=float)
+    if len(estimated) == 0 or len(reference) == 0:
+        return 0.0
+    used = np.zeros(len(estimated), dtype=bool)
+    hits = 0
+    for r in reference:
+        d = np.abs(estimated - r)
+        d[used] = np.inf
+        i = int(np.argmin(d))
+        if d[i] <= tolerance:
+            used[i] = True
+            hits += 1
+    precision = hits / float(len(estimated))
+    recall = hits / float(len(reference))
+    return 0.0 if hits == 0 else 2 * precision * recall / (precision + recall)
+
+
+def key_score(key, scale, true_key, true_scale):
+    """MIREX weighted key score: 1 same, .5 fifth, .3 relative, .2 parallel."""
+    k, t = synth.note_index(key), synth.note_index(true_key)
+    if k == t and scale == true_scale:
+        return 1.0
+    if scale == true_scale and (k - t) % 12 in (5, 7):
+        return 0.5
+    if scale != true_scale:
+        rel = (t - 3) % 12 if true_scale == "major" else (t + 3) % 12
+        if k == rel:
+            return 0.3
+        if k == t:
+            return 0.2
+    return 0.0
+
+
+def bpm_error(bpm, true_bpm):
+    return abs(bpm - true_bpm)
+
+
+def score(name, result, truth, sr):
+    if name in ("hpcp", "hpcp_batched"):
+        h = result["hpcp"].reshape(12, -1).sum(axis=1)
+        ref = synth.chroma_template(truth)
+        return {"chroma_cosine": float(h @ ref / (np.linalg.norm(h) * np.linalg.norm(ref) + 1e-12))}
+    if name in ("key", "key_hpcp", "key_cqt"):
+        return {"key_score": key_score(result["key"], result["scale"], truth["key"], truth["scale"])}
+    if name in ("chords", "chords_adaptive", "chords_cqt"):
+        ref = [synth.chord_at(truth, t) for t in result["times"]]
+        ok = [r is not None and c == r for c, r in zip(result["chords"], ref)]
+        return {"chord_accuracy": float(np.mean(ok)) if ok else 0.0}
+    if name == "tuning":
+        return {"tuning_cents_error": abs(result["tuning_cents"] - truth["tuning_cents"])}
+    if name == "melodia":
+        voiced = result["pitch"] > 0
+        if not voiced.any():
+            return {"raw_pitch_accuracy": 0.0, "voicing_recall": 0.0}
+        ref = truth["f0_at"](result["times"][voiced])
+        cents = np.abs(1200 * np.log2(result["pitch"][voiced] / ref))
+        return {"raw_pitch_accuracy": float(np.mean(cents < 50) * voiced.mean()),
+                "voicing_recall": float(voiced.mean()),
+                "median_cents_error": float(np.median(cents))}
+    if name in ("rhythm_extractor", "beats_degara", "beats_multifeature"):
+        return {"bpm_error": bpm_error(result["bpm"], truth["bpm"]),
+                "beat_f_measure": f_measure(result["beats"], truth["beats"], 0.07)}
+    if name == "onsets":
+        return {"onset_f_measure": f_measure(result["onsets"], truth["onsets"], 0.05)}
+    if name == "novelty":
+        n_ref = len(truth["boundaries"])
+        peaks = np.sort(result["peak_times"][:n_ref]) if n_ref else np.zeros(0)
+        return {"boundary_f_measure": f_measure(peaks, truth["boundaries"], 0.25)}
+    if name == "beats_loudness":
+        # per-beat loudness should follow the accent pattern of the click track
+        beats = np.asarray(truth["beats"])
+        if len(result["beats"]) < 3:
+            return {"accent_correlation": 0.0}
+        idx = np.argmin(np.abs(beats[None, :] - result["beats"][:, None]), axis=1)
+        accents = np.asarray(truth["accents"])[idx]
+        loud = result["beat_loudness"]
+        if loud.std() == 0 or accents.std() == 0:
+            return {"accent_correlation": 0.0}
+        return {"accent_correlation": float(np.corrcoef(loud, accents)[0, 1])}
+    return {}
+
+
+# -------------------------------------------------------
+# One case = one pipeline at one length, in its own process
+# -------------------------------------------------------
+def _rss_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_case(args):
+    name, length, repeat = args
+    fn, kind = PIPELINES[name]
+    sr = default_sr(fn)
+    audio, truth = make_signal(kind, length, sr)
+
+    # reset the high-water mark so peak RSS covers the pipeline only (Linux)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    rss_before = _rss_mb("VmRSS")
+
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(audio, sr)
+        times.append(time.perf_counter() - t0)
+    peak = _rss_mb("VmHWM")
+
+    return {
+        "pipeline": name,
+        "signal": kind,
+        "length_s": length,
+        "sample_rate": sr,
+        "wall_s": float(min(times)),
+        "wall_s_all": [float(t) for t in times],
+        "realtime_factor": float(length / min(times)) if min(times) > 0 else None,
+        "peak_rss_mb": float(peak),
+        "rss_delta_mb": float(peak - rss_before),
+        "accuracy": score(name, result, truth, sr),
+    }
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import essentia
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "essentia": getattr(essentia, "__version__", None),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+# -------------------------------------------------------
+# Regression check
+# -------------------------------------------------------
+# accuracy metrics where lower is better
+LOWER_IS_BETTER = {"bpm_error", "tuning_cents_error", "median_cents_error"}
+
+
+def compare(new, old, time_tolerance=0.2, accuracy_tolerance=0.02, min_delta_s=0.005):
+    old_cases = {(c["pipeline"], c["length_s"]): c for c in old["results"]}
+    regressions = []
+    print(f"\n{'pipeline':22s} {'len':>6s} {'old s':>9s} {'new s':>9s} {'ratio':>7s}")
+    for c in new["results"]:
+        o = old_cases.get((c["pipeline"], c["length_s"]))
+        if o is None:
+            continue
+        ratio = c["wall_s"] / o["wall_s"] if o["wall_s"] > 0 else 1.0
+        flag = ""
+        # tiny cases are dominated by timer noise: also require an absolute slow-down
+        if ratio > 1.0 + time_tolerance and c["wall_s"] - o["wall_s"] > min_delta_s:
+            flag = "  SLOWER"
+            regressions.append((c["pipeline"], c["length_s"], "wall_s", o["wall_s"], c["wall_s"]))
+        for metric, value in c["accuracy"].items():
+            before = o["accuracy"].get(metric)
+            if before is None:
+                continue
+            worse = value - before if metric in LOWER_IS_BETTER else before - value
+            if worse > accuracy_tolerance:
+                flag += f"  {metric} {before:.3f}->{value:.3f}"
+                regressions.append((c["pipeline"], c["length_s"], metric, before, value))
+        print(f"{c['pipeline']:22s} {c['length_s']:6.0f} {o['wall_s']:9.3f} {c['wall_s']:9.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic-signal speed/accuracy benchmark")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[10.0, 30.0, 120.0],
+                        help="track lengths in seconds")
+    parser.add_argument("--only", nargs="+", choices=sorted(PIPELINES), default=None)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case (min time is kept)")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="older results JSON to check for regressions")
+    parser.add_argument("--time-tolerance", type=float, default=0.2,
+                        help="allowed relative slow-down before flagging")
+    args = parser.parse_args()
+
+    names = args.only or list(PIPELINES)
+    cases = [(n, length, args.repeat) for n in names for length in args.lengths]
+
+    results = []
+    # maxtasksperchild=1: every case gets a fresh process -> independent peak RSS
+    with mp.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for case, res in zip(cases, pool.imap(run_case, cases)):
+            acc = ", ".join(f"{k}={v:.3f}" for k, v in res["accuracy"].items())
+            print(f"{res['pipeline']:22s} {res['length_s']:6.0f}s  {res['wall_s']:8.3f}s  "
+                  f"{res['peak_rss_mb']:7.1f} MB  {acc}")
+            results.append(res)
+
+    report = {"meta": metadata(), "results": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Saved {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(report, old, args.time_tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
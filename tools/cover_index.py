@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+# -------------------------------------------------------
+# Cover / version search over a corpus of HPCP sequences
+#
+#   index = CoverIndex()
+#   index.add("song_a", chroma_sequence(audio_a))      # for every track
+#   index.build()
+#   index.query(chroma_sequence(audio_q), k=10)        # [(name, score), ...]
+#   index.save("covers.npz");  CoverIndex.load("covers.npz")
+#   index.add("song_c", ...); index.build()            # merged into the built / loaded index
+#
+# Every track is stored as a short 12-bin HPCP sequence (2 frames/s
+# or one frame per beat), rotated to a canonical key with the
+# optimal transposition index (OTI) against a fixed key profile.
+# Retrieval is two-stage:
+#   1. candidates : each frame becomes a 12-bit token (the bins above
+#                   `threshold` of the frame maximum), repeated tokens
+#                   are collapsed (tempo invariance) and n consecutive
+#                   tokens form one n-gram hash. An inverted index maps
+#                   hashes to tracks; a query only reads the posting
+#                   lists of its own n-grams and scores tracks by idf.
+#                   The query is looked up under its `probes` most likely
+#                   rotations, so a wrong canonical key costs recall only
+#                   when probes < 12.
+#   2. alignment  : local alignment (Smith-Waterman) of the query with
+#                   the top candidates only, each after its pairwise
+#                   OTI, all candidates advanced together row by row.
+# -------------------------------------------------------
+
+# Krumhansl-Kessler major profile (tonic first): only used as a fixed
+# reference to agree on one rotation per track
+KEY_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+
+
+def downsample(X, frame_rate, target_rate=2.0):
+    """Average consecutive frames down to ~target_rate frames/s."""
+    X = np.asarray(X, dtype=np.float32)
+    factor = max(1, int(round(frame_rate / target_rate)))
+    n = len(X) // factor
+    if n == 0:
+        return X.mean(axis=0, keepdims=True) if len(X) else X
+    return X[:n * factor].reshape(n, factor, -1).mean(axis=1)
+
+
+def beat_sync(X, frame_rate, beats):
+    """One averaged frame per inter-beat interval (beats in seconds)."""
+    X = np.asarray(X, dtype=np.float32)
+    edges = np.round(np.asarray(beats) * frame_rate).astype(int)
+    edges = np.unique(np.clip(edges, 0, len(X)))
+    segment = np.searchsorted(edges, np.arange(len(X)), side="right")
+    counts = np.bincount(segment, minlength=len(edges) + 1)
+    sums = np.stack([np.bincount(segment, X[:, b], minlength=len(edges) + 1) for b in range(X.shape[1])], axis=1)
+    keep = counts > 0
+    return (sums[keep] / counts[keep, None]).astype(np.float32)
+
+
+def normalize_frames(X):
+    """Each frame scaled to max 1 (silent frames stay 0)."""
+    X = np.asarray(X, dtype=np.float32)
+    peak = X.max(axis=1, keepdims=True)
+    return np.divide(X, peak, out=np.zeros_like(X), where=peak > 0)
+
+
+def key_shifts(X, n=1):
+    """The n rotations s that best match roll(profile, -s) with KEY_PROFILE."""
+    profile = np.asarray(X, dtype=float).mean(axis=0)
+    scores = np.array([np.dot(np.roll(profile, -s), KEY_PROFILE) for s in range(12)])
+    return [int(s) for s in np.argsort(-scores)[:n]]
+
+
+def oti(a, b):
+    """Optimal transposition index: roll(b, oti) best matches a (global profiles)."""
+    pa, pb = np.asarray(a, dtype=float).mean(axis=0), np.asarray(b, dtype=float).mean(axis=0)
+    return int(np.argmax([np.dot(pa, np.roll(pb, s)) for s in range(12)]))
+
+
+def chroma_sequence(audio, sr=44100, frame_rate=10.0, target_rate=2.0, beats=None):
+    """HPCP sequence for the index: beat-synchronous if beats are given, else downsampled."""
+    import ssm
+    X = ssm.feature_frames(audio, sr, kind="hpcp", frame_rate=frame_rate)
+    X = beat_sync(X, frame_rate, beats) if beats is not None else downsample(X, frame_rate, target_rate)
+    return normalize_frames(X)
+
+
+def tokens(X, threshold=0.6):
+    """12-bit chroma tokens, silent frames dropped and repeats collapsed."""
+    X = normalize_frames(X)
+    codes = ((X >= threshold) * (1 << np.arange(X.shape[1]))).sum(axis=1)
+    codes = codes[codes > 0]
+    if len(codes) == 0:
+        return codes
+    return codes[np.r_[True, codes[1:] != codes[:-1]]]
+
+
+def ngram_hashes(codes, n=3, bits=12):
+    """Unique n-gram hashes of a token sequence (exact: n * bits <= 63)."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if len(codes) < n:
+        return np.zeros(0, dtype=np.int64)
+    h = np.zeros(len(codes) - n + 1, dtype=np.int64)
+    for i in range(n):
+        h = (h << bits) | codes[i:len(codes) - n + 1 + i]
+    return np.unique(h)
+
+
+def align_scores(query, candidates, match=1.0, mismatch=1.0, min_similarity=0.9):
+    """Best local-alignment score of `query` against each of `candidates` (lists of frames).
+
+    Qmax-style recursion: a cell continues the best of the diagonal and the
+    two 2:1 / 1:2 steps, so tempo differences up to a factor of 2 cost no
+    gap penalty. No cell depends on its own row, so all candidates are
+    padded into one (k x m) batch and advanced one query frame at a time.
+    """
+    q = _unit_rows(query)
+    k = len(candidates)
+    m = max(len(c) for c in candidates)
+    C = np.zeros((k, m, q.shape[1]), dtype=np.float32)
+    for i, c in enumerate(candidates):
+        C[i, :len(c)] = _unit_rows(c)
+    # two columns of zero padding on the left: column j + 2 holds candidate frame j
+    prev2 = np.zeros((k, m + 2), dtype=np.float32)
+    prev = np.zeros((k, m + 2), dtype=np.float32)
+    best = np.zeros(k, dtype=np.float32)
+    for qi in q:
+        s = np.where(C @ qi >= min_similarity, match, -mismatch).astype(np.float32)
+        before = np.maximum(np.maximum(prev[:, 1:-1], prev2[:, 1:-1]), prev[:, :-2])
+        row = np.zeros_like(prev)
+        row[:, 2:] = np.maximum(before + s, 0.0)
+        prev2, prev = prev, row
+        best = np.maximum(best, row.max(axis=1))
+    return best
+
+
+def _unit_rows(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return np.divide(X, norms, out=np.zeros_like(X), where=norms > 0)
+
+
+class CoverIndex:
+    def __init__(self, n=3, threshold=0.6):
+        self.n = n
+        self.threshold = threshold
+        self.names = []
+        self._seqs = []            # uint8 frames (0..255 of the frame maximum)
+        self._hashes = []
+        self.keys = None           # sorted unique n-gram hashes
+        self.offsets = None        # postings of keys[i]: tracks[offsets[i]:offsets[i + 1]]
+        self.tracks = None
+        self.seq_flat = None
+        self.seq_offsets = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, X):
+        """Add one track (frames x 12 HPCP, e.g. from chroma_sequence)."""
+        X = normalize_frames(X)
+        X = np.roll(X, -key_shifts(X)[0], axis=1)
+        self.names.append(name)
+        self._seqs.append(np.round(X * 255).astype(np.uint8))
+        self._hashes.append(ngram_hashes(tokens(X, self.threshold), self.n))
+
+    def build(self):
+        """Index the tracks added since the last build / load, merged with those already indexed."""
+        n_built = len(self.seq_offsets) - 1 if self.seq_offsets is not None else 0
+        lengths = [len(h) for h in self._hashes]
+        hashes = np.concatenate(self._hashes + [np.zeros(0, dtype=np.int64)])
+        ids = np.repeat(np.arange(n_built, n_built + len(lengths), dtype=np.int32), lengths)
+        seq_lengths = [len(s) for s in self._seqs]
+        seqs = self._seqs
+        if n_built:
+            # existing postings back to (hash, track) pairs; theirs come first, so the
+            # stable sort keeps every posting list in track order
+            hashes = np.concatenate([np.repeat(self.keys, np.diff(self.offsets)), hashes])
+            ids = np.concatenate([self.tracks.astype(np.int32), ids])
+            seq_lengths = np.diff(self.seq_offsets).tolist() + seq_lengths
+            seqs = [self.seq_flat] + seqs
+        order = np.argsort(hashes, kind="stable")
+        self.keys, starts = np.unique(hashes[order], return_index=True)
+        self.offsets = np.append(starts, len(order)).astype(np.int64)
+        self.tracks = ids[order]
+        self.seq_offsets = np.zeros(len(seq_lengths) + 1, dtype=np.int64)
+        self.seq_offsets[1:] = np.cumsum(seq_lengths)
+        self.seq_flat = np.concatenate(seqs) if seqs else np.zeros((0, 12), dtype=np.uint8)
+        self._seqs, self._hashes = [], []
+        return self
+
+    def sequence(self, i):
+        return self.seq_flat[self.seq_offsets[i]:self.seq_offsets[i + 1]].astype(np.float32) / 255.0
+
+    def candidates(self, X, k=100, probes=12, max_df=0.05):
+        """Top-k track ids by idf-weighted shared n-grams (best of `probes` key rotations).
+
+        Tracks added since the last build() are indexed first.
+        """
+        if self._hashes or self.keys is None:
+            self.build()
+        X = normalize_frames(X)
+        n_tracks = len(self.names)
+        if len(self.keys) == 0:
+            return np.zeros(0, dtype=int)
+        df = np.diff(self.offsets)
+        best = np.zeros(n_tracks, dtype=np.float32)
+        for shift in key_shifts(X, probes):
+            h = ngram_hashes(tokens(np.roll(X, -shift, axis=1), self.threshold), self.n)
+            pos = np.minimum(np.searchsorted(self.keys, h), len(self.keys) - 1)
+            pos = pos[(self.keys[pos] == h) & (df[pos] <= max(10, max_df * n_tracks))]
+            if len(pos) == 0:
+                continue
+            counts = df[pos]
+            idx = np.repeat(self.offsets[pos], counts) + np.arange(counts.sum()) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            weight = np.repeat(np.log1p(n_tracks / counts.astype(float)), counts)
+            best = np.maximum(best, np.bincount(self.tracks[idx], weight, minlength=n_tracks))
+        k = min(k, int((best > 0).sum()))
+        if k == 0:
+            return np.zeros(0, dtype=int)
+        top = np.argpartition(-best, k - 1)[:k]
+        return top[np.argsort(-best[top])]
+
+    def query(self, X, k=10, n_candidates=100, probes=12):
+        """[(name, score)] of the k best alignments among the n-gram candidates."""
+        X = normalize_frames(X)
+        ids = self.candidates(X, n_candidates, probes)
+        if len(ids) == 0:
+            return []
+        seqs = [self.sequence(i) for i in ids]
+        # pairwise OTI: rotate every candidate onto the query
+        seqs = [np.roll(s, oti(X, s), axis=1) for s in seqs]
+        scores = align_scores(X, seqs)
+        order = np.argsort(-scores)[:k]
+        return [(self.names[ids[i]], float(scores[i])) for i in order]
+
+    def save(self, path):
+        if self._hashes or self.keys is None:
+            self.build()
+        np.savez(path, names=np.array(self.names), keys=self.keys, offsets=self.offsets,
+                 tracks=self.tracks, seq_flat=self.seq_flat, seq_offsets=self.seq_offsets,
+                 meta=np.array(json.dumps({"n": self.n, "threshold": self.threshold})))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls(meta["n"], meta["threshold"])
+            index.names = data["names"].tolist()
+            for key in ("keys", "offsets", "tracks", "seq_flat", "seq_offsets"):
+                setattr(index, key, data[key])
+        return index
+
+
+# -------------------------------------------------------
+# MAIN
+#   python3 cover_index.py build covers.npz a.wav b.wav ...
+#   python3 cover_index.py add covers.npz c.wav d.wav ...    (merged into the saved index)
+#   python3 cover_index.py query covers.npz query.wav --k 10
+#   python3 cover_index.py check                             (build / save / load / add round-trip)
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Key-invariant cover song index over HPCP sequences")
+    parser.add_argument("command", choices=["build", "add", "query", "check"])
+    parser.add_argument("index", nargs="?", default="covers.npz")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == "check":
+        # every track stays queryable after build -> save -> load -> add -> build
+        import tempfile
+        rng = np.random.default_rng(0)
+        tracks = [(f"s{i}", rng.random((60, 12), dtype=np.float32) ** 4) for i in range(300)]
+        index = CoverIndex()
+        for name, X in tracks[:200]:
+            index.add(name, X)
+        with tempfile.TemporaryDirectory() as tmp:
+            index.build().save(os.path.join(tmp, "covers.npz"))
+            index = CoverIndex.load(os.path.join(tmp, "covers.npz"))
+        for name, X in tracks[200:250]:
+            index.add(name, X)
+        index.build()
+        for name, X in tracks[250:]:
+            index.add(name, X)
+        index.build()
+        assert len(index) == len(tracks) == len(index.seq_offsets) - 1, (len(index), len(index.seq_offsets))
+        misses = [name for name, X in tracks if [found for found, _ in index.query(X, k=1)] != [name]]
+        print(f"{len(tracks)} tracks indexed in 3 builds, {len(tracks) - len(misses)} found themselves first"
+              + (f"; missed: {misses[:10]}" if misses else ""))
+        raise SystemExit(1 if misses else 0)
+
+    from essentia.standard import MonoLoader
+
+    def load_sequence(path):
+        return chroma_sequence(MonoLoader(filename=path, sampleRate=44100)(), 44100)
+
+    if args.command == "build":
+        index = CoverIndex()
+        for path in args.files:
+            print(f"Adding {path}...")
+            index.add(os.path.basename(path), load_sequence(path))
+        index.build().save(args.index)
+        print(f"Saved {len(index)} tracks to {args.index}")
+    elif args.command == "add":
+        index = CoverIndex.load(args.index)
+        for path in args.files:
+            print(f"Adding {path}...")
+            index.add(os.path.basename(path), load_sequence(path))
+        index.build().save(args.index)
+        print(f"Saved {len(index)} tracks to {args.index}")
+    else:
+        index = CoverIndex.load(args.index)
+        for path in args.files:
+            X = load_sequence(path)
+            t0 = time.perf_counter()
+            results = index.query(X, args.k, args.candidates)
+            print(f"{path} ({1000 * (time.perf_counter() - t0):.1f} ms):")
+            for name, score in results:
+                print(f"  {score:8.2f}  {name}")
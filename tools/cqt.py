@@ -0,0 +1,171 @@
+import functools
+import sys
+import time
+import numpy as np
+
+import lazy
+import spectra
+
+try:
+    sparse = lazy.module("scipy.sparse")
+    HAVE_SCIPY = True
+except ImportError:
+    HAVE_SCIPY = False
+
+# -------------------------------------------------------
+# Constant-Q chroma from the batched STFT (sparse spectral kernel)
+#
+#   C = cqt.chroma(audio, 44100, hop_size=2048, size=36)     # (frames x 36), HPCP layout
+#   C = cqt.chroma(audio, 22050, hop_size=1024, grid_frame_size=4096, active=gate_mask)
+#
+# Brown & Puckette's constant-Q transform: every CQ bin k (fmin * 2^(k / B),
+# B bins per octave) is a hann-windowed complex exponential of
+# Q * sr / f_k samples, Q = 1 / (2^(1 / B) - 1), centred in the frame.
+# Its FFT is almost zero away from f_k, so the FFTs of all bins form a
+# sparse (n_fft_bins x n_cq_bins) kernel, built once per parameter set
+# (lru_cache), and the CQT of a block of frames is rfft(frames) @ kernel.
+# Where Q * sr / f_k exceeds the frame, the bin uses the whole frame
+# (constant bandwidth below sr * Q / frame_size); frames of at least
+# MIN_FRAME_S keep the lowest octaves apart.
+#
+# The chroma has the HPCP layout: energies (|CQ|^2) folded over octaves,
+# bin 0 = A (fmin is an A, referenceFrequency 440), 36 bins merged to
+# 12 around their centres, unit max per frame; frames where `active`
+# (gate.py) is False are zero rows and cost no FFT. Frame k is centred
+# on frame k of FrameGenerator(frameSize=grid_frame_size, startFromZero=True),
+# the grid of pipelines.hpcp_frames, so both front ends line up.
+# -------------------------------------------------------
+
+FMIN = 55.0                 # A1
+N_OCTAVES = 6               # A1 .. A7
+BINS_PER_OCTAVE = 36
+THRESHOLD = 0.0054          # kernel values below this fraction of a bin's peak are dropped
+MIN_FRAME_S = 0.18          # 8192 samples at 44.1 kHz, 4096 at 22.05 kHz
+
+
+def frame_size_for(sample_rate, at_least=0):
+    """Power-of-two frame of at least MIN_FRAME_S seconds (and at least `at_least` samples)."""
+    return 1 << int(np.ceil(np.log2(max(MIN_FRAME_S * sample_rate, at_least, 1))))
+
+
+@functools.lru_cache(maxsize=16)
+def kernel(sample_rate, frame_size, fmin=FMIN, n_octaves=N_OCTAVES, bins_per_octave=BINS_PER_OCTAVE,
+           threshold=THRESHOLD):
+    """(frame_size // 2 + 1) x n_bins complex64 spectral kernel (scipy CSC if available, else dense)."""
+    n_bins = n_octaves * bins_per_octave
+    freqs = fmin * 2.0 ** (np.arange(n_bins) / float(bins_per_octave))
+    if freqs[-1] >= sample_rate / 2.0:
+        raise ValueError(f"top CQ bin {freqs[-1]:.0f} Hz is above Nyquist for {sample_rate} Hz")
+    q = 1.0 / (2.0 ** (1.0 / bins_per_octave) - 1.0)
+    atoms = np.zeros((n_bins, frame_size), dtype=np.complex64)
+    for k, f in enumerate(freqs):
+        length = min(int(np.ceil(q * sample_rate / f)), frame_size)
+        n = np.arange(length)
+        start = (frame_size - length) // 2
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * n / length)
+        atoms[k, start:start + length] = window / length * np.exp(2j * np.pi * f * n / sample_rate)
+    K = np.fft.fft(atoms, axis=1)[:, :frame_size // 2 + 1]
+    K[np.abs(K) < threshold * np.abs(K).max(axis=1, keepdims=True)] = 0.0
+    K = (np.conj(K) / frame_size).T.astype(np.complex64)
+    return sparse.csc_matrix(K) if HAVE_SCIPY else K
+
+
+def _frames(audio, frame_size, hop_size, grid_frame_size):
+    """(n x frame_size) frames centred on the FrameGenerator(startFromZero) frames of grid_frame_size."""
+    if frame_size < grid_frame_size:
+        raise ValueError(f"frame_size ({frame_size}) must be at least grid_frame_size ({grid_frame_size})")
+    n = spectra.frame_count(len(audio), grid_frame_size, hop_size)
+    pad = (frame_size - grid_frame_size) // 2
+    padded = np.zeros(max((n - 1) * hop_size + frame_size, pad + len(audio)), dtype=np.float32)
+    padded[pad:pad + len(audio)] = audio
+    return np.lib.stride_tricks.as_strided(padded, shape=(n, frame_size),
+                                           strides=(padded.strides[0] * hop_size, padded.strides[0]),
+                                           writeable=False)
+
+
+def transform(audio, sample_rate=44100, frame_size=None, hop_size=2048, grid_frame_size=None, active=None,
+              block=512, **params):
+    """(n_frames x n_bins) float32 |CQT| on the frame grid of grid_frame_size (default: frame_size)."""
+    frame_size = frame_size or frame_size_for(sample_rate, grid_frame_size or 0)
+    K = kernel(float(sample_rate), frame_size, **params)
+    fr = _frames(audio, frame_size, hop_size, grid_frame_size or frame_size)
+    out = np.zeros((len(fr), K.shape[1]), dtype=np.float32)
+    for start in range(0, len(fr), block):
+        ids = np.arange(start, min(start + block, len(fr)))
+        if active is not None:
+            ids = ids[np.asarray(active[start:start + block], dtype=bool)]
+        if not len(ids):
+            continue
+        # a view of the block unless the gate took frames out
+        chunk = fr[start:start + block] if len(ids) == min(block, len(fr) - start) else fr[ids]
+        X = spectra._fft.rfft(chunk, axis=1)
+        # sparse @ dense: (n_bins x n_fft_bins) @ (n_fft_bins x block)
+        C = (K.T @ X.T).T if HAVE_SCIPY else X @ K
+        out[ids] = np.abs(C)
+    return out
+
+
+def fold(energies, size=36, bins_per_octave=BINS_PER_OCTAVE):
+    """(frames x n_octaves * B) energies -> (frames x size) pitch classes, bin 0 = fmin's pitch class."""
+    if bins_per_octave % size:
+        raise ValueError(f"size must divide bins_per_octave ({bins_per_octave}), not {size}")
+    X = energies.reshape(len(energies), -1, bins_per_octave).sum(axis=1)
+    r = bins_per_octave // size
+    # merge r neighbouring bins around each target bin centre
+    return np.roll(X, r // 2, axis=1).reshape(len(X), size, r).sum(axis=2)
+
+
+def chroma(audio, sample_rate=44100, frame_size=None, hop_size=2048, size=36, grid_frame_size=None, active=None,
+           **params):
+    """(n_frames x size) float32 constant-Q chroma, unit max per frame (HPCP layout)."""
+    bins_per_octave = params.get("bins_per_octave", BINS_PER_OCTAVE)
+    C = transform(audio, sample_rate, frame_size, hop_size, grid_frame_size, active, **params)
+    X = fold(np.square(C), size, bins_per_octave)
+    peak = X.max(axis=1, keepdims=True)
+    return np.divide(X, peak, out=np.zeros_like(X), where=peak > 0).astype(np.float32)
+
+
+# -------------------------------------------------------
+# MAIN: CQT chroma vs HPCP for key estimation (speed, agreement)
+#   python3 cqt.py [/data/My_Song.wav]
+# -------------------------------------------------------
+if __name__ == "__main__":
+    import essentia.standard as es
+    import pipelines
+    import synth_signals as synth
+
+    sr = 44100
+    tracks = []
+    for i, (k, scale) in enumerate([("C", "major"), ("A", "minor"), ("F#", "major"), ("E", "minor"),
+                                    ("Bb", "major"), ("G", "minor"), ("D", "major"), ("C#", "minor")]):
+        audio, truth = synth.chord_progression(k, scale, 30.0, sr=sr, tuning_cents=10.0 * (i % 3 - 1), seed=i)
+        tracks.append((f"{k} {scale} (synth)", np.asarray(audio, dtype=np.float32), (truth["key"], truth["scale"])))
+    for path in sys.argv[1:] or ["/data/My_Song.wav"]:
+        tracks.append((path, es.MonoLoader(filename=path, sampleRate=sr)(), None))
+
+    # one-off costs (scipy import, kernel build, Essentia algorithm set-up) outside the timings
+    t0 = time.perf_counter()
+    for front_end in ("hpcp", "cqt"):
+        pipelines.key_from_chroma(tracks[0][1][:sr], sr, front_end=front_end)
+    print(f"warm-up (imports, {kernel(float(sr), frame_size_for(sr, 4096)).shape[1]}-bin kernel): "
+          f"{1000 * (time.perf_counter() - t0):.0f} ms")
+
+    times = {"hpcp": 0.0, "cqt": 0.0}
+    agree, correct = 0, {"hpcp": 0, "cqt": 0}
+    for name, audio, truth in tracks:
+        found = {}
+        for front_end in times:
+            t0 = time.perf_counter()
+            found[front_end] = pipelines.key_from_chroma(audio, sr, front_end=front_end)
+            times[front_end] += time.perf_counter() - t0
+            if truth and (found[front_end]["key"], found[front_end]["scale"]) == truth:
+                correct[front_end] += 1
+        same = (found["hpcp"]["key"], found["hpcp"]["scale"]) == (found["cqt"]["key"], found["cqt"]["scale"])
+        agree += same
+        print(f"{name:>28}: hpcp {found['hpcp']['key']} {found['hpcp']['scale']:<5}  "
+              f"cqt {found['cqt']['key']} {found['cqt']['scale']:<5}  {'same' if same else 'DIFFERENT'}")
+    n_synth = sum(truth is not None for _, _, truth in tracks)
+    seconds = sum(len(audio) for _, audio, _ in tracks) / float(sr)
+    print(f"\nkey agreement {agree}/{len(tracks)}; correct on synth: hpcp {correct['hpcp']}/{n_synth}, "
+          f"cqt {correct['cqt']}/{n_synth}")
+    print(f"time for {seconds:.0f} s of audio: hpcp {1000 * times['hpcp']:.0f} ms, cqt {1000 * times['cqt']:.0f} ms")
@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+import threading
+import numpy as np
+
+# -------------------------------------------------------
+# Frame-level feature matrices on disk, read through np.memmap
+#
+#   feature_store.save("song.hpcp.feat", hpcp, hop=1024, sample_rate=22050,
+#                      dtype="float16")          # per-row scaled float16
+#   m = feature_store.open_matrix("song.hpcp.feat")
+#   m.shape, m.hop, m.sample_rate, m.fingerprint, m.times()
+#   m[1000:2000]        # only these rows are paged in, float32
+#   for start, rows in m.blocks(65536): ...
+#
+# Layout: a 4096-byte header (magic + JSON: dtype, shape, hop,
+# sampleRate, parameter fingerprint, offsets), then the rows as one
+# C-ordered block starting on a page boundary, then (float16 only) one
+# float32 scale per row. float16 rows are stored divided by their
+# largest absolute value, so quiet and loud frames keep the same
+# relative precision (~1e-3 of the row maximum) at half the size.
+# Files are written to a temp name and renamed when complete.
+# -------------------------------------------------------
+
+MAGIC = b"ESSFEAT1"
+HEADER_SIZE = 4096
+DTYPES = ("float32", "float16")
+
+
+def _align(n, to=64):
+    return -(-n // to) * to
+
+
+class FeatureWriter:
+    """Append rows block by block (length need not be known in advance)."""
+
+    def __init__(self, path, n_cols, dtype="float32", hop=None, sample_rate=None, fingerprint=None, **meta):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported feature dtype: {dtype}")
+        self.path = path
+        self.n_cols = int(n_cols)
+        self.dtype = dtype
+        self.header = {"dtype": dtype, "hop": hop, "sampleRate": sample_rate,
+                       "fingerprint": fingerprint, "meta": meta}
+        self.n_rows = 0
+        self._scales = []
+        # unique per writer: several threads / processes may write at once
+        self._tmp = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        self._f = open(self._tmp, "wb")
+        self._f.write(b"\0" * HEADER_SIZE)
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.n_cols)
+        if self.dtype == "float16":
+            scale = np.abs(rows).max(axis=1)
+            scale[scale == 0] = 1.0
+            self._scales.append(scale.astype(np.float32))
+            rows = rows / scale[:, None]
+        self._f.write(np.ascontiguousarray(rows, dtype=self.dtype).tobytes())
+        self.n_rows += len(rows)
+
+    def close(self):
+        data_bytes = self.n_rows * self.n_cols * np.dtype(self.dtype).itemsize
+        header = dict(self.header, shape=[self.n_rows, self.n_cols], data_offset=HEADER_SIZE)
+        if self.dtype == "float16":
+            header["scale_offset"] = _align(HEADER_SIZE + data_bytes)
+            self._f.write(b"\0" * (header["scale_offset"] - HEADER_SIZE - data_bytes))
+            scales = np.concatenate(self._scales) if self._scales else np.zeros(0, dtype=np.float32)
+            self._f.write(scales.tobytes())
+        blob = MAGIC + json.dumps(header).encode("utf-8")
+        if len(blob) > HEADER_SIZE:
+            raise ValueError("Feature header too large (metadata should stay small)")
+        self._f.seek(0)
+        self._f.write(blob)
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            os.remove(self._tmp)
+
+
+class FeatureMatrix:
+    """Read-only memory-mapped feature matrix; indexing returns float32 rows."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            blob = f.read(HEADER_SIZE)
+        if not blob.startswith(MAGIC):
+            raise ValueError(f"Not a feature file: {path}")
+        self.header = json.loads(blob[len(MAGIC):].rstrip(b"\0").decode("utf-8"))
+        self.shape = tuple(self.header["shape"])
+        self.dtype = self.header["dtype"]
+        self.hop = self.header["hop"]
+        self.sample_rate = self.header["sampleRate"]
+        self.fingerprint = self.header["fingerprint"]
+        self.meta = self.header["meta"]
+        if self.shape[0] == 0:
+            self._data = np.zeros(self.shape, dtype=self.dtype)
+            self._scale = np.zeros(0, dtype=np.float32) if "scale_offset" in self.header else None
+        else:
+            self._data = np.memmap(path, dtype=self.dtype, mode="r", offset=self.header["data_offset"],
+                                   shape=self.shape)
+            self._scale = None
+            if "scale_offset" in self.header:
+                self._scale = np.memmap(path, dtype=np.float32, mode="r",
+                                        offset=self.header["scale_offset"], shape=(self.shape[0],))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        rows, cols = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        out = np.array(self._data[rows], dtype=np.float32)
+        if self._scale is not None:
+            scale = np.asarray(self._scale[rows], dtype=np.float32)
+            out *= scale[..., None]
+        return out[(Ellipsis,) + cols] if cols else out
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:]
+        return out if dtype is None else out.astype(dtype)
+
+    def blocks(self, block=65536):
+        """(start, float32 rows) for consecutive blocks: bounded memory for any length."""
+        for start in range(0, len(self), block):
+            yield start, self[start:start + block]
+
+    def times(self):
+        """Frame start times in seconds (needs hop and sampleRate in the header)."""
+        return np.arange(len(self)) * float(self.hop) / float(self.sample_rate)
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes + (0 if self._scale is None else self._scale.nbytes)
+
+
+def save(path, X, dtype="float32", hop=None, sample_rate=None, fingerprint=None, **meta):
+    X = np.asarray(X, dtype=np.float32)
+    if X.ndim != 2:
+        X = X.reshape(len(X), -1)
+    with FeatureWriter(path, X.shape[1], dtype, hop, sample_rate, fingerprint, **meta) as w:
+        w.append(X)
+    return FeatureMatrix(path)
+
+
+def open_matrix(path):
+    return FeatureMatrix(path)
+
+
+# -------------------------------------------------------
+# MAIN: header of feature files
+#   python3 feature_store.py info file.feat [...]
+# -------------------------------------------------------
+if __name__ == "__main__":
+    for p in sys.argv[2:] if len(sys.argv) > 1 and sys.argv[1] == "info" else sys.argv[1:]:
+        m = FeatureMatrix(p)
+        print(f"{p}: {m.shape[0]} x {m.shape[1]} {m.dtype}"
+              f"{' (row-scaled)' if m._scale is not None else ''}, hop {m.hop}, "
+              f"sampleRate {m.sample_rate}, fingerprint {m.fingerprint}, {m.nbytes / 1e6:.1f} MB")
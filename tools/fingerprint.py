@@ -0,0 +1,258 @@
+import json
+import os
+import sys
+import numpy as np
+
+from stage_cache import CACHE_DIR, StageCache, source_fingerprint
+import bands
+import spectra
+
+# -------------------------------------------------------
+# Audio fingerprints for near-duplicate detection before analysis
+#
+#   upstream = [canonical_source("/data/My_Song.mp3")]
+#
+# returns the source fingerprint of the first registered copy of the
+# same recording (or of the file itself if it is new), so the decode
+# stage -- and every stage keyed on it -- is read back from the stage
+# cache instead of running the whole pipeline again for a re-encode.
+#
+# Fingerprint (Haitsma & Kalker style): decode at 8 kHz, 2048-sample
+# frames every 256 samples, 33 log-spaced bands between 300 and 2000 Hz,
+# one 32-bit word per frame from the signs of the band-energy
+# differences across frequency and time. Re-encoding flips a few bits
+# only; two tracks match when the bit error rate at the best offset
+# (found from exactly matching words) stays under 0.35. Only a match at
+# offset 0 with the same length (within MAX_FRAME_DIFF frames, ~64 ms)
+# reuses the original's decode: a shifted, trimmed or extended copy has
+# different samples and timestamps, so it is registered as a new source
+# (with the match and its offset noted in its entry).
+# The registry (all words of all registered tracks + a small JSON
+# table) is one .npz next to the stage cache, read once per process.
+# In memory the words are a few sorted runs (a new track is one run,
+# runs of similar size are merged), so registering n tracks costs
+# O(n log n) instead of a full re-sort per track; save() writes one
+# sorted array.
+# -------------------------------------------------------
+
+SAMPLE_RATE = 8000
+FRAME_SIZE = 2048
+HOP_SIZE = 256
+N_BITS = 32
+BAND_EDGES = tuple(float(f) for f in np.geomspace(300.0, 2000.0, N_BITS + 2))
+MAX_FRAME_DIFF = 2
+REGISTRY_PATH = os.path.join(CACHE_DIR, "fingerprints.npz")
+
+
+def decode(path, sample_rate=SAMPLE_RATE):
+    from essentia.standard import MonoLoader
+    return MonoLoader(filename=path, sampleRate=sample_rate)()
+
+
+def subfingerprints(audio, sample_rate=SAMPLE_RATE):
+    """One uint32 word per frame (N_BITS band-energy difference signs)."""
+    spec = spectra.magnitude_spectrogram(audio, FRAME_SIZE, HOP_SIZE)
+    energy = bands.band_energies(spec, sample_rate, BAND_EDGES).astype(np.float64)
+    # near-silent bands would give random signs (dither, quantisation noise):
+    # a floor relative to the track level makes them compare equal instead
+    energy = np.log(energy + 1e-4 * energy.mean() + 1e-20)
+    diff = energy[:, :-1] - energy[:, 1:]                 # across frequency
+    bits = (diff[1:] - diff[:-1]) > 0                    # ... and time
+    return (bits * (1 << np.arange(N_BITS, dtype=np.uint64))).sum(axis=1).astype(np.uint32)
+
+
+def bit_error_rate(a, b):
+    """Fraction of differing bits between two equally long word arrays."""
+    if len(a) == 0:
+        return 1.0
+    diff = np.bitwise_xor(a, b).view(np.uint8)
+    return float(np.unpackbits(diff).sum()) / (N_BITS * len(a))
+
+
+def compare(query, reference, offset):
+    """BER of query[i] vs reference[i + offset] over their overlap, and the overlap length."""
+    start = max(0, -offset)
+    end = min(len(query), len(reference) - offset)
+    if end <= start:
+        return 1.0, 0
+    return bit_error_rate(query[start:end], reference[start + offset:end + offset]), end - start
+
+
+def _merge(runs):
+    """One sorted (words, owner, frame) run from several sorted runs."""
+    words, owner, frame = (np.concatenate(parts) for parts in zip(*runs))
+    order = np.argsort(words, kind="stable")       # radix sort for uint32: linear
+    return words[order], owner[order], frame[order]
+
+
+class Registry:
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.tracks = []            # {source, path, frames, canonical}
+        self.runs = []              # (words, owner, frame): words sorted, owner = track index
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                self.tracks = json.loads(str(data["tracks"]))
+                self.runs.append((data["words"], data["owner"], data["frame"]))
+        self._by_source = {t["source"]: i for i, t in enumerate(self.tracks)}
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def get(self, source):
+        i = self._by_source.get(source)
+        return None if i is None else self.tracks[i]
+
+    def words_of(self, i):
+        out = np.zeros(self.tracks[i]["frames"], dtype=np.uint32)
+        for words, owner, frame in self.runs:
+            sel = owner == i
+            out[frame[sel]] = words[sel]
+        return out
+
+    def _matches(self, words):
+        """(owner, offset) of every registered word equal to one of `words`."""
+        owners, offsets = [], []
+        for run_words, run_owner, run_frame in self.runs:
+            lo = np.searchsorted(run_words, words, side="left")
+            hi = np.searchsorted(run_words, words, side="right")
+            counts = hi - lo
+            q = np.repeat(np.arange(len(words)), counts)
+            idx = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            owners.append(run_owner[idx].astype(np.int64))
+            offsets.append(run_frame[idx].astype(np.int64) - q)
+        return np.concatenate(owners), np.concatenate(offsets)
+
+    def lookup(self, words, max_ber=0.35, min_overlap=0.8, n_offsets=5):
+        """Best registered near-duplicate of `words`: (track index, BER, offset) or None.
+
+        Candidate (track, offset) pairs are voted for by words that match
+        exactly; only the most voted ones are compared bit by bit. The
+        overlap must cover min_overlap of the longer track, so an excerpt
+        or a medley is not taken for the full recording.
+        """
+        if not self.runs or len(words) == 0:
+            return None
+        owner, offset = self._matches(words)
+        if len(owner) == 0:
+            return None
+        # (track, offset) votes; offsets are shifted to be non-negative keys
+        span = len(words) + max(t["frames"] for t in self.tracks) + 1
+        keys, votes = np.unique(owner * 2 * span + offset + span, return_counts=True)
+        best = None
+        for key in keys[np.argsort(-votes)[:n_offsets]]:
+            track, off = int(key // (2 * span)), int(key % (2 * span) - span)
+            reference = self.words_of(track)
+            ber, overlap = compare(words, reference, off)
+            if overlap < min_overlap * max(len(words), len(reference)):
+                continue
+            if ber <= max_ber and (best is None or ber < best[1]):
+                best = (track, ber, off)
+        return best
+
+    def add(self, source, path, words, canonical=None, **match):
+        """Register a track; `match` (e.g. similar_to, offset) is kept in its entry for reference."""
+        i = len(self.tracks)
+        self.tracks.append(dict({"source": source, "path": os.path.abspath(path), "frames": int(len(words)),
+                                 "canonical": canonical or source}, **match))
+        self._by_source[source] = i
+        words = np.asarray(words, dtype=np.uint32)
+        self.runs.append(_merge([(words, np.full(len(words), i, dtype=np.int32),
+                                  np.arange(len(words), dtype=np.int32))]))
+        # binary-counter merging: O(log n) runs, every word re-sorted O(log n) times
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= 2 * len(self.runs[-1][0]):
+            self.runs[-2:] = [_merge(self.runs[-2:])]
+        self.dirty = True
+        return self.tracks[i]
+
+    def save(self):
+        """Write the registry (one sorted run) if anything was added since it was loaded / saved."""
+        if not self.dirty:
+            return
+        if len(self.runs) > 1:
+            self.runs = [_merge(self.runs)]
+        words, owner, frame = self.runs[0]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, tracks=np.array(json.dumps(self.tracks)), words=words, owner=owner, frame=frame)
+        os.replace(tmp, self.path)      # atomic, like the stage cache entries
+        self.dirty = False
+
+
+_registries = {}
+
+
+def shared_registry(path=REGISTRY_PATH):
+    """The process-wide Registry for `path`, read from disk on first use only."""
+    if path not in _registries:
+        _registries[path] = Registry(path)
+    return _registries[path]
+
+
+def canonical_source(path, cache=None, registry=None, verbose=True, save=True):
+    """Source fingerprint to key the decode stage with: the canonical copy's if `path` is a duplicate.
+
+    save=False leaves writing the registry to the caller (one save() after a batch of files).
+    """
+    source = source_fingerprint(path)
+    registry = registry if registry is not None else shared_registry()
+    known = registry.get(source)
+    if known is not None:
+        return known["canonical"]
+
+    cache = cache or StageCache(verbose=False)
+    out, _ = cache.run("fingerprint", {"sampleRate": SAMPLE_RATE, "frameSize": FRAME_SIZE,
+                                       "hopSize": HOP_SIZE, "bands": BAND_EDGES},
+                       lambda: {"words": subfingerprints(decode(path))}, upstream=[source])
+    words = out["words"]
+    match = registry.lookup(words)
+    if match is None:
+        entry = registry.add(source, path, words)
+    else:
+        track, ber, offset = match
+        original = registry.tracks[track]
+        info = {"similar_to": original["source"], "offset": int(offset), "ber": round(ber, 3)}
+        if offset == 0 and abs(len(words) - original["frames"]) <= MAX_FRAME_DIFF:
+            entry = registry.add(source, path, words, canonical=original["canonical"], **info)
+            if verbose:
+                print(f"[dedup] {path} is a copy of {original['path']} (BER {ber:.2f}), "
+                      f"reusing its cached features")
+        else:
+            # same recording, different samples (shifted / trimmed / extended): own decode
+            entry = registry.add(source, path, words, **info)
+            if verbose:
+                print(f"[dedup] {path} matches {original['path']} (BER {ber:.2f}) at an offset of "
+                      f"{offset * HOP_SIZE / float(SAMPLE_RATE):+.2f} s, {len(words)} vs {original['frames']} "
+                      f"frames: analysed as a new source")
+    if save:
+        registry.save()
+    return entry["canonical"]
+
+
+# -------------------------------------------------------
+# MAIN: register files / list duplicates
+#   python3 fingerprint.py scan a.wav a.mp3 b.wav ...
+#   python3 fingerprint.py list
+# -------------------------------------------------------
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "list"
+    registry = shared_registry()
+
+    if cmd == "scan":
+        for p in sys.argv[2:]:
+            canonical_source(p, registry=registry, save=False)
+        registry.save()
+    groups = {}
+    for t in registry.tracks:
+        groups.setdefault(t["canonical"], []).append(t["path"])
+    by_source = {t["source"]: t for t in registry.tracks}
+    for canonical, paths in groups.items():
+        print(f"{canonical}: {paths[0]}")
+        for p in paths[1:]:
+            print(f"    duplicate: {p}")
+        similar = by_source[canonical].get("similar_to")
+        if similar is not None and similar != canonical and similar in by_source:
+            offset_s = by_source[canonical]["offset"] * HOP_SIZE / float(SAMPLE_RATE)
+            print(f"    (same recording as {by_source[similar]['path']} at {offset_s:+.2f} s, own decode)")
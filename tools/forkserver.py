@@ -0,0 +1,458 @@
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+# -------------------------------------------------------
+# Pre-forked warm interpreter for short analysis runs
+#
+#   python3 forkserver.py serve &                       # preload once (~2 s)
+#   python3 forkserver.py run ../AUDIO/10/tuning_frequency.py --preset fast
+#   python3 forkserver.py analyze a.wav b.mp3 --features key,bpm
+#   python3 forkserver.py stop
+#
+# The server imports numpy, Essentia, matplotlib (Agg) and scipy and
+# builds the KeyExtractor / RhythmExtractor2013 / HPCP / ChordsDetection
+# instances of server.Analyzer once, then forks one child per script
+# run or per analysed file. Children share all of that copy-on-write,
+# so a run starts without any import or algorithm construction cost.
+#   run      the script runs in the child with the client's argv, cwd,
+#            environment and stdin/stdout/stderr (passed over the Unix
+#            socket); the client exits with the script's exit code.
+#   analyze  every file is decoded and analysed in its own child, up to
+#            one child per CPU; results come back as JSON lines with the
+#            fork overhead (fork -> result minus analysis time).
+# This file only imports the standard library at the top, so the
+# client side starts in ~20 ms. The server is single-threaded (one
+# selector loop), which keeps fork() safe.
+# A request is one JSON line (terminated by a newline); the server
+# reads it without blocking, over as many reads as it takes, and drops
+# a connection that has not sent a complete request within
+# REQUEST_TIMEOUT_S, so a silent client never stalls the other ones.
+# -------------------------------------------------------
+
+SOCKET_PATH = os.environ.get("ESSENTIA_FORKSERVER", "/tmp/essentia-forkserver.sock")
+REQUEST_TIMEOUT_S = 10.0
+MAX_REQUEST_BYTES = 16 << 20
+
+# imported once in the server and shared by every child
+PRELOAD = ("numpy", "essentia", "essentia.standard", "matplotlib.pyplot", "scipy.signal", "scipy.fft",
+           "scipy.sparse", "spectra", "bands", "frame_matrix", "pipelines", "multirate", "server")
+# modules that read the environment / argv at import time (or hold one
+# that does, like pipelines -> profiling): dropped in "run" children so
+# the script imports them again with its own settings
+PER_RUN = ("stage_cache", "result_cache", "fingerprint", "feature_store", "server", "ingest",
+           "presets", "profiling", "pipelines", "hop_hierarchy")
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# -------------------------------------------------------
+# Server
+# -------------------------------------------------------
+def _send(conn, payload):
+    try:
+        conn.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+    except OSError:
+        pass
+
+
+def _child_run(request, fds):
+    """In the forked child: become the script's process and run it."""
+    import atexit
+    import runpy
+    import traceback
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    for name in PER_RUN:
+        sys.modules.pop(name, None)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", buffering=1, closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False)
+    sys.argv = list(request["argv"])
+    sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))
+    atexit._clear()                  # the server's exit handlers are not the script's
+
+    code = 0
+    try:
+        runpy.run_path(sys.argv[0], run_name="__main__")
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if not isinstance(e.code, (int, type(None))):
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    atexit._run_exitfuncs()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+
+def _child_analyze(analyzer, path, features, wfd):
+    """In the forked child: analyse one file, write one JSON line to the pipe."""
+    t0 = time.perf_counter()
+    try:
+        result = analyzer.analyze(analyzer.load(path), features)
+        result["analysis_ms"] = round(1000 * (time.perf_counter() - t0), 1)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    with os.fdopen(wfd, "wb") as f:
+        f.write(json.dumps({"file": path, "result": result}).encode("utf-8"))
+    os._exit(0)
+
+
+class ForkServer:
+    def __init__(self, path=SOCKET_PATH, max_children=None, verbose=True):
+        self.path = path
+        self.max_children = max_children or os.cpu_count() or 1
+        self.verbose = verbose
+        self.runs = {}          # pid -> client connection ("run" requests)
+        self.jobs = {}          # pid -> (client state, file, read fd, fork time, output chunks)
+        self.clients = {}       # connection -> {"pending": [files], "features": ..., "active": n}
+        self.requests = {}      # connection -> [bytes so far, passed fds, deadline] until the request is complete
+
+    def preload(self):
+        t0 = time.perf_counter()
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        sys.path.insert(0, TOOLS_DIR)
+        import importlib
+        for name in PRELOAD:
+            importlib.import_module(name)
+        import server
+        self.analyzer = server.Analyzer()
+        self.analyzer.analyze(__import__("numpy").zeros(44100, dtype="float32"), server.FEATURES)
+        self.features = server.FEATURES
+        if self.verbose:
+            print(f"[forkserver] preloaded in {time.perf_counter() - t0:.2f} s")
+
+    def serve(self):
+        self.preload()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(64)
+        os.chmod(self.path, 0o600)
+
+        # SIGCHLD / SIGTERM wake the selector through a pipe: one thread only
+        wake_r, wake_w = os.pipe()
+        os.set_blocking(wake_w, False)
+        signal.set_wakeup_fd(wake_w)
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+        self.stopping = False
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "stopping", True))
+
+        self.sel = selectors.DefaultSelector()
+        self.sel.register(listener, selectors.EVENT_READ, "accept")
+        self.sel.register(wake_r, selectors.EVENT_READ, "wake")
+        if self.verbose:
+            print(f"[forkserver] listening on {self.path} (pid {os.getpid()}, up to {self.max_children} children)")
+        try:
+            while not self.stopping:
+                for key, _ in self.sel.select(1.0 if self.requests else None):
+                    kind = key.data
+                    if kind == "accept":
+                        conn, _ = listener.accept()
+                        conn.setblocking(False)
+                        self.requests[conn] = [b"", [], time.monotonic() + REQUEST_TIMEOUT_S]
+                        self.sel.register(conn, selectors.EVENT_READ, "request")
+                    elif kind == "wake":
+                        os.read(wake_r, 512)
+                    elif kind == "request":
+                        self._request_readable(key.fileobj)
+                    elif kind[0] == "client":
+                        self._client_readable(key.fileobj)
+                    elif kind[0] == "job":
+                        self._job_output(kind[1])
+                self._expire_requests()
+                self._reap()
+                self._start_jobs()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for conn in list(self.requests):
+                self._drop_request(conn)
+            for pid in list(self.runs) + list(self.jobs):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            listener.close()
+            os.remove(self.path)
+            if self.verbose:
+                print("[forkserver] stopped")
+
+    def _request_readable(self, conn):
+        """Collect the request line (and the passed fds) over as many reads as it takes."""
+        state = self.requests[conn]
+        try:
+            data, fds, _, _ = socket.recv_fds(conn, 1 << 16, 3)
+        except BlockingIOError:
+            return
+        except OSError:
+            data, fds = b"", []
+        state[0] += data
+        state[1] += fds
+        if b"\n" in state[0]:
+            line = state[0].split(b"\n", 1)[0]
+            fds = state[1]
+            del self.requests[conn]
+            self.sel.unregister(conn)
+            # from here on the connection only carries small replies: a client
+            # that stops reading makes _send give up instead of blocking the loop
+            conn.settimeout(REQUEST_TIMEOUT_S)
+            self._request(conn, line, fds)
+        elif not data or len(state[0]) > MAX_REQUEST_BYTES:
+            if data:
+                _send(conn, {"error": "request too large"})
+            self._drop_request(conn)
+
+    def _expire_requests(self):
+        now = time.monotonic()
+        for conn, (_, _, deadline) in list(self.requests.items()):
+            if now > deadline:
+                self._drop_request(conn)
+
+    def _drop_request(self, conn):
+        _, fds, _ = self.requests.pop(conn)
+        for fd in fds:
+            os.close(fd)
+        self.sel.unregister(conn)
+        conn.close()
+
+    def _request(self, conn, line, fds):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            for fd in fds:
+                os.close(fd)
+            _send(conn, {"error": "bad request"})
+            conn.close()
+            return
+        cmd = request.get("cmd")
+        if not (cmd == "run" and len(fds) == 3):
+            for fd in fds:
+                os.close(fd)
+        if cmd == "stop":
+            _send(conn, {"stopped": True})
+            conn.close()
+            self.stopping = True
+        elif cmd == "run" and len(fds) == 3:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                _child_run(request, fds)
+            for fd in fds:
+                os.close(fd)
+            self.runs[pid] = conn
+            self.sel.register(conn, selectors.EVENT_READ, ("client", pid))
+        elif cmd == "analyze":
+            features = tuple(request.get("features") or self.features)
+            self.clients[conn] = {"pending": list(request["files"]), "features": features, "active": 0}
+            self.sel.register(conn, selectors.EVENT_READ, ("client", None))
+        else:
+            _send(conn, {"error": f"unknown command {cmd!r}"})
+            conn.close()
+
+    def _start_jobs(self):
+        for conn, state in list(self.clients.items()):
+            while state["pending"] and len(self.jobs) + len(self.runs) < self.max_children:
+                path = state["pending"].pop(0)
+                r, w = os.pipe()
+                t0 = time.perf_counter()
+                sys.stdout.flush()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(r)
+                    _child_analyze(self.analyzer, path, state["features"], w)
+                os.close(w)
+                state["active"] += 1
+                self.jobs[pid] = [conn, path, r, t0, []]
+                self.sel.register(r, selectors.EVENT_READ, ("job", pid))
+
+    def _job_output(self, pid):
+        job = self.jobs[pid]
+        chunk = os.read(job[2], 1 << 16)
+        if chunk:
+            job[4].append(chunk)
+            return
+        self.sel.unregister(job[2])
+        os.close(job[2])
+        job[2] = None
+
+    def _finish_job(self, pid, status):
+        conn, path, rfd, t0, chunks = self.jobs.pop(pid)
+        if rfd is not None:              # child exited before EOF was seen: drain the pipe
+            self.sel.unregister(rfd)
+            while True:
+                chunk = os.read(rfd, 1 << 16)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            os.close(rfd)
+        wall_ms = 1000 * (time.perf_counter() - t0)
+        try:
+            line = json.loads(b"".join(chunks))
+        except ValueError:
+            line = {"file": path, "result": {"error": f"worker exited with status {status}"}}
+        line["wall_ms"] = round(wall_ms, 1)
+        analysis_ms = line["result"].get("analysis_ms")
+        line["overhead_ms"] = None if analysis_ms is None else round(wall_ms - analysis_ms, 1)
+        state = self.clients.get(conn)
+        if state is None:
+            return
+        _send(conn, line)
+        state["active"] -= 1
+        if not state["pending"] and state["active"] == 0:
+            _send(conn, {"done": True})
+            self._drop_client(conn)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self.runs:
+                conn = self.runs.pop(pid)
+                _send(conn, {"exit": code})
+                self._drop_client(conn)
+            elif pid in self.jobs:
+                self._finish_job(pid, code)
+
+    def _client_readable(self, conn):
+        # a client only writes its request: anything readable now is EOF (client gone)
+        try:
+            data = conn.recv(1)
+        except OSError:
+            data = b""
+        if data:
+            return
+        for pid, c in list(self.runs.items()):
+            if c is conn:
+                os.kill(pid, signal.SIGTERM)
+        if conn in self.clients:
+            self.clients[conn]["pending"] = []
+            for pid, job in list(self.jobs.items()):
+                if job[0] is conn:
+                    os.kill(pid, signal.SIGTERM)
+        self._drop_client(conn)
+
+    def _drop_client(self, conn):
+        self.clients.pop(conn, None)
+        try:
+            self.sel.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+
+# -------------------------------------------------------
+# Client (standard library only: starts fast)
+# -------------------------------------------------------
+def _connect(path=SOCKET_PATH):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except OSError:
+        sys.exit(f"No fork server on {path} (start it with: python3 {sys.argv[0]} serve)")
+    return conn
+
+
+def _send_request(conn, request, fds=()):
+    """One JSON line; the fds (if any) travel with its first bytes."""
+    data = json.dumps(request).encode("utf-8") + b"\n"
+    sent = socket.send_fds(conn, [data], list(fds)) if fds else 0
+    conn.sendall(data[sent:])
+
+
+def _lines(conn):
+    buf = b""
+    while True:
+        chunk = conn.recv(1 << 16)
+        if not chunk:
+            return
+        buf += chunk
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            yield json.loads(line)
+
+
+def run(argv, path=SOCKET_PATH):
+    """Run a script in a forked warm child; returns its exit code."""
+    conn = _connect(path)
+    request = {"cmd": "run", "argv": [os.path.abspath(argv[0])] + list(argv[1:]), "cwd": os.getcwd(),
+               "env": dict(os.environ)}
+    _send_request(conn, request, [0, 1, 2])
+    for msg in _lines(conn):
+        if "exit" in msg:
+            return msg["exit"]
+        if "error" in msg:
+            print(msg["error"], file=sys.stderr)
+    return 1
+
+
+def analyze(files, features=None, path=SOCKET_PATH):
+    """Yield {"file", "result", "wall_ms", "overhead_ms"} per file, in completion order."""
+    conn = _connect(path)
+    request = {"cmd": "analyze", "files": [os.path.abspath(f) for f in files], "features": features}
+    _send_request(conn, request)
+    for msg in _lines(conn):
+        if msg.get("done"):
+            return
+        yield msg
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if cmd == "serve":
+        workers = None
+        if "--children" in sys.argv:
+            workers = int(sys.argv[sys.argv.index("--children") + 1])
+        ForkServer(max_children=workers).serve()
+    elif cmd == "run":
+        sys.exit(run(sys.argv[2:]))
+    elif cmd == "analyze":
+        args = sys.argv[2:]
+        features = None
+        if "--features" in args:
+            i = args.index("--features")
+            features = args[i + 1].split(",")
+            del args[i:i + 2]
+        overheads = []
+        for msg in analyze(args, features):
+            print(json.dumps(msg))
+            if msg["overhead_ms"] is not None:
+                overheads.append(msg["overhead_ms"])
+        if overheads:
+            overheads.sort()
+            print(f"{len(overheads)} file(s), fork overhead per file: median "
+                  f"{overheads[len(overheads) // 2]:.1f} ms, max {overheads[-1]:.1f} ms", file=sys.stderr)
+    elif cmd == "stop":
+        conn = _connect()
+        _send_request(conn, {"cmd": "stop"})
+        print(next(_lines(conn), {}))
+    else:
+        sys.exit(f"Unknown command: {cmd} (serve | run | analyze | stop)")
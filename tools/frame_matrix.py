@@ -0,0 +1,95 @@
+import numpy as np
+
+from spectra import frame_count as _frame_count_from_zero
+
+# -------------------------------------------------------
+# Preallocated float32 outputs for per-frame algorithm loops
+#
+#   out = FrameMatrix.for_audio(audio, 4096, 2048, width=36, start_from_zero=True)
+#   for frame in FrameGenerator(audio, frameSize=4096, hopSize=2048, startFromZero=True):
+#       out.append(hpcp(*peaks(spectrum(window(frame)))))
+#   out.array               # (frames x 36) float32 view, no final copy
+#
+# instead of list.append + np.array(list): Essentia already returns
+# float32, so every result is copied once, straight into its row of
+# one contiguous float32 block sized from the known frame count. No
+# list of per-frame arrays, no float64 matrix, and as_essentia() hands
+# the result back to Essentia without the copy essentia.array() makes.
+# -------------------------------------------------------
+
+
+def frame_count(n_samples, frame_size, hop_size, start_from_zero=False):
+    """Number of frames FrameGenerator yields for n_samples."""
+    if start_from_zero:
+        return _frame_count_from_zero(n_samples, frame_size, hop_size)
+    if n_samples <= 0:
+        return 0
+    # centred frames (the FrameGenerator default): frame k starts at
+    # k * hop - (frame + 1) // 2; frames are cut while the start is inside
+    # the signal, and the first one whose centre reaches the end is the last
+    start = (frame_size + 1) // 2
+    inside = -(-(n_samples + start) // hop_size)
+    last = -(-(n_samples + start - frame_size // 2) // hop_size)
+    return min(inside, last + 1)
+
+
+def as_essentia(x):
+    """float32 C-contiguous view of x (a copy only if x is not already one)."""
+    return np.ascontiguousarray(x, dtype=np.float32)
+
+
+class FrameMatrix:
+    """Row-by-row float32 builder over a preallocated (n_frames [x width]) block."""
+
+    def __init__(self, n_frames, width=None):
+        shape = (int(n_frames),) if width is None else (int(n_frames), int(width))
+        self.data = np.zeros(shape, dtype=np.float32)
+        self.n = 0
+
+    @classmethod
+    def for_audio(cls, audio, frame_size, hop_size, width=None, start_from_zero=False):
+        return cls(frame_count(len(audio), frame_size, hop_size, start_from_zero), width)
+
+    def __len__(self):
+        return self.n
+
+    def append(self, value):
+        if self.n == len(self.data):
+            # only when the frame count was underestimated: grow geometrically
+            grown = np.zeros((max(1, 2 * len(self.data)),) + self.data.shape[1:], dtype=np.float32)
+            grown[:self.n] = self.data
+            self.data = grown
+        self.data[self.n] = value
+        self.n += 1
+
+    def skip(self):
+        """Leave the next row at zero (e.g. a frame without spectral peaks)."""
+        self.append(0.0)
+
+    @property
+    def array(self):
+        return self.data[:self.n]
+
+
+# -------------------------------------------------------
+# MAIN: frame_count against FrameGenerator over a grid of (n, frame, hop)
+#   python3 frame_matrix.py
+# -------------------------------------------------------
+if __name__ == "__main__":
+    import essentia.standard as es
+
+    checked = 0
+    for frame_size in (1, 2, 3, 4, 5, 7, 16, 17, 1023, 1024, 2048, 4096):
+        for hop_size in (1, 2, 3, 7, 16, 441, 512, 1024, 2048, 4096, 8192):
+            for n in sorted({*range(1, 40), frame_size - 1, frame_size, frame_size + 1,
+                             2 * frame_size + hop_size, 100000, 100001}):
+                for start_from_zero in (False, True):
+                    if n <= 0:
+                        continue
+                    expected = sum(1 for _ in es.FrameGenerator(np.zeros(n, dtype=np.float32), frameSize=frame_size,
+                                                                hopSize=hop_size, startFromZero=start_from_zero))
+                    got = frame_count(n, frame_size, hop_size, start_from_zero)
+                    assert got == expected, (n, frame_size, hop_size, start_from_zero, got, expected)
+                    checked += 1
+    print(f"frame_count matches FrameGenerator on {checked} (n, frame, hop, startFromZero) cases")
+
@@ -0,0 +1,109 @@
+import sys
+from math import gcd
+import numpy as np
+
+from frame_matrix import frame_count
+
+# -------------------------------------------------------
+# Energy gate: skip silent / near-silent frames
+#
+#   active = gate.active_frames(audio, 4096, 2048, start_from_zero=True)
+#   for i, frame in enumerate(FrameGenerator(audio, frameSize=4096, hopSize=2048, startFromZero=True)):
+#       if not active[i]:
+#           out.skip()                 # or gate.NO_SIGNAL for labels
+#           continue
+#       ...Spectrum -> SpectralPeaks -> HPCP...
+#
+# The RMS of every FrameGenerator frame is computed in one pass from
+# a cumulative sum of squared samples over blocks of gcd(frame, hop)
+# samples, without cutting a single frame. A frame is active when its
+# level is within `threshold_db` of the track loudness (the 95th
+# percentile of frame levels) and above an absolute floor, so
+# intros, fade-outs, gaps and digital silence are skipped whatever
+# the mastering level. Skipped frames are explicit: zero HPCP rows,
+# NO_SIGNAL ("N", the MIREX no-chord label) for chord labels, and no
+# contribution to averaged estimates such as tuning.
+# -------------------------------------------------------
+
+GATE_DB = -50.0          # relative to the track loudness
+FLOOR_DB = -90.0         # absolute, dBFS
+NO_SIGNAL = "N"
+
+
+def _block_energies(audio, g, chunk=1 << 22):
+    """Sum of squares of every g-sample block (last block zero-padded), float64."""
+    n_blocks = -(-len(audio) // g)
+    out = np.empty(n_blocks)
+    step = max(1, chunk // g) * g
+    for start in range(0, len(audio), step):
+        x = np.asarray(audio[start:start + step], dtype=np.float32)
+        if len(x) % g:
+            x = np.concatenate([x, np.zeros(g - len(x) % g, dtype=np.float32)])
+        out[start // g:start // g + len(x) // g] = np.square(x, dtype=np.float64).reshape(-1, g).sum(axis=1)
+    return out
+
+
+def frame_rms(audio, frame_size, hop_size, start_from_zero=False):
+    """RMS of every FrameGenerator(audio, frame_size, hop_size, start_from_zero) frame."""
+    n = len(audio)
+    count = frame_count(n, frame_size, hop_size, start_from_zero)
+    # centred frames start half a frame before k * hop (zero-padded at both ends)
+    offset = 0 if start_from_zero else (frame_size + 1) // 2
+    g = gcd(gcd(frame_size, hop_size), offset)
+    cumulative = np.concatenate([[0.0], np.cumsum(_block_energies(audio, g))])
+    starts = np.arange(count, dtype=np.int64) * hop_size - offset
+    first = np.clip(starts // g, 0, len(cumulative) - 1)
+    last = np.clip((starts + frame_size) // g, 0, len(cumulative) - 1)
+    energy = np.maximum(cumulative[last] - cumulative[first], 0.0)
+    return np.sqrt(energy / frame_size).astype(np.float32)
+
+
+def level_db(rms):
+    return 20.0 * np.log10(np.maximum(rms, 1e-12))
+
+
+def active_mask(rms, threshold_db=GATE_DB, floor_db=FLOOR_DB, percentile=95.0):
+    """True for frames within threshold_db of the track loudness and above floor_db."""
+    db = level_db(np.asarray(rms))
+    if threshold_db is None:
+        return db > floor_db
+    audible = db[db > floor_db]
+    if not len(audible):
+        return np.zeros(len(db), dtype=bool)
+    return db > max(np.percentile(audible, percentile) + threshold_db, floor_db)
+
+
+def active_frames(audio, frame_size, hop_size, start_from_zero=False, threshold_db=GATE_DB, floor_db=FLOOR_DB):
+    """Boolean mask over the FrameGenerator frames: False = skip (no signal)."""
+    return active_mask(frame_rms(audio, frame_size, hop_size, start_from_zero), threshold_db, floor_db)
+
+
+def silent_regions(active, hop_size, sample_rate):
+    """[(start_s, end_s), ...] runs of inactive frames, on the frame-start time grid."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[1], np.asarray(active, dtype=np.int8), [1]])))
+    hop_s = hop_size / float(sample_rate)
+    return [(round(int(a) * hop_s, 3), round(int(b) * hop_s, 3)) for a, b in zip(edges[::2], edges[1::2])]
+
+
+def report(active, hop_size, sample_rate, name="gate"):
+    skipped = int(len(active) - np.count_nonzero(active))
+    print(f"[{name}] {skipped}/{len(active)} silent frames skipped "
+          f"({100.0 * skipped / max(1, len(active)):.1f}%, "
+          f"{skipped * hop_size / float(sample_rate):.1f} s)")
+
+
+# -------------------------------------------------------
+# MAIN: how much of a file the gate would skip
+#   python3 gate.py /data/My_Song.wav [threshold_db]
+# -------------------------------------------------------
+if __name__ == "__main__":
+    from essentia.standard import MonoLoader
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "/data/My_Song.wav"
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else GATE_DB
+    sr, frame_size, hop_size = 44100, 4096, 2048
+    audio = MonoLoader(filename=path, sampleRate=sr)()
+    active = active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=threshold)
+    report(active, hop_size, sr, path)
+    for start, end in silent_regions(active, hop_size, sr):
+        print(f"  no signal {start:8.2f} - {end:8.2f} s")
@@ -0,0 +1,249 @@
+import sys
+import time
+from functools import reduce
+from math import gcd
+import numpy as np
+
+import gate
+import pipelines
+import profiling   # per-algorithm timings of the base pass (pipelines.hpcp_frames) and edge frames
+from frame_matrix import frame_count
+
+# -------------------------------------------------------
+# One HPCP pass at the finest hop, coarser grids derived from it
+#
+#   hh = HopHierarchy(audio_44k, cache=StageCache(), upstream=[decode_fp])
+#   key_frames = hh.grid(2048)                                  # exact
+#   beat_frames = hh.grid(4096, start_from_zero=False)          # exact
+#   chroma = hh.grid(1024, frame_size=4096, sample_rate=22050)  # pooled
+#   hh.report()                                                 # which is which
+#
+# The base grid is HPCP (Windowing -> Spectrum -> SpectralPeaks ->
+# HPCP, pipelines.hpcp_frames) at 44.1 kHz, frame 4096, with the
+# largest hop from which every consumer in GRIDS starts on a base
+# frame. With a StageCache it is one "hpcp_base" matrix stage, so the
+# key and beat-chord scripts (and chromagram_hpcp.py --pooled) share a
+# single pass.
+# A requested grid is derived
+#   exactly       same sample rate and frame size, and every frame
+#                 start k * hop - offset a multiple of the base hop:
+#                 strided subsampling of the base rows, plus the few
+#                 edge frames outside the base grid (the half-empty
+#                 first centred frame, tail frames) computed directly
+#   approximately otherwise: the mean of the base frames that lie
+#                 inside the requested frame (the nearest base frame
+#                 when none fits), i.e. strided mean pooling
+# and every derivation is recorded with its method and exactness.
+# Frames below the energy gate (gate.py) are zero rows in both cases.
+# A cached base stays a memory-mapped FeatureMatrix: derivations read
+# it BLOCK output frames at a time, never the whole matrix.
+# -------------------------------------------------------
+
+SAMPLE_RATE = 44100
+FRAME_SIZE = 4096
+HPCP_SIZE = 36
+BLOCK = 16384           # output frames derived per read of base rows
+
+# the frame-level HPCP consumers of the AUDIO/ scripts, in their own sample rate
+GRIDS = {
+    "chromagram": {"sample_rate": 22050, "frame_size": 4096, "hop_size": 1024, "start_from_zero": True},
+    "key_visual": {"sample_rate": 44100, "frame_size": 4096, "hop_size": 2048, "start_from_zero": True},
+    "chords_beats": {"sample_rate": 44100, "frame_size": 4096, "hop_size": 4096, "start_from_zero": False},
+}
+
+
+def _in_base_units(sample_rate, frame_size, hop_size, start_from_zero, base_rate):
+    """(frame, hop, offset) of a grid in base-rate samples; frame k starts at k * hop - offset."""
+    scale = base_rate / float(sample_rate)
+    offset = 0 if start_from_zero else (frame_size + 1) // 2
+    return frame_size * scale, hop_size * scale, offset * scale
+
+
+def finest_hop(grids, sample_rate=SAMPLE_RATE, frame_size=FRAME_SIZE):
+    """Base hop that puts every frame start of the exactly derivable grids on a base frame."""
+    steps = []
+    for g in grids:
+        frame, hop, offset = _in_base_units(g["sample_rate"], g["frame_size"], g["hop_size"],
+                                            g["start_from_zero"], sample_rate)
+        if g["sample_rate"] == sample_rate and frame == frame_size:
+            steps += [int(hop), int(offset)]
+    if not steps:
+        return min(int(g["hop_size"] * sample_rate / g["sample_rate"]) for g in grids)
+    return reduce(gcd, steps)
+
+
+def _frame(audio, start, size):
+    """audio[start:start + size], zero-padded on either side."""
+    out = np.zeros(size, dtype=np.float32)
+    a, b = max(start, 0), min(start + size, len(audio))
+    if b > a:
+        out[a - start:b - start] = audio[a:b]
+    return out
+
+
+class HopHierarchy:
+    def __init__(self, audio, sample_rate=SAMPLE_RATE, frame_size=FRAME_SIZE, hop_size=None, hpcp_size=HPCP_SIZE,
+                 grids=GRIDS, gate_db=gate.GATE_DB, cache=None, upstream=()):
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop_size = hop_size or finest_hop(grids.values(), sample_rate, frame_size)
+        self.hpcp_size = hpcp_size
+        self.gate_db = gate_db
+        self.derivations = []
+        self._chain = None
+
+        def compute():
+            return pipelines.hpcp_frames(audio, sample_rate, frame_size, self.hop_size, hpcp_size, gate_db=gate_db)
+
+        t0 = time.perf_counter()
+        if cache is None:
+            self.base, self.fingerprint = compute(), None
+        else:
+            params = {"sampleRate": sample_rate, "frameSize": frame_size, "hopSize": self.hop_size,
+                      "size": hpcp_size, "gateDb": gate_db}
+            self.base, self.fingerprint = cache.matrix("hpcp_base", params, compute, upstream=list(upstream),
+                                                       hop=self.hop_size, sample_rate=sample_rate)
+        self.base_s = time.perf_counter() - t0
+
+    def _rows(self, lo, hi):
+        """Base rows lo:hi as float32 (a page range of the memory map when cached)."""
+        return np.asarray(self.base[lo:hi], dtype=np.float32)
+
+    # --- exact: strided subsampling ---
+    def _direct(self, starts):
+        """HPCP of frames outside the base grid, gated against the same track loudness."""
+        if self._chain is None:
+            import essentia.standard as es
+            self._chain = (profiling.wrap(es.Windowing(type="hann"), "Windowing"),
+                           profiling.wrap(es.Spectrum(), "Spectrum"),
+                           profiling.wrap(es.SpectralPeaks(sampleRate=self.sample_rate), "SpectralPeaks"),
+                           profiling.wrap(es.HPCP(size=self.hpcp_size, sampleRate=self.sample_rate), "HPCP"))
+        window, spectrum, peaks, hpcp = self._chain
+        frames = [_frame(self.audio, int(s), self.frame_size) for s in starts]
+        rms = np.array([np.sqrt(np.mean(np.square(f, dtype=np.float64))) for f in frames])
+        base_rms = gate.frame_rms(self.audio, self.frame_size, self.hop_size, start_from_zero=True)
+        active = gate.active_mask(np.concatenate([base_rms, rms]), self.gate_db)[len(base_rms):]
+        out = np.zeros((len(frames), self.hpcp_size), dtype=np.float32)
+        for i, f in enumerate(frames):
+            if active[i]:
+                freqs, mags = peaks(spectrum(window(f)))
+                if len(freqs) > 0:
+                    out[i] = hpcp(freqs, mags)
+        return out
+
+    def _subsample(self, starts):
+        j = starts // self.hop_size
+        inside = (j >= 0) & (j < len(self.base))
+        X = np.zeros((len(starts), self.hpcp_size), dtype=np.float32)
+        rows = np.flatnonzero(inside)
+        for a in range(0, len(rows), BLOCK):
+            sel = rows[a:a + BLOCK]
+            lo = j[sel[0]]
+            X[sel] = self._rows(lo, j[sel[-1]] + 1)[j[sel] - lo]
+        outside = np.flatnonzero(~inside)
+        if len(outside):
+            X[outside] = self._direct(starts[outside])
+        return X, len(outside)
+
+    # --- approximate: strided mean pooling ---
+    def _pool(self, starts, frame):
+        h, n = self.hop_size, len(self.base)
+        first = np.clip(np.ceil(starts / h), 0, n - 1).astype(np.int64)
+        last = np.clip(np.floor((starts + frame - self.frame_size) / h), 0, n - 1).astype(np.int64)
+        nearest = np.clip(np.rint((starts + (frame - self.frame_size) / 2.0) / h), 0, n - 1).astype(np.int64)
+        empty = last < first
+        first[empty] = last[empty] = nearest[empty]
+        X = np.zeros((len(starts), self.hpcp_size), dtype=np.float32)
+        for a in range(0, len(starts), BLOCK):
+            f, l = first[a:a + BLOCK], last[a:a + BLOCK]
+            lo = f.min()
+            rows = self._rows(lo, l.max() + 1)
+            cumulative = np.concatenate([np.zeros((1, self.hpcp_size)), np.cumsum(rows, axis=0, dtype=np.float64)])
+            X[a:a + BLOCK] = (cumulative[l - lo + 1] - cumulative[f - lo]) / (l - f + 1)[:, None]
+        return X
+
+    def grid(self, hop_size, frame_size=None, sample_rate=None, start_from_zero=True, name=None):
+        """(frames x hpcp_size) float32 HPCP on the FrameGenerator grid of the given parameters."""
+        t0 = time.perf_counter()
+        sample_rate = sample_rate or self.sample_rate
+        frame_size = frame_size or self.frame_size
+        frame, hop, offset = _in_base_units(sample_rate, frame_size, hop_size, start_from_zero, self.sample_rate)
+        # length of the audio at the requested rate (as resampled by multirate.py)
+        n_samples = -(-len(self.audio) * int(sample_rate) // int(self.sample_rate))
+        n = frame_count(n_samples, frame_size, hop_size, start_from_zero)
+        exact = (sample_rate == self.sample_rate and frame == self.frame_size
+                 and hop % self.hop_size == 0 and offset % self.hop_size == 0)
+        if exact:
+            starts = np.arange(n, dtype=np.int64) * int(hop) - int(offset)
+            X, direct = self._subsample(starts)
+            method = "identity" if hop == self.hop_size and offset == 0 else "subsample"
+        elif len(self.base):
+            X, direct, method = self._pool(np.arange(n) * hop - offset, frame), 0, "pool"
+        else:
+            X, direct, method = np.zeros((n, self.hpcp_size), dtype=np.float32), 0, "pool"
+        self.derivations.append({
+            "name": name, "sample_rate": sample_rate, "frame_size": frame_size, "hop_size": hop_size,
+            "start_from_zero": start_from_zero, "frames": n, "method": method, "exact": exact,
+            "direct_frames": direct, "ms": 1000 * (time.perf_counter() - t0)})
+        return X
+
+    def named(self, name):
+        g = GRIDS[name]
+        return self.grid(g["hop_size"], g["frame_size"], g["sample_rate"], g["start_from_zero"], name=name)
+
+    def report(self):
+        print(f"[hop hierarchy] base: {len(self.base)} frames, {self.sample_rate} Hz, frame {self.frame_size}, "
+              f"hop {self.hop_size} ({1000 * self.base_s:.0f} ms)")
+        for d in self.derivations:
+            label = d["name"] or f"hop {d['hop_size']}"
+            centred = "" if d["start_from_zero"] else " (centred)"
+            edges = f", {d['direct_frames']} edge frame(s) computed" if d["direct_frames"] else ""
+            print(f"  {label}: {d['frames']} frames @ {d['sample_rate']} Hz, frame {d['frame_size']}, "
+                  f"hop {d['hop_size']}{centred} -> {d['method']}, "
+                  f"{'exact' if d['exact'] else 'approximate'}{edges}")
+
+
+# -------------------------------------------------------
+# MAIN: derived grids vs computing every grid from scratch
+#   python3 hop_hierarchy.py /data/My_Song.wav
+# -------------------------------------------------------
+if __name__ == "__main__":
+    import essentia.standard as es
+    from multirate import MultiRateAudio
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "/data/My_Song.wav"
+    source = MultiRateAudio(path)
+
+    def from_scratch(g):
+        audio = source.at(g["sample_rate"])
+        chain = (es.Windowing(type="hann"), es.Spectrum(), es.SpectralPeaks(sampleRate=g["sample_rate"]),
+                 es.HPCP(size=HPCP_SIZE, sampleRate=g["sample_rate"]))
+        rows = []
+        for f in es.FrameGenerator(audio, frameSize=g["frame_size"], hopSize=g["hop_size"],
+                                   startFromZero=g["start_from_zero"]):
+            freqs, mags = chain[2](chain[1](chain[0](f)))
+            rows.append(chain[3](freqs, mags) if len(freqs) else np.zeros(HPCP_SIZE, dtype=np.float32))
+        return np.array(rows, dtype=np.float32)
+
+    audio = source.at(SAMPLE_RATE)
+    for g in GRIDS.values():
+        source.at(g["sample_rate"])
+    t0 = time.perf_counter()
+    reference = {name: from_scratch(g) for name, g in GRIDS.items()}
+    t_scratch = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hh = HopHierarchy(audio, gate_db=None)          # ungated, like the from-scratch loops
+    derived = {name: hh.named(name) for name in GRIDS}
+    t_derived = time.perf_counter() - t0
+    hh.report()
+
+    print(f"\nfrom scratch: {1000 * t_scratch:.0f} ms, one base pass + derivations: {1000 * t_derived:.0f} ms")
+    for name in GRIDS:
+        ref, X = reference[name], derived[name]
+        n = min(len(ref), len(X))
+        cos = np.sum(ref[:n] * X[:n], axis=1) / (np.linalg.norm(ref[:n], axis=1) * np.linalg.norm(X[:n], axis=1)
+                                                  + 1e-12)
+        print(f"  {name}: {len(X)} frames (direct {len(ref)}), max |diff| {np.max(np.abs(ref[:n] - X[:n])):.2e}, "
+              f"mean cosine {np.mean(cos):.4f}")
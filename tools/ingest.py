@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import inspect
+import json
+import multiprocessing as mp
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+import feature_store
+import pipelines
+from multirate import MultiRateAudio
+from pipelines import PIPELINES
+from stage_cache import _jsonable
+
+# -------------------------------------------------------
+# Corpus ingestion: decode, analysis and writing overlapped
+#
+#   python3 ingest.py /data/corpus/*.wav --out /data/features \
+#       --pipelines key chords hpcp_frames --analysis-workers 4
+#
+# Three stages joined by bounded asyncio queues:
+#   decode    one native-rate decode + resampling (multirate.py), thread pool
+#   analysis  tools/pipelines.py functions in a process pool
+#   write     JSON, feature_store .feat files and plots in a thread pool
+# Every stage runs a fixed number of workers (its concurrency limit)
+# and a full queue blocks the stage before it, so at most
+# queue_size + workers decoded tracks are held in memory and
+# throughput follows the slowest stage instead of the sum of all.
+# A failed track is reported and skipped; Ctrl-C / SIGTERM stops
+# feeding new files and lets the tracks already in flight finish.
+# Outputs are named after the input's path below the inputs' common
+# directory, extension included (a/My_Song.wav -> a__My_Song.wav.json),
+# so My_Song.wav and My_Song.mp3 do not overwrite each other.
+# -------------------------------------------------------
+
+
+def hpcp_frames(audio, sr=44100, hop_size=2048):
+    return {"hpcp": pipelines.hpcp_frames(audio, sr, hop_size=hop_size)}
+
+
+# pipelines.py functions + frame-level HPCP (a matrix -> .feat output)
+ANALYSES = dict({name: fn for name, (fn, _) in PIPELINES.items()}, hpcp_frames=hpcp_frames)
+
+
+def _defaults(name):
+    params = inspect.signature(ANALYSES[name]).parameters
+    return {k: params[k].default for k in ("sr", "hop_size") if k in params}
+
+
+def decode(path, rates):
+    """Runs in the decode thread pool: one decode, every other rate resampled from it."""
+    audio = MultiRateAudio(path)
+    return {sr: audio.at(sr) for sr in sorted(rates, reverse=True)}
+
+
+def analyze(names, audio):
+    """Runs in a worker process: every selected analysis on the decoded audio."""
+    out = {}
+    for name in names:
+        sr = _defaults(name)["sr"]
+        out[name] = ANALYSES[name](audio[sr], sr)
+    return out
+
+
+def _ignore_sigint():
+    # Ctrl-C reaches the whole process group: workers keep going, the loop decides
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def output_stem(path, root=None):
+    """File name prefix for the outputs of `path`: its path below `root`, separators -> "__"."""
+    path = os.path.abspath(path)
+    rel = os.path.relpath(path, root) if root else os.path.basename(path)
+    return rel.replace(os.sep, "__")
+
+
+def _dump_json(obj, path):
+    # temp name unique per job, renamed when complete
+    tmp = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(obj, f, indent=4)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def write(path, results, out_dir, plots=False, root=None):
+    """Runs in the write thread pool: <stem>.json, <stem>.<analysis>.<key>.feat, <stem>.png."""
+    stem = output_stem(path, root)
+    summary = {"source": os.path.abspath(path), "results": {}}
+    written = []
+    for name, result in results.items():
+        fields = {}
+        for key, value in result.items():
+            if isinstance(value, np.ndarray) and value.ndim == 2:
+                meta = _defaults(name)
+                feat = os.path.join(out_dir, f"{stem}.{name}.{key}.feat")
+                feature_store.save(feat, value, hop=meta.get("hop_size"), sample_rate=meta["sr"])
+                fields[key] = {"feature_file": os.path.basename(feat), "shape": list(value.shape)}
+                written.append(feat)
+            else:
+                fields[key] = _jsonable(value)
+        summary["results"][name] = fields
+    json_path = os.path.join(out_dir, stem + ".json")
+    _dump_json(summary, json_path)
+    written.append(json_path)
+    if plots:
+        written.append(plot(results, os.path.join(out_dir, stem + ".png"), stem))
+    return written
+
+
+def plot(results, path, title):
+    # object-oriented Figure (no pyplot state), safe outside the main thread
+    from matplotlib.figure import Figure
+    arrays = [(f"{name}: {key}", np.asarray(v)) for name, result in results.items()
+              for key, v in result.items() if isinstance(v, np.ndarray) and v.ndim in (1, 2) and v.size > 1]
+    fig = Figure(figsize=(14, 2.5 * max(1, len(arrays))))
+    for i, (label, v) in enumerate(arrays):
+        ax = fig.add_subplot(max(1, len(arrays)), 1, i + 1)
+        if v.ndim == 2:
+            ax.imshow(v.T, aspect="auto", origin="lower", interpolation="nearest")
+        else:
+            ax.plot(v)
+        ax.set_title(label, fontsize=9)
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+    return path
+
+
+# -------------------------------------------------------
+# Pipeline
+# -------------------------------------------------------
+class StageStats:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.done = 0
+        self.failed = 0
+
+    def utilization(self, wall):
+        return self.busy / (self.workers * wall) if wall > 0 else 0.0
+
+
+async def _stage(stats, inbox, outbox, job):
+    """One worker of a stage: take an item, run the job, pass the result on (None ends the stream)."""
+    while True:
+        item = await inbox.get()
+        if item is None:
+            break
+        path, payload = item
+        t0 = time.perf_counter()
+        try:
+            result = await job(path, payload)
+        except Exception as e:
+            stats.failed += 1
+            print(f"[{stats.name}] {path}: {type(e).__name__}: {e}")
+            continue
+        finally:
+            stats.busy += time.perf_counter() - t0
+        stats.done += 1
+        if outbox is not None:
+            await outbox.put((path, result))     # blocks while the next stage is behind
+
+
+async def _run_stage(stats, inbox, outbox, job, n_next):
+    await asyncio.gather(*(_stage(stats, inbox, outbox, job) for _ in range(stats.workers)))
+    if outbox is not None:
+        for _ in range(n_next):
+            await outbox.put(None)
+
+
+async def ingest(paths, out_dir, names=("key", "chords"), decode_workers=2, analysis_workers=None,
+                 write_workers=1, queue_size=4, plots=False, verbose=True):
+    """Process every file in `paths`; returns per-stage statistics."""
+    os.makedirs(out_dir, exist_ok=True)
+    analysis_workers = analysis_workers or max(1, (os.cpu_count() or 2) - 1)
+    rates = sorted({_defaults(n)["sr"] for n in names})
+    paths = list(paths)
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else None
+    loop = asyncio.get_running_loop()
+
+    stats = [StageStats("decode", decode_workers), StageStats("analysis", analysis_workers),
+             StageStats("write", write_workers)]
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in range(3)]
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    # spawn: no forked copies of Essentia / pyplot state in the workers
+    with ThreadPoolExecutor(decode_workers) as io_pool, \
+            ThreadPoolExecutor(write_workers) as write_pool, \
+            ProcessPoolExecutor(analysis_workers, mp_context=mp.get_context("spawn"),
+                                initializer=_ignore_sigint) as cpu_pool:
+
+        async def decode_job(path, _):
+            return await loop.run_in_executor(io_pool, decode, path, rates)
+
+        async def analysis_job(path, audio):
+            return await loop.run_in_executor(cpu_pool, analyze, list(names), audio)
+
+        async def write_job(path, results):
+            written = await loop.run_in_executor(write_pool, write, path, results, out_dir, plots, root)
+            if verbose:
+                print(f"[write] {path} -> {len(written)} file(s)")
+            return written
+
+        async def feed():
+            for i, path in enumerate(paths):
+                if stop.is_set():
+                    print(f"Stopping: {len(paths) - i} file(s) not started, finishing the rest")
+                    break
+                await queues[0].put((path, None))
+            for _ in range(decode_workers):
+                await queues[0].put(None)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            feed(),
+            _run_stage(stats[0], queues[0], queues[1], decode_job, analysis_workers),
+            _run_stage(stats[1], queues[1], queues[2], analysis_job, write_workers),
+            _run_stage(stats[2], queues[2], None, write_job, 0),
+        )
+        wall = time.perf_counter() - t0
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.remove_signal_handler(sig)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return {"wall_s": wall, "tracks": stats[2].done,
+            "stages": {s.name: {"workers": s.workers, "busy_s": s.busy, "done": s.done, "failed": s.failed,
+                                "utilization": s.utilization(wall)} for s in stats}}
+
+
+def run(paths, out_dir, **kwargs):
+    return asyncio.run(ingest(paths, out_dir, **kwargs))
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overlapped decode / analysis / write over a corpus")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--out", default="/data/features")
+    parser.add_argument("--pipelines", nargs="+", choices=sorted(ANALYSES), default=["key", "chords"])
+    parser.add_argument("--decode-workers", type=int, default=2)
+    parser.add_argument("--analysis-workers", type=int, default=None, help="default: CPU count - 1")
+    parser.add_argument("--write-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4, help="items buffered between two stages")
+    parser.add_argument("--plots", action="store_true")
+    args = parser.parse_args()
+
+    report = run(args.files, args.out, names=args.pipelines, decode_workers=args.decode_workers,
+                 analysis_workers=args.analysis_workers, write_workers=args.write_workers,
+                 queue_size=args.queue_size, plots=args.plots)
+
+    wall = report["wall_s"]
+    print(f"\n{report['tracks']} track(s) in {wall:.1f} s")
+    for name, st in report["stages"].items():
+        print(f"  {name:9s} {st['workers']:2d} worker(s)  busy {st['busy_s']:7.1f} s  "
+              f"utilization {100 * st['utilization']:5.1f}%  done {st['done']}  failed {st['failed']}")
+    slowest = max(report["stages"], key=lambda n: report["stages"][n]["utilization"])
+    print(f"Bottleneck: {slowest}")
+    sys.exit(1 if any(st["failed"] for st in report["stages"].values()) else 0)
@@ -0,0 +1,60 @@
+import importlib
+import importlib.util
+import sys
+import threading
+
+# -------------------------------------------------------
+# Deferred imports for heavy optional modules
+#
+#   try:
+#       _fft = lazy.module("scipy.fft")     # ~0 ms now, ~0.3 s on first use
+#       HAVE_SCIPY = True
+#   except ImportError:
+#       ...
+#
+# The module is found (so a missing package still raises ImportError
+# right away, keeping the usual try/except fallbacks) but only imported
+# on first attribute access. Scripts that never reach the FFT / sparse
+# / resampling path no longer pay for importing scipy at startup.
+#
+# The first access runs a plain importlib.import_module under a lock:
+# importlib's LazyLoader is not thread-safe (3.11), and the ingest,
+# server and fork-server pools touch these modules from several threads
+# at once, which could see a half-initialised module.
+# -------------------------------------------------------
+
+_lock = threading.Lock()
+
+
+class _Deferred:
+    """Stand-in for module `name`; attribute access imports it once, then forwards."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        mod = self.__dict__["_module"]
+        if mod is None:
+            with _lock:
+                mod = self.__dict__["_module"]
+                if mod is None:
+                    mod = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = mod
+        return mod
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "imported" if self.__dict__["_module"] is not None else "deferred"
+        return f"<{state} module {self.__dict__['_name']!r}>"
+
+
+def module(name):
+    """Module `name`, imported on first attribute access (thread-safe)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named {name!r}")
+    return _Deferred(name)
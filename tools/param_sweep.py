@@ -0,0 +1,306 @@
+import argparse
+import itertools
+import json
+import os
+import time
+import numpy as np
+
+import synth_signals as synth
+import pipelines
+from benchmark import f_measure, key_score, metadata
+from presets import PRESETS_PATH
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    HAVE_MPL = True
+except ImportError:
+    HAVE_MPL = False
+
+# -------------------------------------------------------
+# Speed / accuracy parameter sweep -> named presets
+#
+# Runs the key, chords, tuning and beat pipelines of pipelines.py over
+# a grid of sampleRate / frameSize / hopSize / hpcp size, on synthetic
+# signals with known truth or on a labelled set (--manifest), and
+#   - writes every (config, runtime, agreement) row to sweep_results.json
+#   - plots runtime vs agreement with the Pareto front (sweep_pareto.png)
+#   - writes presets.json with, per pipeline,
+#       accurate : best agreement (cheapest among ties)
+#       balanced : cheapest within --margin of the best agreement
+#       fast     : cheapest that still meets --bar
+#
+#   python3 param_sweep.py --length 20 --bar 0.9
+#   python3 param_sweep.py --manifest labels.json --only key chords
+#
+# Manifest entries: {"path": ..., "key": "D", "scale": "major",
+# "tuning_cents": 12.0, "bpm": 120.0, "beats": [...], "chords":
+# [{"start", "end", "chord"}, ...]}. Any label that is missing is
+# replaced by the output of the pipeline's default settings (the
+# settings the scripts use), so the score becomes agreement with them.
+# -------------------------------------------------------
+
+FRAME_HOPS = {
+    "key": [(2048, 1024), (4096, 2048), (4096, 4096), (8192, 4096)],
+    "chords": [(2048, 512), (4096, 1024), (4096, 2048), (8192, 2048)],
+    "tuning": [(2048, 1024), (4096, 2048), (4096, 4096), (8192, 4096)],
+}
+SAMPLE_RATES = [22050, 44100]
+HPCP_SIZES = [12, 36]
+# RhythmExtractor2013 only runs at 44100 Hz: its only knob is the beat tracker
+BEAT_METHODS = ["degara", "multifeature"]
+
+
+def grid(name):
+    if name == "beats":
+        return [{"method": m} for m in BEAT_METHODS]
+    configs = []
+    for sr, (frame, hop) in itertools.product(SAMPLE_RATES, FRAME_HOPS[name]):
+        base = {"sr": sr, "frame_size": frame, "hop_size": hop}
+        if name == "tuning":
+            configs.append(base)
+        else:
+            configs.extend(dict(base, hpcp_size=size) for size in HPCP_SIZES)
+    return configs
+
+
+def run(name, audio, config):
+    if name == "key":
+        return pipelines.key(audio, **config)
+    if name == "chords":
+        return pipelines.chords(audio, **config)
+    if name == "tuning":
+        return pipelines.tuning(audio, **config)
+    if name == "beats":
+        return pipelines.rhythm_extractor(audio, **config)
+    raise ValueError(f"Unknown pipeline: {name}")
+
+
+SIGNAL_KIND = {"key": "chords", "chords": "chords", "tuning": "chords", "beats": "clicks"}
+LABELS = {"key": ("key", "scale"), "chords": ("chords",), "tuning": ("tuning_cents",),
+          "beats": ("beats",)}
+
+
+# -------------------------------------------------------
+# Data set
+# -------------------------------------------------------
+class Track:
+    def __init__(self, name, truth, make_audio):
+        self.name = name
+        self.truth = truth
+        self._make_audio = make_audio
+        self._audio = {}
+
+    def audio(self, sr):
+        if sr not in self._audio:
+            self._audio[sr] = self._make_audio(sr)
+        return self._audio[sr]
+
+    @property
+    def duration(self):
+        sr = next(iter(self._audio), 44100)
+        return len(self.audio(sr)) / float(sr)
+
+
+def synthetic_set(length):
+    chord_specs = [("D", "major", 15.0), ("A", "minor", -20.0), ("F", "major", 0.0), ("E", "minor", 8.0)]
+    tracks = {"chords": [], "clicks": []}
+    for i, (k, scale, cents) in enumerate(chord_specs):
+        _, truth = synth.chord_progression(k, scale, length, sr=8000, tuning_cents=cents, seed=i)
+        make = (lambda sr, k=k, scale=scale, cents=cents, i=i:
+                synth.chord_progression(k, scale, length, sr=sr, tuning_cents=cents, seed=i)[0])
+        tracks["chords"].append(Track(f"{k} {scale} {cents:+.0f}c", truth, make))
+    for i, bpm in enumerate([90.0, 120.0, 150.0]):
+        _, truth = synth.click_track(bpm, length, sr=8000, seed=10 + i)
+        make = lambda sr, bpm=bpm, i=i: synth.click_track(bpm, length, sr=sr, seed=10 + i)[0]
+        tracks["clicks"].append(Track(f"clicks {bpm:.0f} bpm", truth, make))
+    return tracks
+
+
+def labelled_set(manifest):
+    from essentia.standard import MonoLoader
+    with open(manifest) as f:
+        entries = json.load(f)
+    tracks = []
+    for e in entries:
+        make = lambda sr, path=e["path"]: MonoLoader(filename=path, sampleRate=sr)()
+        tracks.append(Track(os.path.basename(e["path"]), dict(e), make))
+    # every labelled track is used for every pipeline
+    return {"chords": tracks, "clicks": tracks}
+
+
+def reference_truth(name, track):
+    """Labels of `track` for `name`, falling back to the default settings' output."""
+    truth = track.truth
+    if all(k in truth for k in LABELS[name]):
+        return truth
+    ref = run(name, track.audio(44100 if name == "beats" else _default(name, "sr")), {})
+    if name == "key":
+        return dict(truth, key=ref["key"], scale=ref["scale"])
+    if name == "chords":
+        ends = list(ref["times"][1:]) + [track.duration]
+        segs = [{"start": float(s), "end": float(e), "chord": c}
+                for s, e, c in zip(ref["times"], ends, ref["chords"])]
+        return dict(truth, chords=segs)
+    if name == "tuning":
+        return dict(truth, tuning_cents=ref["tuning_cents"])
+    return dict(truth, beats=ref["beats"].tolist())
+
+
+def _default(name, param):
+    import inspect
+    fn = {"key": pipelines.key, "chords": pipelines.chords, "tuning": pipelines.tuning}[name]
+    return inspect.signature(fn).parameters[param].default
+
+
+# -------------------------------------------------------
+# Agreement (0..1, higher is better)
+# -------------------------------------------------------
+def agreement(name, result, truth):
+    if name == "key":
+        return key_score(result["key"], result["scale"], truth["key"], truth["scale"])
+    if name == "chords":
+        ref = [synth.chord_at(truth, t) for t in result["times"]]
+        ok = [r is not None and c == r for c, r in zip(result["chords"], ref)]
+        return float(np.mean(ok)) if ok else 0.0
+    if name == "tuning":
+        # 0 cents off -> 1, half a semitone off -> 0
+        return max(0.0, 1.0 - abs(result["tuning_cents"] - truth["tuning_cents"]) / 50.0)
+    if name == "beats":
+        return f_measure(result["beats"], truth["beats"], 0.07)
+    raise ValueError(f"Unknown pipeline: {name}")
+
+
+def sweep(name, tracks, repeat=1):
+    rows = []
+    truths = [reference_truth(name, t) for t in tracks]
+    total_audio = sum(t.duration for t in tracks)
+    for config in grid(name):
+        sr = config.get("sr", 44100)
+        seconds, scores = 0.0, []
+        for track, truth in zip(tracks, truths):
+            audio = track.audio(sr)
+            best = np.inf
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                result = run(name, audio, config)
+                best = min(best, time.perf_counter() - t0)
+            seconds += best
+            scores.append(agreement(name, result, truth))
+        row = {"pipeline": name, "config": config, "runtime_s": seconds,
+               "runtime_per_audio_min": 60.0 * seconds / total_audio,
+               "agreement": float(np.mean(scores)), "per_track": [float(s) for s in scores]}
+        rows.append(row)
+        print(f"{name:7s} {json.dumps(config):70s} {row['runtime_per_audio_min']:8.3f} s/min  "
+              f"agreement={row['agreement']:.3f}")
+    return rows
+
+
+# -------------------------------------------------------
+# Pareto front + presets
+# -------------------------------------------------------
+def pareto_front(rows):
+    front = []
+    best = -np.inf
+    for row in sorted(rows, key=lambda r: (r["runtime_s"], -r["agreement"])):
+        if row["agreement"] > best:
+            front.append(row)
+            best = row["agreement"]
+    return front
+
+
+def choose_presets(rows, bar, margin):
+    front = pareto_front(rows)          # sorted by runtime, agreement increasing
+    top = front[-1]["agreement"]
+    accurate = next(r for r in front if r["agreement"] >= top - 1e-9)
+    balanced = next(r for r in front if r["agreement"] >= top - margin)
+    meets = [r for r in front if r["agreement"] >= bar]
+    fast = meets[0] if meets else accurate
+    # never slower than balanced
+    if fast["runtime_s"] > balanced["runtime_s"]:
+        fast = balanced
+    return {"fast": fast, "balanced": balanced, "accurate": accurate}
+
+
+def plot(all_rows, chosen, path):
+    names = list(all_rows)
+    fig, axes = plt.subplots(1, len(names), figsize=(5 * len(names), 4.5), squeeze=False)
+    for ax, name in zip(axes[0], names):
+        rows = all_rows[name]
+        ax.scatter([r["runtime_per_audio_min"] for r in rows], [r["agreement"] for r in rows],
+                   s=18, color="gray", alpha=0.6, label="configs")
+        front = pareto_front(rows)
+        ax.step([r["runtime_per_audio_min"] for r in front], [r["agreement"] for r in front],
+                where="post", color="red", label="Pareto front")
+        for preset, marker in (("fast", "v"), ("balanced", "o"), ("accurate", "^")):
+            r = chosen[name][preset]
+            ax.scatter([r["runtime_per_audio_min"]], [r["agreement"]], marker=marker, s=80,
+                       label=preset, zorder=3)
+        ax.set_xscale("log")
+        ax.set_title(name)
+        ax.set_xlabel("Runtime (s per minute of audio)")
+        ax.set_ylabel("Agreement")
+        ax.grid(True, alpha=0.3)
+        ax.legend(fontsize=7)
+    plt.tight_layout()
+    plt.savefig(path, dpi=150)
+    plt.close(fig)
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runtime vs agreement sweep -> fast/balanced/accurate presets")
+    parser.add_argument("--only", nargs="+", choices=["key", "chords", "tuning", "beats"],
+                        default=["key", "chords", "tuning", "beats"])
+    parser.add_argument("--manifest", default=None, help="labelled set (JSON list); default: synthetic signals")
+    parser.add_argument("--length", type=float, default=20.0, help="synthetic track length in seconds")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case (min time is kept)")
+    parser.add_argument("--bar", type=float, default=0.9, help="agreement the fast preset must reach")
+    parser.add_argument("--margin", type=float, default=0.02,
+                        help="allowed agreement loss of the balanced preset")
+    parser.add_argument("--out", default="sweep_results.json")
+    parser.add_argument("--presets", default=PRESETS_PATH)
+    parser.add_argument("--plot", default="sweep_pareto.png")
+    args = parser.parse_args()
+
+    data = labelled_set(args.manifest) if args.manifest else synthetic_set(args.length)
+
+    all_rows, chosen = {}, {}
+    for name in args.only:
+        all_rows[name] = sweep(name, data[SIGNAL_KIND[name]], args.repeat)
+        chosen[name] = choose_presets(all_rows[name], args.bar, args.margin)
+
+    with open(args.out, "w") as f:
+        json.dump({"meta": metadata(), "rows": [r for rows in all_rows.values() for r in rows]}, f, indent=4)
+    print(f"Saved {args.out}")
+
+    # keep presets of pipelines that were not swept this time
+    presets = {"fast": {}, "balanced": {}, "accurate": {}}
+    scores = {}
+    if os.path.exists(args.presets):
+        with open(args.presets) as f:
+            old = json.load(f)
+        presets.update(old.get("presets", {}))
+        scores.update(old.get("scores", {}))
+    print(f"\n{'pipeline':8s} {'preset':9s} {'s/min':>8s} {'agreement':>10s}  config")
+    for name, picks in chosen.items():
+        scores[name] = {}
+        for preset, row in picks.items():
+            presets[preset][name] = row["config"]
+            scores[name][preset] = {"agreement": row["agreement"],
+                                    "runtime_per_audio_min": row["runtime_per_audio_min"]}
+            print(f"{name:8s} {preset:9s} {row['runtime_per_audio_min']:8.3f} {row['agreement']:10.3f}  "
+                  f"{json.dumps(row['config'])}")
+
+    with open(args.presets, "w") as f:
+        json.dump({"meta": dict(metadata(), bar=args.bar, margin=args.margin,
+                                data=args.manifest or f"synthetic {args.length:.0f} s"),
+                   "presets": presets, "scores": scores}, f, indent=4)
+    print(f"Saved {args.presets}")
+
+    if HAVE_MPL:
+        plot(all_rows, chosen, args.plot)
+        print(f"Saved {args.plot}")
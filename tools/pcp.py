@@ -0,0 +1,210 @@
+import sys
+import time
+from math import log2
+import numpy as np
+
+import lazy
+import peaks
+
+try:
+    numba = lazy.module("numba")     # imported and compiled on the first jit=True call
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# -------------------------------------------------------
+# Batched HPCP: the peaks of every frame to pitch-class bins at once
+#
+#   freqs, mags, offsets = peaks.frame_peaks(audio, 44100, 4096, 2048)
+#   H = pcp.hpcp(freqs, mags, offsets, size=36)       # (frames x 36), es.HPCP per row
+#   H = pcp.hpcp_frames(audio, 44100, 4096, 2048)      # audio -> HPCP, no per-frame calls
+#
+# Essentia's HPCP restated over the flat (ragged) peak arrays:
+#   - peaks outside [minFrequency, maxFrequency] are ignored
+#   - every peak f, and with harmonics > 0 the fundamentals it may be a
+#     harmonic of (f * 2^(-semitone / 12), weighted 1 / max(1, octaves / 2),
+#     summed where harmonics fold onto the same pitch class), lands at bin
+#     log2(f / referenceFrequency) * size and contributes
+#     (magnitude * weight)^2 to the bins within windowSize / 2 semitones,
+#     times cos^2 (squaredCosine) or cos of pi * distance / windowSize;
+#     with weightType "none" all of it goes to the nearest bin
+#   - bandPreset: peaks below / above bandSplitFrequency accumulate
+#     separately, each half normalised to unit max, then summed
+#   - normalized: "unitMax", "unitSum" or "none"
+# The accumulation is one np.bincount over (frame, band, bin) per
+# harmonic and window position; with numba installed (HAVE_NUMBA) a
+# plain loop over the peaks is JIT-compiled instead (jit=True, the
+# default then; without numba jit=True runs that loop in Python).
+# -------------------------------------------------------
+
+WEIGHT_TYPES = {"none": 0, "cosine": 1, "squaredCosine": 2}
+
+
+def harmonic_table(harmonics):
+    """[(semitone, strength), ...]: where the fundamentals of harmonics 1 .. harmonics + 1 fold to."""
+    table = []
+    for i in range(harmonics + 1):
+        semitone = 12.0 * log2(i + 1.0)
+        strength = 1.0 / max(1.0, semitone / 12.0 * 0.5)
+        while semitone >= 12.0 - 0.5:
+            semitone -= 12.0
+        for entry in table:
+            if entry[0] == semitone:
+                entry[1] += strength
+                break
+        else:
+            table.append([semitone, strength])
+    return [(s, w) for s, w in table]
+
+
+def _accumulate_numpy(frame_ids, freqs, energy, n_frames, n_bands, size, band, semitones, strengths, reference,
+                      window, weight_code):
+    n_cells = n_frames * n_bands * size
+    out = np.zeros(n_cells, dtype=np.float64)
+    resolution = size // 12
+    half = resolution * window / 2.0
+    for semitone, strength in zip(semitones, strengths):
+        centre = np.log2(freqs * 2.0 ** (-semitone / 12.0) / reference) * size
+        left = np.ceil(centre - half).astype(np.int64)
+        right = np.floor(centre + half).astype(np.int64)
+        base = (frame_ids * n_bands + band) * size
+        if weight_code == 0:
+            cells = base + np.floor(centre + 0.5).astype(np.int64) % size
+            out += np.bincount(cells, weights=energy * strength, minlength=n_cells)
+            continue
+        # every bin of every window at once: (window positions x peaks), masked
+        bins = left + np.arange(int(np.floor(2 * half)) + 2)[:, None]
+        inside = bins <= right
+        w = np.cos(np.pi * np.abs(centre - bins)[inside] / resolution / window)
+        if weight_code == 2:
+            w *= w
+        cells = (base + bins % size)[inside]
+        out += np.bincount(cells, weights=w * np.broadcast_to(energy * strength, bins.shape)[inside],
+                           minlength=n_cells)
+    return out
+
+
+def _accumulate_loop(frame_ids, freqs, energy, n_frames, n_bands, size, band, semitones, strengths, reference,
+                     window, weight_code):
+    out = np.zeros(n_frames * n_bands * size, dtype=np.float64)
+    resolution = size // 12
+    half = resolution * window / 2.0
+    for p in range(len(freqs)):
+        base = (frame_ids[p] * n_bands + band[p]) * size
+        for h in range(len(semitones)):
+            centre = np.log2(freqs[p] * 2.0 ** (-semitones[h] / 12.0) / reference) * size
+            if weight_code == 0:
+                out[base + int(np.floor(centre + 0.5)) % size] += energy[p] * strengths[h]
+                continue
+            for b in range(int(np.ceil(centre - half)), int(np.floor(centre + half)) + 1):
+                w = np.cos(np.pi * abs(centre - b) / resolution / window)
+                if weight_code == 2:
+                    w *= w
+                out[base + b % size] += w * energy[p] * strengths[h]
+    return out
+
+
+_compiled = {}
+
+
+def _loop_kernel():
+    if "loop" not in _compiled:
+        _compiled["loop"] = numba.njit(cache=True)(_accumulate_loop) if HAVE_NUMBA else _accumulate_loop
+    return _compiled["loop"]
+
+
+def _unit_max(X):
+    peak = X.max(axis=-1, keepdims=True)
+    return np.divide(X, peak, out=np.zeros_like(X), where=peak > 0)
+
+
+def hpcp(freqs, mags, offsets, size=12, reference_frequency=440.0, harmonics=0, band_preset=True,
+         band_split_frequency=500.0, min_frequency=40.0, max_frequency=5000.0, weight_type="squaredCosine",
+         window_size=1.0, normalized="unitMax", jit=HAVE_NUMBA):
+    """HPCP(...) of every frame of ragged peaks (peaks.spectral_peaks layout): (frames x size) float32."""
+    if weight_type not in WEIGHT_TYPES:
+        raise ValueError(f"weightType must be one of {sorted(WEIGHT_TYPES)}, not {weight_type!r}")
+    if normalized not in ("unitMax", "unitSum", "none"):
+        raise ValueError(f"normalized must be 'unitMax', 'unitSum' or 'none', not {normalized!r}")
+    if size % 12:
+        raise ValueError(f"size must be a multiple of 12, not {size}")
+    if band_preset and min_frequency >= band_split_frequency:
+        raise ValueError("minFrequency must be below bandSplitFrequency when bandPreset is on")
+    n = len(offsets) - 1
+    frame_ids = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    freqs = np.asarray(freqs, dtype=np.float64)
+    mags = np.asarray(mags, dtype=np.float64)
+    used = (freqs >= min_frequency) & (freqs <= max_frequency)
+    frame_ids, freqs, energy = frame_ids[used], freqs[used], mags[used] ** 2
+    n_bands = 2 if band_preset else 1
+    band = (freqs >= band_split_frequency).astype(np.int64) if band_preset else np.zeros(len(freqs), dtype=np.int64)
+    semitones, strengths = (np.array(v, dtype=np.float64) for v in zip(*harmonic_table(harmonics)))
+    strengths = strengths ** 2          # the weight scales the magnitude before squaring
+
+    accumulate = _loop_kernel() if jit else _accumulate_numpy
+    cells = accumulate(frame_ids, freqs, energy, n, n_bands, size, band, semitones, strengths,
+                       float(reference_frequency), float(window_size), WEIGHT_TYPES[weight_type])
+    X = cells.reshape(n, n_bands, size)
+    X = _unit_max(X).sum(axis=1) if band_preset else X[:, 0]
+    if normalized == "unitMax":
+        X = _unit_max(X)
+    elif normalized == "unitSum":
+        total = X.sum(axis=1, keepdims=True)
+        X = np.divide(X, total, out=np.zeros_like(X), where=total > 0)
+    return X.astype(np.float32)
+
+
+def hpcp_frames(audio, sr=44100, frame_size=4096, hop_size=2048, size=36, magnitude_threshold=0.0,
+                min_frequency=0.0, max_frequency=5000.0, active=None, block=2048, **params):
+    """Windowing -> Spectrum -> SpectralPeaks -> HPCP on every FrameGenerator(startFromZero) frame, batched.
+
+    Frames where `active` is False (gate.py) are zero rows, as are frames without peaks.
+    """
+    blocks = peaks.frame_peak_blocks(audio, sr, frame_size, hop_size, block, active,
+                                     magnitude_threshold=magnitude_threshold, min_frequency=min_frequency,
+                                     max_frequency=max_frequency)
+    out = [hpcp(freqs, mags, offsets, size=size, **params) for _, freqs, mags, offsets in blocks]
+    return np.concatenate(out) if out else np.zeros((0, size), dtype=np.float32)
+
+
+# -------------------------------------------------------
+# MAIN: batched vs per-frame HPCP on the same peaks
+#   python3 pcp.py /data/My_Song.wav
+# -------------------------------------------------------
+if __name__ == "__main__":
+    import essentia.standard as es
+    import spectra
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "/data/My_Song.wav"
+    sr, frame_size, hop_size = 44100, 4096, 2048
+    audio = es.MonoLoader(filename=path, sampleRate=sr)()
+    S = spectra.magnitude_spectrogram(audio, frame_size, hop_size)
+    freqs, mags, offsets = peaks.spectral_peaks(S, sr)
+    frame_peaks = list(peaks.rows(freqs, mags, offsets))
+
+    def best_of(fn, repeat=3):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - t0)
+        return out, min(times)
+
+    configs = [{"size": 36}, {"size": 12}, {"size": 36, "harmonics": 8}, {"size": 36, "band_preset": False},
+               {"size": 120, "reference_frequency": 442.0, "weight_type": "cosine", "window_size": 1.5},
+               {"size": 36, "band_preset": False, "weight_type": "none", "normalized": "unitSum"}]
+    names = {"size": "size", "reference_frequency": "referenceFrequency", "harmonics": "harmonics",
+             "band_preset": "bandPreset", "weight_type": "weightType", "window_size": "windowSize",
+             "normalized": "normalized"}
+    for params in configs:
+        algo = es.HPCP(sampleRate=sr, **{names[k]: v for k, v in params.items()})
+        reference, t_ref = best_of(lambda: np.array([algo(f, m) if len(f) else np.zeros(params["size"], np.float32)
+                                                     for f, m in frame_peaks]))
+        X, t_np = best_of(lambda: hpcp(freqs, mags, offsets, jit=False, **params))
+        line = (f"{params}: max |diff| {np.max(np.abs(X - reference)):.1e}; "
+                f"{1000 * t_ref:.1f} ms per frame vs {1000 * t_np:.1f} ms numpy")
+        if HAVE_NUMBA:
+            hpcp(freqs, mags, offsets, jit=True, **params)
+            X_jit, t_jit = best_of(lambda: hpcp(freqs, mags, offsets, jit=True, **params))
+            line += f", {1000 * t_jit:.1f} ms numba (max |diff| {np.max(np.abs(X_jit - reference)):.1e})"
+        print(line)
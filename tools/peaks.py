@@ -0,0 +1,269 @@
+import sys
+import time
+from math import ceil
+import numpy as np
+
+import spectra
+from stage_cache import unpack_ragged
+
+# -------------------------------------------------------
+# Batched SpectralPeaks over a whole magnitude spectrogram
+#
+#   S = spectra.magnitude_spectrogram(audio, 4096, 2048)
+#   freqs, mags, offsets = peaks.spectral_peaks(S, sample_rate=44100)
+#   for f, m in peaks.rows(freqs, mags, offsets):     # per-frame arrays
+#       ...
+#
+# Same results as calling SpectralPeaks(sampleRate, magnitudeThreshold,
+# minFrequency, maxFrequency, maxPeaks, orderBy) on every row, in the
+# ragged (flat, offsets) layout of stage_cache.pack_ragged. Essentia's
+# PeakDetection scan, restated as masks over the matrix:
+#   - a peak is a bin (or a plateau of equal bins) with a strictly
+#     lower neighbour on both sides, above magnitudeThreshold; the
+#     scan starts at bin ceil(minFrequency / binwidth), whose rise
+#     counts, and stops at the first peak above maxFrequency
+#   - single-bin peaks are refined by parabolic interpolation
+#     (bin + delta, value - (l - r) * delta / 4), plateaus are placed
+#     at their centre with their own value
+#   - the first scanned bin is a peak if it is above the next one,
+#     the last bin if maxFrequency falls in the last bin width and it
+#     is above the one before
+#   - the first maxPeaks by frequency, or by magnitude (ties to the
+#     lower frequency) for orderBy="magnitude"
+# Rows that contain a plateau above the threshold (clipping, digital
+# silence with a negative threshold) go through the literal scan.
+# -------------------------------------------------------
+
+
+def _scale(n_bins, sample_rate):
+    return np.float32(sample_rate / 2.0) / np.float32(n_bins - 1)
+
+
+def _interpolate(left, middle, right, bins):
+    delta = np.float32(0.5) * (left - right) / (left - np.float32(2) * middle + right)
+    return bins + delta, middle - np.float32(0.25) * (left - right) * delta
+
+
+def scan_row(a, sample_rate=44100.0, magnitude_threshold=0.0, min_frequency=0.0, max_frequency=5000.0):
+    """Essentia's PeakDetection scan on one spectrum: (positions, values) in frequency order."""
+    size = len(a)
+    scale = _scale(size, sample_rate)
+    threshold = np.float32(magnitude_threshold)
+    out = []
+    i = max(0, int(ceil(np.float32(min_frequency) / scale)))
+    if i + 1 < size and a[i] > a[i + 1] and a[i] > threshold:
+        out.append((i * scale, a[i]))
+    while True:
+        while i + 1 < size - 1 and a[i] >= a[i + 1]:
+            i += 1
+        while i + 1 < size - 1 and a[i] < a[i + 1]:
+            i += 1
+        j = i
+        while j + 1 < size - 1 and a[j] == a[j + 1]:
+            j += 1
+        if j + 1 < size - 1 and a[j + 1] < a[j] and a[j] > threshold:
+            if j != i:
+                pos, val = (i + j) * np.float32(0.5) * scale, a[i]
+            else:
+                b, val = _interpolate(a[j - 1], a[j], a[j + 1], np.float32(j))
+                pos = b * scale
+            if pos > max_frequency:
+                break
+            out.append((pos, val))
+        i = j
+        if i + 1 >= size - 1:
+            if i == size - 2 and a[i - 1] < a[i] and a[i + 1] < a[i] and a[i] > threshold:
+                b, val = _interpolate(a[i - 1], a[i], a[i + 1], np.float32(i))
+                out.append((b * scale, val))
+            break
+    last = np.float32(max_frequency) / scale
+    if size - 2 < last <= size - 1 and a[size - 1] > a[size - 2] and a[size - 1] > threshold:
+        out.append(((size - 1) * scale, a[size - 1]))
+    if not out:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    pos, val = zip(*out)
+    return np.array(pos, dtype=np.float32), np.array(val, dtype=np.float32)
+
+
+def _strict_peaks(S, first, end, scale, threshold, max_frequency):
+    """(rows, positions, values, stopped) of the single-bin and boundary peaks in the columns < end.
+
+    stopped: rows whose scan ended at a peak above maxFrequency.
+    """
+    n, size = S.shape
+    upper = end == size and size - 2 < np.float32(max_frequency) / scale <= size - 1
+    # one mask over the columns first .. end - 1, so that np.nonzero yields frequency order
+    is_peak = np.zeros((n, end - first), dtype=bool)
+    if first + 1 < size:
+        is_peak[:, 0] = S[:, first] > S[:, first + 1]
+    mid = S[:, first + 1:end - 1]
+    is_peak[:, 1:end - 1 - first] = (S[:, first:end - 2] < mid) & (S[:, first + 2:end] < mid)
+    if upper:
+        is_peak[:, -1] = S[:, -1] > S[:, -2]
+    r, c = np.nonzero(is_peak)
+    c += first
+    vals = S[r, c]
+    above = vals > threshold
+    r, c, vals = r[above], c[above], vals[above]
+
+    pos = c.astype(np.float32)
+    inner = (c > first) & (c < size - 1)
+    ci = c[inner]
+    pos[inner], vals[inner] = _interpolate(S[r[inner], ci - 1], vals[inner], S[r[inner], ci + 1], pos[inner])
+    pos *= scale
+    # the scan stops at the first peak above maxFrequency; bin size - 2 is its
+    # final check, made only when it did not stop
+    final = c >= size - 2
+    keep = (pos <= np.float32(max_frequency)) | (c == first)
+    stopped = np.zeros(n, dtype=bool)
+    stopped[r[~keep & ~final]] = True
+    keep |= (c == size - 2) & ~stopped[r]
+    keep |= c == size - 1
+    return r[keep], pos[keep], vals[keep], stopped
+
+
+def _has_plateau(S, first, end, threshold):
+    scanned = S[:, first:end - 1]
+    return np.any((scanned[:, :-1] == scanned[:, 1:]) & (scanned[:, :-1] > threshold), axis=1)
+
+
+def spectral_peaks(S, sample_rate=44100.0, magnitude_threshold=0.0, min_frequency=0.0, max_frequency=5000.0,
+                   max_peaks=100, order_by="frequency"):
+    """SpectralPeaks on every row of S (frames x bins): (freqs, mags, offsets), ragged."""
+    if order_by not in ("frequency", "magnitude"):
+        raise ValueError(f"orderBy must be 'frequency' or 'magnitude', not {order_by!r}")
+    S = np.ascontiguousarray(S, dtype=np.float32)
+    n, size = S.shape
+    scale = _scale(size, sample_rate)
+    threshold = np.float32(magnitude_threshold)
+    first = max(0, int(ceil(np.float32(min_frequency) / scale)))
+
+    # like the scan, look only up to the first peak above maxFrequency: a few
+    # columns past it, widened for the rows where no such peak shows up yet
+    plateau = np.zeros(n, dtype=bool)
+    parts = []
+    todo = np.arange(n)
+    end = min(size, int(max_frequency / scale) + 32)
+    while len(todo):
+        sub = S if len(todo) == n else S[todo]
+        r, pos, vals, stopped = _strict_peaks(sub, first, end, scale, threshold, max_frequency)
+        done = stopped | (end == size)
+        plateau[todo[done]] = _has_plateau(sub[done], first, end, threshold)
+        mine = done[r]
+        parts.append((todo[r[mine]], pos[mine], vals[mine]))
+        todo, end = todo[~done], min(size, 2 * end)
+    r, pos, vals = (np.concatenate(p) for p in zip(*parts))
+    # rows with a plateau above the threshold: literal scan
+    slow = np.flatnonzero(plateau)
+    if len(slow):
+        found = [scan_row(S[i], sample_rate, magnitude_threshold, min_frequency, max_frequency) for i in slow]
+        mine = ~plateau[r]
+        r = np.concatenate([r[mine]] + [np.full(len(p), i, dtype=np.int64) for i, (p, _) in zip(slow, found)])
+        pos = np.concatenate([pos[mine]] + [p for p, _ in found])
+        vals = np.concatenate([vals[mine]] + [v for _, v in found])
+    if len(parts) > 1 or len(slow):
+        idx = np.argsort(r, kind="stable")
+        r, pos, vals = r[idx], pos[idx], vals[idx]
+
+    # maxPeaks / orderBy
+    if order_by == "magnitude":
+        idx = np.lexsort((pos, -vals, r))
+        r, pos, vals = r[idx], pos[idx], vals[idx]
+    counts = np.bincount(r, minlength=n)
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    keep = np.arange(len(r)) - starts[r] < max_peaks
+    offsets = np.concatenate([[0], np.cumsum(np.minimum(counts, max_peaks))]).astype(np.int64)
+    return pos[keep], vals[keep], offsets
+
+
+def rows(freqs, mags, offsets):
+    """Per-frame (freqs, mags) pairs, as SpectralPeaks would return them."""
+    return zip(unpack_ragged(freqs, offsets), unpack_ragged(mags, offsets))
+
+
+def frame_peak_blocks(audio, sample_rate=44100.0, frame_size=4096, hop_size=2048, block=2048, active=None,
+                      **params):
+    """Yield (first_frame, freqs, mags, offsets) for blocks of FrameGenerator(startFromZero) frames.
+
+    Frames where `active` (a gate.py mask) is False get no peaks and no FFT.
+    """
+    fr = spectra.frames(audio, frame_size, hop_size)
+    window = spectra.hann(frame_size)
+    for start in range(0, len(fr), block):
+        frame_ids = np.arange(start, min(start + block, len(fr)))
+        if active is not None:
+            frame_ids = frame_ids[np.asarray(active[start:start + block], dtype=bool)]
+        counts = np.zeros(min(block, len(fr) - start), dtype=np.int64)
+        if len(frame_ids):
+            # a view of the block unless the gate took frames out
+            chunk = fr[start:start + block] if len(frame_ids) == len(counts) else fr[frame_ids]
+            S = np.abs(spectra._fft.rfft(chunk * window, axis=1)).astype(np.float32)
+            freqs, mags, off = spectral_peaks(S, sample_rate, **params)
+            counts[frame_ids - start] = np.diff(off)
+        else:
+            freqs = mags = np.zeros(0, dtype=np.float32)
+        yield start, freqs, mags, np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def frame_peaks(audio, sample_rate=44100.0, frame_size=4096, hop_size=2048, block=2048, active=None, **params):
+    """Windowing -> Spectrum -> SpectralPeaks on every FrameGenerator(startFromZero) frame.
+
+    Blocks of `block` frames keep the spectrogram in memory bounded.
+    """
+    freqs, mags, counts = [], [], []
+    for _, f, m, off in frame_peak_blocks(audio, sample_rate, frame_size, hop_size, block, active, **params):
+        freqs.append(f)
+        mags.append(m)
+        counts.append(np.diff(off))
+    if not counts:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(1, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.concatenate(counts))]).astype(np.int64)
+    return np.concatenate(freqs), np.concatenate(mags), offsets
+
+
+# -------------------------------------------------------
+# MAIN: batched vs per-frame SpectralPeaks on the same spectra
+#   python3 peaks.py /data/My_Song.wav
+# -------------------------------------------------------
+if __name__ == "__main__":
+    import essentia.standard as es
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "/data/My_Song.wav"
+    sr, frame_size, hop_size = 44100, 4096, 2048
+    audio = es.MonoLoader(filename=path, sampleRate=sr)()
+    window, spectrum = es.Windowing(type="hann"), es.Spectrum()
+    S = np.array([spectrum(window(f)) for f in es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size,
+                                                                 startFromZero=True)])
+
+    def best_of(fn, repeat=3):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - t0)
+        return out, min(times)
+
+    configs = [{}, {"magnitude_threshold": 1e-6, "min_frequency": 20.0, "max_frequency": 5000.0},
+               {"max_peaks": 10, "order_by": "magnitude"}, {"min_frequency": 100.0, "max_frequency": 22050.0}]
+    names = {"magnitude_threshold": "magnitudeThreshold", "min_frequency": "minFrequency",
+             "max_frequency": "maxFrequency", "max_peaks": "maxPeaks", "order_by": "orderBy"}
+    for params in configs:
+        algo = es.SpectralPeaks(sampleRate=sr, **{names[k]: v for k, v in params.items()})
+        reference, t_ref = best_of(lambda: [algo(s) for s in S])
+        (freqs, mags, offsets), t_batch = best_of(lambda: spectral_peaks(S, sr, **params))
+        pairs = list(zip(rows(freqs, mags, offsets), reference))
+        same = [(f, m, rf, rm) for (f, m), (rf, rm) in pairs if len(f) == len(rf)]
+        err_f = max((np.max(np.abs(f - rf)) for f, _, rf, _ in same if len(f)), default=0.0)
+        err_m = max((np.max(np.abs(m - rm) / np.maximum(rm, 1e-12)) for _, m, _, rm in same if len(m)), default=0.0)
+        print(f"{params or 'defaults'}: {len(same)}/{len(S)} frames with the same peaks, "
+              f"max |df| {err_f:.2e} Hz, max rel |dm| {err_m:.2e}; "
+              f"{1000 * t_ref:.1f} ms per frame vs {1000 * t_batch:.1f} ms batched")
+
+    def loop():
+        return [peaks(spectrum(window(f)))
+                for f in es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)]
+
+    peaks = es.SpectralPeaks(sampleRate=sr)
+    _, t_loop = best_of(loop)
+    _, t_frames = best_of(lambda: frame_peaks(audio, sr, frame_size, hop_size))
+    print(f"audio -> peaks: {1000 * t_loop:.1f} ms per-frame loop vs {1000 * t_frames:.1f} ms batched")
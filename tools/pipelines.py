@@ -0,0 +1,241 @@
+import numpy as np
+import essentia
+import essentia.standard as es
+
+import adaptive
+import cqt
+import gate
+import pcp
+import profiling   # no-op unless --profile / ESSENTIA_PROFILE=1
+from frame_matrix import FrameMatrix
+
+# -------------------------------------------------------
+# The analysis chains of the AUDIO/ and rythm/ scripts as functions
+#
+# Same algorithms and default settings as the scripts, but taking an
+# audio array (+ parameters) and returning plain results, so they can
+# be timed, swept and compared without /data/My_Song.wav or plotting.
+# -------------------------------------------------------
+
+
+def hpcp_frames(audio, sr=44100, frame_size=4096, hop_size=2048, hpcp_size=36,
+                magnitude_threshold=0.0, min_frequency=0.0, max_frequency=5000.0,
+                gate_db=gate.GATE_DB, active=None, batched=False):
+    """Frame-wise HPCP (Windowing -> Spectrum -> SpectralPeaks -> HPCP); silent frames are zero rows.
+
+    batched: the same chain over blocks of frames in numpy (pcp.py), equal within ~1e-5.
+    """
+    if batched:
+        if active is None:
+            active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=gate_db)
+        return pcp.hpcp_frames(audio, sr, frame_size, hop_size, hpcp_size, magnitude_threshold, min_frequency,
+                               max_frequency, active=active)
+    window = profiling.wrap(es.Windowing(type="hann"), "Windowing")
+    spectrum = profiling.wrap(es.Spectrum(), "Spectrum")
+    peaks = profiling.wrap(es.SpectralPeaks(sampleRate=sr, magnitudeThreshold=magnitude_threshold,
+                                            minFrequency=min_frequency, maxFrequency=max_frequency),
+                           "SpectralPeaks")
+    hpcp = profiling.wrap(es.HPCP(size=hpcp_size, sampleRate=sr), "HPCP")
+
+    if active is None:
+        active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=gate_db)
+    frames = FrameMatrix.for_audio(audio, frame_size, hop_size, width=hpcp_size, start_from_zero=True)
+    generator = es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)
+    for i, frame in enumerate(profiling.frames(generator)):
+        if not active[i]:
+            frames.skip()
+            continue
+        freqs, mags = peaks(spectrum(window(frame)))
+        if len(freqs) > 0:
+            frames.append(hpcp(freqs, mags))
+        else:
+            frames.skip()
+    return frames.array
+
+
+def hpcp_mean(audio, sr=44100, frame_size=4096, hop_size=2048, hpcp_size=36, batched=False):
+    frames = hpcp_frames(audio, sr, frame_size, hop_size, hpcp_size, batched=batched)
+    mean = frames.mean(axis=0)
+    if mean.max() > 0:
+        mean /= mean.max()
+    return {"hpcp": mean}
+
+
+def hpcp_mean_batched(audio, sr=44100, frame_size=4096, hop_size=2048, hpcp_size=36):
+    return hpcp_mean(audio, sr, frame_size, hop_size, hpcp_size, batched=True)
+
+
+# chroma front ends: "hpcp" = Spectrum -> SpectralPeaks -> HPCP, "cqt" = constant-Q chroma (cqt.py)
+FRONT_ENDS = ("hpcp", "cqt")
+
+
+def chroma_frames(audio, sr=44100, frame_size=4096, hop_size=2048, size=36, gate_db=gate.GATE_DB, active=None,
+                  front_end="hpcp"):
+    """Frame-wise pitch-class profile (HPCP layout, silent frames are zero rows) from either front end.
+
+    The CQT frames are longer (cqt.frame_size_for) but centred on the same frame_size grid.
+    """
+    if front_end not in FRONT_ENDS:
+        raise ValueError(f"front_end must be one of {FRONT_ENDS}, not {front_end!r}")
+    if active is None:
+        active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=gate_db)
+    if front_end == "cqt":
+        return cqt.chroma(audio, sr, hop_size=hop_size, size=size, grid_frame_size=frame_size, active=active)
+    return hpcp_frames(audio, sr, frame_size, hop_size, size, active=active)
+
+
+def key(audio, sr=44100, frame_size=4096, hop_size=4096, hpcp_size=12, profile="edma"):
+    k, scale, strength = es.KeyExtractor(profileType=profile, sampleRate=sr, frameSize=frame_size,
+                                         hopSize=hop_size, hpcpSize=hpcp_size)(audio)
+    return {"key": k, "scale": scale, "strength": float(strength)}
+
+
+def key_from_chroma(audio, sr=44100, frame_size=4096, hop_size=4096, size=36, profile="edma", front_end="hpcp",
+                    gate_db=gate.GATE_DB):
+    """Key of the mean chroma frame (Key), with either chroma front end."""
+    mean = chroma_frames(audio, sr, frame_size, hop_size, size, gate_db, front_end=front_end).mean(axis=0)
+    k, scale, strength, _ = es.Key(profileType=profile, pcpSize=size)(essentia.array(mean))
+    return {"key": k, "scale": scale, "strength": float(strength)}
+
+
+def key_hpcp(audio, sr=44100, frame_size=4096, hop_size=4096, size=36, profile="edma"):
+    return key_from_chroma(audio, sr, frame_size, hop_size, size, profile, front_end="hpcp")
+
+
+def key_cqt(audio, sr=44100, frame_size=4096, hop_size=4096, size=36, profile="edma"):
+    return key_from_chroma(audio, sr, frame_size, hop_size, size, profile, front_end="cqt")
+
+
+def chords(audio, sr=22050, frame_size=4096, hop_size=1024, hpcp_size=36, gate_db=gate.GATE_DB, front_end="hpcp"):
+    active = gate.active_frames(audio, frame_size, hop_size, start_from_zero=True, threshold_db=gate_db)
+    frames = chroma_frames(audio, sr, frame_size, hop_size, hpcp_size, active=active, front_end=front_end)
+    detector = es.ChordsDetection(hopSize=hop_size, sampleRate=sr)
+    labels, strengths = [], []
+    # like chords_detection.py: one ChordsDetection call per HPCP frame, "N" for silent frames
+    for h, on in zip(frames, active):
+        if not on:
+            labels.append(gate.NO_SIGNAL)
+            strengths.append(0.0)
+            continue
+        c, s = detector(essentia.array([h]))
+        labels.append(c[0] if isinstance(c, (list, tuple)) else c)
+        strengths.append(float(s[0]) if np.ndim(s) else float(s))
+    times = np.arange(len(labels)) * hop_size / float(sr)
+    return {"times": times, "chords": labels, "strengths": np.array(strengths)}
+
+
+def chords_cqt(audio, sr=22050, frame_size=4096, hop_size=1024, hpcp_size=36, gate_db=gate.GATE_DB):
+    return chords(audio, sr, frame_size, hop_size, hpcp_size, gate_db, front_end="cqt")
+
+
+def tuning(audio, sr=44100, frame_size=4096, hop_size=2048, gate_db=gate.GATE_DB):
+    window = es.Windowing(type="hann")
+    spectrum = es.Spectrum()
+    peaks = es.SpectralPeaks(sampleRate=sr)
+    tuning_algo = es.TuningFrequency()
+    hz, cents = [], []
+    active = gate.active_frames(audio, frame_size, hop_size, threshold_db=gate_db)
+    for i, frame in enumerate(es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size)):
+        if not active[i]:
+            continue
+        freqs, mags = peaks(spectrum(window(frame)))
+        if len(freqs) == 0:
+            continue
+        t_hz, t_cents = tuning_algo(freqs, mags)
+        if t_hz > 0:
+            hz.append(t_hz)
+            cents.append(t_cents)
+    if not hz:
+        return {"tuning_hz": 0.0, "tuning_cents": 0.0}
+    return {"tuning_hz": float(np.mean(hz)), "tuning_cents": float(np.mean(cents))}
+
+
+def melodia(audio, sr=44100, frame_size=2048, hop_size=128):
+    pitch, confidence = es.PredominantPitchMelodia(frameSize=frame_size, hopSize=hop_size,
+                                                   sampleRate=sr, guessUnvoiced=False)(audio)
+    times = np.arange(len(pitch)) * hop_size / float(sr)
+    return {"times": times, "pitch": np.asarray(pitch), "confidence": np.asarray(confidence)}
+
+
+def rhythm_extractor(audio, sr=44100, method="multifeature"):
+    bpm, beats, beats_conf, _, _ = es.RhythmExtractor2013(method=method)(audio)
+    return {"bpm": float(bpm), "beats": np.asarray(beats)}
+
+
+def beats_degara(audio, sr=44100):
+    beats = np.asarray(es.BeatTrackerDegara()(audio))
+    bpm = float(60.0 / np.mean(np.diff(beats))) if len(beats) > 1 else 0.0
+    return {"bpm": bpm, "beats": beats}
+
+
+def beats_multifeature(audio, sr=44100):
+    beats, _ = es.BeatTrackerMultiFeature()(audio)
+    beats = np.asarray(beats)
+    bpm = float(60.0 / np.mean(np.diff(beats))) if len(beats) > 1 else 0.0
+    return {"bpm": bpm, "beats": beats}
+
+
+def onsets(audio, sr=44100, frame_size=2048, hop_size=512):
+    # flux detection function as in onset_detection.py, peak-picked with Onsets()
+    window = es.Windowing(type="hann")
+    fft = es.FFT()
+    c2p = es.CartesianToPolar()
+    od_flux = es.OnsetDetection(method="flux", sampleRate=sr)
+    curve = []
+    for frame in es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True):
+        mag, phase = c2p(fft(window(frame)))
+        curve.append(od_flux(mag, phase))
+    curve = essentia.array(curve)
+    times = es.Onsets(frameRate=sr / float(hop_size))(essentia.array([curve]), [1])
+    return {"curve": np.asarray(curve), "onsets": np.asarray(times)}
+
+
+def novelty(audio, sr=44100, frame_size=2048, hop_size=1024, n_peaks=None):
+    # cosine distance between consecutive spectra, as in rythm/6/novelty_curve.py
+    window = es.Windowing(type="hann")
+    spectrum = es.Spectrum()
+    spectra = np.array([spectrum(window(f)) for f in
+                        es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)])
+    a, b = spectra[:-1], spectra[1:]
+    num = (a * b).sum(axis=1)
+    den = (np.linalg.norm(a, axis=1) + 1e-12) * (np.linalg.norm(b, axis=1) + 1e-12)
+    curve = 1.0 - num / den
+    if curve.max() > 0:
+        curve /= curve.max()
+    # local maxima, strongest first
+    peaks = np.where((curve[1:-1] > curve[:-2]) & (curve[1:-1] >= curve[2:]))[0] + 1
+    peaks = peaks[np.argsort(-curve[peaks])]
+    if n_peaks is not None:
+        peaks = np.sort(peaks[:n_peaks])
+    times = (peaks + 1) * hop_size / float(sr)
+    return {"curve": curve, "peak_times": times}
+
+
+def beats_loudness(audio, sr=44100, frame_size=1024, hop_size=512):
+    loudness = es.Loudness()
+    values = np.array([loudness(f) for f in
+                       es.FrameGenerator(audio, frameSize=frame_size, hopSize=hop_size, startFromZero=True)])
+    beats, _ = es.BeatTrackerMultiFeature()(audio)
+    idx = np.minimum((np.asarray(beats) * sr / hop_size).astype(int), len(values) - 1)
+    return {"beats": np.asarray(beats), "beat_loudness": values[idx] if len(idx) else np.zeros(0)}
+
+
+# name -> (function, kind of synthetic signal it is scored on)
+PIPELINES = {
+    "hpcp": (hpcp_mean, "chords"),
+    "hpcp_batched": (hpcp_mean_batched, "chords"),
+    "key": (key, "chords"),
+    "key_hpcp": (key_hpcp, "chords"),
+    "key_cqt": (key_cqt, "chords"),
+    "chords": (chords, "chords"),
+    "chords_adaptive": (adaptive.chords, "chords"),
+    "chords_cqt": (chords_cqt, "chords"),
+    "tuning": (tuning, "chords"),
+    "melodia": (melodia, "sweep"),
+    "rhythm_extractor": (rhythm_extractor, "clicks"),
+    "beats_degara": (beats_degara, "clicks"),
+    "beats_multifeature": (beats_multifeature, "clicks"),
+    "onsets": (onsets, "clicks"),
+    "novelty": (novelty, "chords"),
+    "beats_loudness": (beats_loudness, "clicks"),
+}
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+# -------------------------------------------------------
+# Named speed/accuracy presets ("fast", "balanced", "accurate")
+#
+# presets.json is written by param_sweep.py. Scripts ask for their
+# settings with
+#
+#   settings = presets.settings("key", {"sr": 44100, "frame_size": 4096, ...})
+#
+# which returns the script's own defaults unless a preset is selected
+# with --preset NAME on the command line or ESSENTIA_PRESET=NAME.
+# Setting names are the keyword arguments of tools/pipelines.py.
+# -------------------------------------------------------
+
+PRESETS_PATH = os.environ.get("ESSENTIA_PRESETS",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "presets.json"))
+
+
+def _from_argv():
+    # accept "--preset NAME" and "--preset=NAME" and remove it from sys.argv
+    for i, arg in enumerate(sys.argv[1:], start=1):
+        if arg == "--preset" and i + 1 < len(sys.argv):
+            name = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+            return name
+        if arg.startswith("--preset="):
+            del sys.argv[i]
+            return arg.split("=", 1)[1]
+    return None
+
+
+SELECTED = _from_argv() or os.environ.get("ESSENTIA_PRESET") or None
+
+
+def load(path=PRESETS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def settings(pipeline, defaults, name=None, path=PRESETS_PATH):
+    """Script defaults overridden by the selected preset's entry for `pipeline`."""
+    name = name or SELECTED
+    merged = dict(defaults)
+    if not name:
+        return merged
+    data = load(path)
+    if name not in data.get("presets", {}):
+        raise ValueError(f"Unknown preset '{name}' (available: {', '.join(data.get('presets', {}))})")
+    chosen = data["presets"][name].get(pipeline, {})
+    merged.update({k: v for k, v in chosen.items() if k in defaults})
+    print(f"Using preset '{name}' for {pipeline}: {merged}")
+    return merged
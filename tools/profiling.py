@@ -0,0 +1,216 @@
+import atexit
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+# -------------------------------------------------------
+# Opt-in per-stage instrumentation
+#
+# Enable with   ESSENTIA_PROFILE=1 python3 script.py
+#          or   python3 script.py --profile[=trace.json]
+#
+# Scripts mark their stages:
+#
+#   with profiling.stage("decode"):
+#       audio = MonoLoader(...)()
+#   peaks = profiling.wrap(SpectralPeaks(), "SpectralPeaks")   # per-call timing
+#   for frame in profiling.frames(FrameGenerator(...)):        # iteration cost + fps
+#       ...
+#
+# At exit a summary table goes to stderr and a Chrome trace JSON
+# (open in chrome://tracing or https://ui.perfetto.dev) is written.
+# When disabled, stage() returns a shared no-op context manager and
+# wrap()/frames() return their argument unchanged, so the cost is one
+# function call per stage and nothing per frame.
+# -------------------------------------------------------
+
+_FLAG = "--profile"
+
+
+def _from_argv():
+    # strip --profile / --profile=path so the script's own argparse never sees it
+    for i, arg in enumerate(sys.argv[1:], start=1):
+        if arg == _FLAG or arg.startswith(_FLAG + "="):
+            del sys.argv[i]
+            return arg.split("=", 1)[1] if "=" in arg else ""
+    return None
+
+
+_argv_value = _from_argv()
+_env_value = os.environ.get("ESSENTIA_PROFILE", "")
+
+ENABLED = _argv_value is not None or _env_value not in ("", "0")
+TRACE_PATH = (_argv_value or os.environ.get("ESSENTIA_PROFILE_OUT") or "profile_trace.json")
+TRACE_MEMORY = os.environ.get("ESSENTIA_PROFILE_MEMORY", "1") != "0"
+
+_NULL = contextlib.nullcontext()
+_t0 = time.perf_counter()
+_events = []
+_stats = {}          # name -> [calls, total_s, frames, alloc_peak_mb, rss_delta_mb]
+_stack = []
+_lock = threading.Lock()
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _record(name, start, dur, frames=0, alloc_peak=0.0, rss_delta=0.0, event=True):
+    with _lock:
+        s = _stats.setdefault(name, [0, 0.0, 0, 0.0, 0.0])
+        s[0] += 1
+        s[1] += dur
+        s[2] += frames
+        s[3] = max(s[3], alloc_peak)
+        s[4] += rss_delta
+        if event:
+            args = {"frames": frames, "alloc_peak_mb": round(alloc_peak, 3),
+                    "rss_delta_mb": round(rss_delta, 3)}
+            if frames and dur > 0:
+                args["frames_per_s"] = round(frames / dur, 1)
+            _events.append({"name": name, "ph": "X", "pid": os.getpid(),
+                            "tid": threading.get_ident() % 100000,
+                            "ts": (start - _t0) * 1e6, "dur": dur * 1e6, "args": args})
+
+
+class _Stage:
+    def __init__(self, name, frames):
+        self.name = name
+        self.frames = frames or 0
+
+    def __enter__(self):
+        if TRACE_MEMORY:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._child_peak = 0.0
+        self._rss0 = _rss_mb()
+        _stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dur = time.perf_counter() - self._start
+        _stack.pop()
+        alloc_peak = 0.0
+        if TRACE_MEMORY:
+            import tracemalloc
+            peak = (tracemalloc.get_traced_memory()[1] - self._mem0) / 1e6
+            # reset_peak() in a nested stage hides the outer peak: carry it up
+            alloc_peak = max(peak, self._child_peak)
+            if _stack:
+                _stack[-1]._child_peak = max(_stack[-1]._child_peak, alloc_peak)
+        _record(self.name, self._start, dur, self.frames, alloc_peak, _rss_mb() - self._rss0)
+        return False
+
+
+def stage(name, frames=None):
+    """Time a block; set `.frames` on the returned object to get frames/s."""
+    if not ENABLED:
+        return _NULL
+    return _Stage(name, frames)
+
+
+class _Wrapped:
+    def __init__(self, algo, name):
+        self._algo = algo
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._algo(*args, **kwargs)
+        finally:
+            # per-call events would flood the trace: aggregate only
+            _record(self._name, start, time.perf_counter() - start, event=False)
+
+    def __getattr__(self, attr):
+        return getattr(self._algo, attr)
+
+
+def wrap(algo, name=None):
+    """Count calls and time spent in an algorithm instance (no-op when disabled)."""
+    if not ENABLED:
+        return algo
+    return _Wrapped(algo, name or type(algo).__name__)
+
+
+def frames(iterable, name="FrameGenerator"):
+    """Measure the cost of producing frames (not of processing them)."""
+    if not ENABLED:
+        return iterable
+    return _frames(iterable, name)
+
+
+def _frames(iterable, name):
+    it = iter(iterable)
+    first = time.perf_counter()
+    spent = 0.0
+    count = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            break
+        spent += time.perf_counter() - start
+        count += 1
+        yield item
+    _record(name, first, spent, frames=count, event=False)
+    with _lock:
+        _events.append({"name": name + " (wall)", "ph": "X", "pid": os.getpid(),
+                        "tid": threading.get_ident() % 100000, "ts": (first - _t0) * 1e6,
+                        "dur": (time.perf_counter() - first) * 1e6,
+                        "args": {"frames": count, "iteration_s": round(spent, 6)}})
+    if _stack:
+        _stack[-1].frames = _stack[-1].frames or count
+
+
+# -------------------------------------------------------
+# Reporting
+# -------------------------------------------------------
+def summary():
+    total = time.perf_counter() - _t0
+    lines = [f"{'stage':28s} {'calls':>7s} {'total s':>9s} {'%':>6s} {'ms/call':>9s} "
+             f"{'frames/s':>10s} {'alloc MB':>9s} {'RSS +MB':>8s}"]
+    for name, (calls, secs, nframes, alloc, rss) in sorted(_stats.items(), key=lambda kv: -kv[1][1]):
+        fps = f"{nframes / secs:10.0f}" if nframes and secs > 0 else f"{'':10s}"
+        lines.append(f"{name:28s} {calls:7d} {secs:9.3f} {100 * secs / total:6.1f} "
+                     f"{1000 * secs / calls:9.3f} {fps} {alloc:9.1f} {rss:8.1f}")
+    lines.append(f"{'(wall since start)':28s} {'':7s} {total:9.3f}")
+    return "\n".join(lines)
+
+
+def write_trace(path=None):
+    path = path or TRACE_PATH
+    with _lock:
+        events = list(_events)
+    meta = [{"name": "process_name", "ph": "M", "pid": os.getpid(),
+             "args": {"name": os.path.basename(sys.argv[0]) or "python"}}]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms",
+                   "otherData": {"summary": {k: dict(zip(["calls", "total_s", "frames",
+                                                          "alloc_peak_mb", "rss_delta_mb"], v))
+                                             for k, v in _stats.items()}}}, f)
+    return path
+
+
+def _report():
+    if not _stats:
+        return
+    print("\n" + summary(), file=sys.stderr)
+    print(f"Saved Chrome trace to {write_trace()}", file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(_report)
@@ -0,0 +1,198 @@
+import numpy as np
+
+# -------------------------------------------------------
+# Repeated sections (choruses, loops) without an N x N matrix
+#
+#   X = ssm.feature_frames(audio, 44100, kind="hpcp", frame_rate=10)
+#   rep = repetitions(X, frame_rate=10)
+#   rep["segments"]    [{start, end, lag, shift, matches, similarity}, ...]
+#   rep["thumbnail"]   {start, end, repeats}  most repeated passage
+#
+# Frames are stacked (time-delay embedding, `context` frames `step`
+# apart) so a match means a short chord sequence repeats, not a single
+# chord. Neighbours are found with random-hyperplane LSH (cosine):
+# every stacked frame gets one n_bits code per table, the codes are
+# sorted once and each query only reads its own bucket. Queries are
+# also hashed under the 12 chroma rotations, so a chorus sung a tone
+# higher still matches (key-invariant). Candidate pairs are checked
+# with the exact cosine and collected in a sparse time-lag
+# representation, where a repeated section is a run along one lag
+# (lags within lag_tolerance_s of each other count as one: tempo drift).
+# Cost per track is O(N * tables * bucket size) instead of O(N^2).
+# -------------------------------------------------------
+
+
+def stack_frames(X, context=8, step=2):
+    """(N - (context-1)*step) x (context * d) time-delay embedding, unit-norm rows."""
+    X = np.asarray(X, dtype=np.float32)
+    span = (context - 1) * step
+    n = len(X) - span
+    if n <= 0:
+        return np.zeros((0, context * X.shape[1]), dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    X = np.divide(X, norms, out=np.zeros_like(X), where=norms > 0)
+    stacked = np.concatenate([X[i * step:i * step + n] for i in range(context)], axis=1)
+    norms = np.linalg.norm(stacked, axis=1, keepdims=True)
+    return np.divide(stacked, norms, out=np.zeros_like(stacked), where=norms > 0)
+
+
+def rotate(stacked, shift, bins=12):
+    """Rotate every chroma block of a stacked matrix by `shift` bins."""
+    dim = stacked.shape[1]
+    blocks = np.arange(dim).reshape(dim // bins, bins)
+    return stacked[:, np.roll(blocks, shift, axis=1).ravel()]
+
+
+def _codes(vectors, planes, center, n_bits):
+    """One n_bits integer code per row and table (planes holds all tables side by side)."""
+    bits = (((vectors - center) @ planes) > 0).reshape(len(vectors), -1, n_bits)
+    return bits.astype(np.int64) @ (1 << np.arange(n_bits, dtype=np.int64))
+
+
+def matching_pairs(stacked, n_tables=12, n_bits=18, shifts=range(12), min_lag=1,
+                   min_similarity=0.85, max_bucket=256, bins=12, seed=0):
+    """(i, j, shift) pairs with j - i >= min_lag and cosine(rotate(x_i, shift), x_j) >= min_similarity.
+
+    Candidates come from the LSH buckets and are checked with the exact
+    cosine table by table, so only the (few) real matches are ever kept.
+    Returns (pairs, similarities).
+    """
+    n, dim = stacked.shape
+    if n == 0:
+        return np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    shifts = list(shifts)
+    # chroma is non-negative, so all frames sit in one narrow cone: hyperplanes
+    # through the origin would put most of them in the same few buckets.
+    # Hash around the mean of all rotations instead (same centre for every query)
+    mean = stacked.mean(axis=0, keepdims=True)
+    center = np.mean([rotate(mean, s, bins) for s in shifts], axis=0)
+
+    planes = rng.standard_normal((dim, n_tables * n_bits)).astype(np.float32)
+    db = _codes(stacked, planes, center, n_bits)
+    tables = []
+    for t in range(n_tables):
+        order = np.argsort(db[:, t], kind="stable")
+        codes, starts, sizes = np.unique(db[order, t], return_index=True, return_counts=True)
+        tables.append((order, codes, starts, sizes))
+
+    found, found_sims = [], []
+    for shift in shifts:
+        queries = rotate(stacked, shift, bins)
+        q_codes = _codes(queries, planes, center, n_bits)
+        for t, (order, codes, starts, sizes) in enumerate(tables):
+            q = q_codes[:, t]
+            pos = np.minimum(np.searchsorted(codes, q), len(codes) - 1)
+            hit = codes[pos] == q
+            # huge buckets are silence / noise: skip them instead of going quadratic
+            counts = np.where(hit & (sizes[pos] <= max_bucket), sizes[pos], 0)
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            qi = np.repeat(np.arange(n), counts)
+            offsets = np.cumsum(counts) - counts
+            dj = order[starts[pos[qi]] + np.arange(total) - offsets[qi]]
+            keep = dj - qi >= min_lag
+            qi, dj = qi[keep], dj[keep]
+            sims = np.einsum("ij,ij->i", queries[qi], stacked[dj])
+            keep = sims >= min_similarity
+            found.append(np.stack([qi[keep], dj[keep], np.full(keep.sum(), shift)], axis=1))
+            found_sims.append(sims[keep])
+    if not found:
+        return np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=np.float32)
+    pairs, sims = np.concatenate(found), np.concatenate(found_sims)
+    # the same pair is found by several tables: keep one
+    _, first = np.unique(pairs, axis=0, return_index=True)
+    return pairs[first], sims[first]
+
+
+def lag_runs(pairs, sims, max_gap=3, min_length=40, lag_tolerance=5):
+    """Runs of matches along (almost) constant lag in the time-lag plane.
+
+    Runs whose lags differ by at most lag_tolerance frames and that
+    overlap or touch in time are one section (merged until none are left).
+    """
+    i, lag = pairs[:, 0], pairs[:, 1] - pairs[:, 0]
+    order = np.lexsort((i, lag))
+    i, lag, shift, sims = i[order], lag[order], pairs[order, 2], sims[order]
+
+    runs = []
+    # a new run starts where the lag changes or the time gap is too long
+    breaks = np.where((np.diff(lag) != 0) | (np.diff(i) > max_gap))[0] + 1
+    # isolated hits cannot become a section; dropping them keeps the merge cheap
+    min_hits = max(2, min_length // 4)
+    for a, b in zip(np.r_[0, breaks], np.r_[breaks, len(i)]):
+        if b - a >= min_hits:
+            runs.append([int(i[a]), int(i[b - 1]), int(lag[a]), shift[a:b], sims[a:b]])
+
+    # merge runs on neighbouring lags that overlap in time (slight tempo drift);
+    # a merge moves the lag and extent, so repeat until nothing changes
+    while True:
+        runs.sort(key=lambda r: (r[0], r[2]))
+        merged = []
+        for run in runs:
+            for m in merged:
+                if abs(m[2] - run[2]) <= lag_tolerance and run[0] <= m[1] + max_gap and run[1] >= m[0] - max_gap:
+                    weight = len(m[4]) / float(len(m[4]) + len(run[4]))
+                    m[0], m[1] = min(m[0], run[0]), max(m[1], run[1])
+                    m[2] = int(round(weight * m[2] + (1 - weight) * run[2]))
+                    m[3] = np.concatenate([m[3], run[3]])
+                    m[4] = np.concatenate([m[4], run[4]])
+                    break
+            else:
+                merged.append(run)
+        if len(merged) == len(runs):
+            break
+        runs = merged
+    return [r for r in merged if r[1] - r[0] + 1 >= min_length]
+
+
+def thumbnail(segments, duration, length_s=20.0):
+    """Occurrence overlapping most other occurrences, cut to length_s seconds."""
+    occurrences = []
+    for seg in segments:
+        occurrences.append((seg["start"], seg["end"]))
+        occurrences.append((seg["start"] + seg["lag"], seg["end"] + seg["lag"]))
+    if not occurrences:
+        return None
+    occ = np.array(occurrences)
+    overlap = np.maximum(0.0, np.minimum(occ[:, None, 1], occ[None, :, 1]) -
+                         np.maximum(occ[:, None, 0], occ[None, :, 0]))
+    score = overlap.sum(axis=1)
+    best = int(np.argmax(score))
+    start = float(occ[best, 0])
+    end = min(start + length_s, float(duration))
+    start = max(0.0, min(start, end - length_s))
+    repeats = int(((overlap[best] > 0.5 * (occ[best, 1] - occ[best, 0])) |
+                   (overlap[best] > 0.5 * (occ[:, 1] - occ[:, 0]))).sum())
+    return {"start": start, "end": end, "repeats": repeats}
+
+
+def repetitions(X, frame_rate=10.0, context=8, step=2, min_lag_s=4.0, min_length_s=6.0,
+                max_gap_s=1.0, lag_tolerance_s=0.5, min_similarity=0.85, n_tables=12, n_bits=18,
+                key_invariant=True, thumbnail_s=20.0, seed=0):
+    """Repeated segments + thumbnail from frame features (rows = frames, 12-bin chroma blocks)."""
+    X = np.asarray(X, dtype=np.float32)
+    bins = X.shape[1]
+    stacked = stack_frames(X, context, step)
+    span = (context - 1) * step
+    shifts = range(bins) if key_invariant else [0]
+    pairs, sims = matching_pairs(stacked, n_tables, n_bits, shifts, int(min_lag_s * frame_rate),
+                                 min_similarity, bins=bins, seed=seed)
+
+    segments = []
+    runs = lag_runs(pairs, sims, max_gap=max(1, int(max_gap_s * frame_rate)),
+                    min_length=int(min_length_s * frame_rate),
+                    lag_tolerance=max(1, int(round(lag_tolerance_s * frame_rate))))
+    for start, end, lag, shift, s in runs:
+        segments.append({"start": start / frame_rate, "end": (end + span + 1) / frame_rate,
+                         "lag": lag / frame_rate,
+                         # semitones the repeat is transposed by (0 = same key)
+                         "shift": int(np.bincount(shift).argmax()) * 12 // bins,
+                         "matches": int(len(s)), "similarity": float(np.mean(s))})
+    segments.sort(key=lambda seg: -seg["matches"])
+    return {"segments": segments,
+            "thumbnail": thumbnail(segments, len(X) / frame_rate, thumbnail_s),
+            "time_lag": {"time": pairs[:, 0] / frame_rate,
+                         "lag": (pairs[:, 1] - pairs[:, 0]) / frame_rate,
+                         "similarity": sims}}
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+from stage_cache import _jsonable, fingerprint
+
+# -------------------------------------------------------
+# Final-result cache for repeated analysis requests
+#
+#   cache = ResultCache()
+#   digest = audio_hash(audio)
+#   result, hit = cache.cached(digest, "KeyExtractor", {"profileType": "edma", ...},
+#                              lambda: {"key": k, ...})
+#
+# Keyed by a hash of the decoded samples + extractor name + its
+# parameters, so a re-request of the same track (any path, any time)
+# returns the stored JSON result in milliseconds. Two tiers:
+#   memory  LRU of result objects, bounded by their JSON size in bytes
+#   disk    one JSON file per entry under RESULT_DIR, least recently
+#           used (file mtime, bumped on every hit) evicted first
+# Entries can carry a TTL (seconds); expired entries count as misses
+# and are dropped. Hits / misses / evictions are counted per tier.
+# Unlike stage_cache.py (intermediate arrays keyed by file + stage
+# chain) this stores only small final results, under its own root so
+# `stage_cache.py clear` / `info` never touch them.
+# -------------------------------------------------------
+
+RESULT_DIR = os.environ.get("ESSENTIA_RESULT_CACHE_DIR", "/data/.result_cache")
+
+
+def audio_hash(audio):
+    """Content hash of decoded audio (float32 samples)."""
+    return hashlib.blake2b(np.ascontiguousarray(audio, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+
+def result_key(digest, extractor, params, version=1):
+    return fingerprint(extractor, params, [digest], version)
+
+
+class ResultCache:
+    def __init__(self, root=RESULT_DIR, memory_bytes=64 << 20, disk_bytes=1 << 30, ttl=None, enabled=True):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.counters = dict.fromkeys(("memory_hits", "disk_hits", "misses", "expired",
+                                       "memory_evictions", "disk_evictions"), 0)
+        self._memory = OrderedDict()         # key -> (expires, size, value), oldest first
+        self._memory_used = 0
+        self._disk = {}                      # key -> size, rebuilt from RESULT_DIR
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        if enabled and os.path.isdir(root):
+            for entry in os.scandir(root):
+                if entry.name.endswith(".json"):
+                    self._disk[entry.name[:-5]] = entry.stat().st_size
+            self._disk_used = sum(self._disk.values())
+
+    def path(self, key):
+        return os.path.join(self.root, key + ".json")
+
+    # --- lookup ---
+    def get(self, key):
+        """Stored result or None. Disk hits are promoted to the memory tier."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] is None or entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[2]
+                self._drop_memory(key)
+                self._remove_file(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+        try:
+            with open(self.path(key), "rb") as f:
+                blob = f.read()
+            os.utime(self.path(key))         # LRU order of the disk tier
+        except OSError:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+        stored = json.loads(blob)
+        with self._lock:
+            if stored["expires"] is not None and stored["expires"] <= now:
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                self._remove_file(key)
+                return None
+            self.counters["disk_hits"] += 1
+            self._remember(key, stored["expires"], len(blob), stored["value"])
+        return stored["value"]
+
+    def put(self, key, value, ttl=None):
+        """Store a JSON-able result in both tiers; returns the stored (JSON) form."""
+        value = _jsonable(value)
+        if not self.enabled:
+            return value
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        blob = json.dumps({"expires": expires, "value": value}).encode("utf-8")
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, self.path(key))      # atomic, like the stage cache entries
+        with self._lock:
+            self._remember(key, expires, len(blob), value)
+            self._disk_used += len(blob) - self._disk.get(key, 0)
+            self._disk[key] = len(blob)
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+        return value
+
+    def cached(self, digest, extractor, params, fn, ttl=None, version=1):
+        """(result, hit): fn() is only called on a miss. Results come back in JSON form either way."""
+        key = result_key(digest, extractor, params, version)
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        return self.put(key, fn(), ttl), False
+
+    # --- tiers ---
+    def _remember(self, key, expires, size, value):
+        if key in self._memory:
+            self._drop_memory(key)
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = (expires, size, value)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            self._drop_memory(next(iter(self._memory)))
+            self.counters["memory_evictions"] += 1
+
+    def _drop_memory(self, key):
+        self._memory_used -= self._memory.pop(key)[1]
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+        self._disk_used -= self._disk.pop(key, 0)
+
+    def _evict_disk(self):
+        # oldest mtime first; other processes may have touched / removed files meanwhile
+        ages = []
+        for key in self._disk:
+            try:
+                ages.append((os.path.getmtime(self.path(key)), key))
+            except OSError:
+                ages.append((0.0, key))
+        for _, key in sorted(ages):
+            if self._disk_used <= 0.9 * self.disk_bytes:
+                break
+            self._remove_file(key)
+            self.counters["disk_evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._disk):
+                self._remove_file(key)
+            self._memory.clear()
+            self._memory_used = 0
+
+    def purge(self):
+        """Remove expired entries from disk; returns how many."""
+        now = time.time()
+        removed = 0
+        for key in list(self._disk):
+            try:
+                with open(self.path(key), "rb") as f:
+                    expires = json.load(f)["expires"]
+            except (OSError, ValueError):
+                expires = 0.0
+            if expires is not None and expires <= now:
+                with self._lock:
+                    self._remove_file(key)
+                removed += 1
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, memory_entries=len(self._memory), memory_bytes=self._memory_used,
+                        disk_entries=len(self._disk), disk_bytes=self._disk_used)
+
+
+# -------------------------------------------------------
+# MAIN: inspect / clean the disk tier
+#   python3 result_cache.py info
+#   python3 result_cache.py purge      # expired entries only
+#   python3 result_cache.py clear
+# -------------------------------------------------------
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "info"
+    cache = ResultCache()
+    if cmd == "clear":
+        cache.clear()
+        print("Cleared", cache.root)
+    elif cmd == "purge":
+        print(f"Removed {cache.purge()} expired entries from {cache.root}")
+    else:
+        st = cache.stats()
+        print(f"{cache.root}: {st['disk_entries']} entries, {st['disk_bytes'] / 1e6:.2f} MB "
+              f"(limit {cache.disk_bytes / 1e6:.0f} MB)")
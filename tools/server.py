@@ -0,0 +1,466 @@
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+import gate
+from result_cache import ResultCache, audio_hash, result_key
+from stage_cache import source_fingerprint
+
+# -------------------------------------------------------
+# Local analysis server with warm Essentia algorithms
+#
+#   python3 server.py serve --workers 4              # http://127.0.0.1:8765
+#   curl -s localhost:8765/analyze -d '{"path": "/data/My_Song.wav"}'
+#   curl -s --data-binary @clip.mp3 -H 'Content-Type: audio/mpeg' \
+#        'localhost:8765/analyze?features=key,bpm'
+#   curl -s --data-binary @pcm.f32 -H 'Content-Type: audio/x-float32' \
+#        'localhost:8765/analyze?sr=44100'             # raw mono float32
+#   curl -s localhost:8765/stats                      # latency, batches, cache counters
+#   python3 server.py bench /data/My_Song.wav --clip 30 --requests 200
+#
+# Every worker process builds KeyExtractor, RhythmExtractor2013,
+# Windowing/Spectrum/SpectralPeaks/HPCP and ChordsDetection once and
+# reuses them, so a request pays neither imports nor construction.
+# Short clips (under --short-s) that arrive within --batch-ms of each
+# other are collected (up to --max-batch clips) and split evenly over
+# the idle workers, one IPC round trip per worker, so a batch never
+# runs serially on one worker while others wait; longer clips and file
+# paths go alone, so they never wait behind another request in the
+# same batch. Chords use 8192/2048 frames at 44.1 kHz: the same time and
+# frequency resolution as the 4096/1024 @ 22.05 kHz of
+# chords_detection.py, without a resampling pass per request.
+# Results are kept per feature in a ResultCache (result_cache.py)
+# keyed by the content of the request (PCM / upload hash, or the path
+# fingerprint), so repeated requests skip the workers entirely.
+# A request waits at most --timeout seconds for its worker (a worker
+# that crashes never reports back) and then gets a 504.
+# The server binds to 127.0.0.1 only.
+# -------------------------------------------------------
+
+SR = 44100
+FEATURES = ("key", "bpm", "chords", "hpcp")
+CHORD_FRAME, CHORD_HOP = 8192, 2048
+
+
+def feature_params(rhythm_method):
+    """Extractor + parameters per feature: the result cache key besides the audio."""
+    hpcp = {"sampleRate": SR, "frameSize": CHORD_FRAME, "hopSize": CHORD_HOP, "size": 36, "gateDb": gate.GATE_DB}
+    return {
+        "key": ("KeyExtractor", {"profileType": "edma", "sampleRate": SR, "frameSize": 4096,
+                                 "hopSize": 4096, "hpcpSize": 12}),
+        "bpm": ("RhythmExtractor2013", {"method": rhythm_method}),
+        "chords": ("ChordsDetection", hpcp),
+        "hpcp": ("HPCP", hpcp),
+    }
+
+_analyzer = None
+
+
+class Analyzer:
+    """The warm algorithm instances of one worker process."""
+
+    def __init__(self, rhythm_method="degara"):
+        import essentia
+        import essentia.standard as es
+        # reused KeyExtractor / RhythmExtractor2013 log a harmless warning per
+        # internal algorithm on every reset of their streaming network
+        essentia.log.warningActive = False
+        self.es = es
+        self.key = es.KeyExtractor(profileType="edma", sampleRate=SR, frameSize=4096, hopSize=4096,
+                                   hpcpSize=12)
+        self.rhythm = es.RhythmExtractor2013(method=rhythm_method)
+        self.window = es.Windowing(type="hann")
+        self.spectrum = es.Spectrum()
+        self.peaks = es.SpectralPeaks(sampleRate=SR)
+        self.hpcp = es.HPCP(size=36, sampleRate=SR)
+        self.chords = es.ChordsDetection(hopSize=CHORD_HOP, sampleRate=SR)
+
+    def load(self, path):
+        return self.es.MonoLoader(filename=path, sampleRate=SR)()
+
+    def hpcp_frames(self, audio):
+        """(HPCP frames, active mask): silent frames (gate.py) are zero rows."""
+        from frame_matrix import FrameMatrix
+        active = gate.active_frames(audio, CHORD_FRAME, CHORD_HOP, start_from_zero=True)
+        out = FrameMatrix.for_audio(audio, CHORD_FRAME, CHORD_HOP, width=36, start_from_zero=True)
+        for i, frame in enumerate(self.es.FrameGenerator(audio, frameSize=CHORD_FRAME, hopSize=CHORD_HOP,
+                                                         startFromZero=True)):
+            if not active[i]:
+                out.skip()
+                continue
+            freqs, mags = self.peaks(self.spectrum(self.window(frame)))
+            if len(freqs) > 0:
+                out.append(self.hpcp(freqs, mags))
+            else:
+                out.skip()
+        return out.array, active
+
+    def analyze(self, audio, features):
+        out = {"duration": len(audio) / float(SR)}
+        if "key" in features:
+            k, scale, strength = self.key(audio)
+            out["key"] = {"key": k, "scale": scale, "strength": float(strength)}
+        if "bpm" in features:
+            bpm, beats, confidence, _, _ = self.rhythm(audio)
+            out["bpm"] = {"bpm": float(bpm), "confidence": float(confidence), "beats": np.round(beats.astype(np.float64), 3).tolist()}
+        if "chords" in features or "hpcp" in features:
+            frames, active = self.hpcp_frames(audio)
+            if "hpcp" in features:
+                mean = frames.mean(axis=0) if len(frames) else np.zeros(36, dtype=np.float32)
+                out["hpcp"] = (mean / mean.max() if mean.max() > 0 else mean).round(4).tolist()
+            if "chords" in features:
+                out["chords"] = self.chord_segments(frames, active) if len(frames) else []
+        return out
+
+    def chord_segments(self, frames, active):
+        labels, strengths = self.chords(frames)
+        hop_s = CHORD_HOP / float(SR)
+        segments = []
+        for i, (c, s) in enumerate(zip(labels, strengths)):
+            if not active[i]:
+                c, s = gate.NO_SIGNAL, 0.0
+            if segments and segments[-1]["chord"] == c:
+                segments[-1]["end"] = round((i + 1) * hop_s, 3)
+                segments[-1]["strength"] = max(segments[-1]["strength"], float(s))
+            else:
+                segments.append({"start": round(i * hop_s, 3), "end": round((i + 1) * hop_s, 3),
+                                 "chord": c, "strength": float(s)})
+        return segments
+
+
+def _init_worker(rhythm_method):
+    global _analyzer
+    _analyzer = Analyzer(rhythm_method)
+    _analyzer.analyze(np.zeros(SR, dtype=np.float32), FEATURES)     # first-call allocations
+
+
+def analyze_batch(jobs):
+    """Runs in a worker: [(audio or path, features)] -> [result or {"error": ...}]."""
+    results = []
+    for source, features in jobs:
+        t0 = time.perf_counter()
+        try:
+            audio = _analyzer.load(source) if isinstance(source, str) else source
+            result = _analyzer.analyze(audio, features)
+            result["analysis_ms"] = round(1000 * (time.perf_counter() - t0), 1)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        results.append(result)
+    return results
+
+
+# -------------------------------------------------------
+# Micro-batching dispatcher
+# -------------------------------------------------------
+class Job:
+    def __init__(self, source, features):
+        self.source = source
+        self.features = features
+        self.done = threading.Event()
+        self.result = None
+
+
+class Dispatcher:
+    """Collects jobs for up to batch_s (or max_batch jobs) and spreads each batch over the idle workers."""
+
+    def __init__(self, workers=2, batch_s=0.01, max_batch=8, short_s=10.0, rhythm_method="degara", timeout_s=300.0):
+        self.pool = mp.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(rhythm_method,))
+        self.batch_s = batch_s
+        self.max_batch = max_batch
+        self.short = int(short_s * SR)
+        self.rhythm_method = rhythm_method
+        self.timeout_s = timeout_s
+        self.workers = workers
+        self.in_flight = 0              # chunks handed to the pool and not finished yet
+        self.jobs = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "jobs": 0, "errors": 0}
+        self.latencies = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, source, features):
+        job = Job(source, features)
+        self.jobs.put(job)
+        if not job.done.wait(self.timeout_s):
+            # the pool replaces a dead worker but drops its task: never wait forever
+            return {"error": f"TimeoutError: no result from the worker within {self.timeout_s:g} s", "timeout": True}
+        return job.result
+
+    def _batchable(self, job):
+        return isinstance(job.source, np.ndarray) and len(job.source) < self.short
+
+    def _loop(self):
+        while True:
+            batch = [self.jobs.get()]
+            deadline = time.perf_counter() + self.batch_s
+            while self._batchable(batch[0]) and len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if self._batchable(job):
+                    batch.append(job)
+                else:
+                    self._dispatch([job])
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        with self._lock:
+            n = min(len(batch), max(1, self.workers - self.in_flight))
+            self.in_flight += n
+        size = -(-len(batch) // n)
+        for i in range(0, len(batch), size):
+            self._submit_chunk(batch[i:i + size])
+
+    def _submit_chunk(self, chunk):
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["jobs"] += len(chunk)
+        self.pool.apply_async(analyze_batch, ([(j.source, j.features) for j in chunk],),
+                              callback=lambda results: self._finish(chunk, results),
+                              error_callback=lambda e: self._finish(
+                                  chunk, [{"error": f"{type(e).__name__}: {e}"}] * len(chunk)))
+
+    def _finish(self, batch, results):
+        with self._lock:
+            self.in_flight -= 1
+        for job, result in zip(batch, results):
+            job.result = result
+            job.done.set()
+
+    def record(self, latency, error):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["errors"] += int(error)
+            self.latencies.append(latency)
+            del self.latencies[:-10000]
+
+    def summary(self):
+        with self._lock:
+            lat = np.array(self.latencies) * 1000
+            out = dict(self.stats)
+        out["mean_batch"] = out["jobs"] / out["batches"] if out["batches"] else 0.0
+        if len(lat):
+            out.update({f"p{q}_ms": float(np.percentile(lat, q)) for q in (50, 90, 99)})
+        return out
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+# -------------------------------------------------------
+# HTTP front end
+# -------------------------------------------------------
+def _features(query):
+    names = query.get("features", [",".join(FEATURES)])[0].split(",")
+    unknown = [n for n in names if n not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown feature(s): {', '.join(unknown)} (available: {', '.join(FEATURES)})")
+    return tuple(names)
+
+
+class Handler(BaseHTTPRequestHandler):
+    dispatcher = None
+    cache = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            self._send(200, dict(self.dispatcher.summary(), cache=self.cache.stats()))
+        elif self.path.startswith("/health"):
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/analyze":
+            return self._send(404, {"error": "not found"})
+        tmp = None
+        try:
+            query = urllib.parse.parse_qs(url.query)
+            features = _features(query)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            ctype = self.headers.get("Content-Type", "")
+            if ctype.startswith("audio/x-float32"):
+                sr = int(query.get("sr", [SR])[0])
+                if sr != SR:
+                    raise ValueError(f"Raw PCM must be mono float32 at {SR} Hz")
+                source = np.frombuffer(body, dtype=np.float32)
+                digest = audio_hash(source)
+            elif ctype.startswith("audio/") or ctype == "application/octet-stream":
+                # encoded upload: decoded by the worker's MonoLoader from a temp file
+                suffix = "." + ctype.split("/")[-1].replace("mpeg", "mp3").replace("x-", "")
+                fd, tmp = tempfile.mkstemp(suffix=suffix if len(suffix) <= 6 else "")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(body)
+                source = tmp
+                digest = "upload:" + hashlib.blake2b(body, digest_size=16).hexdigest()
+            else:
+                request = json.loads(body or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("Request body must be a JSON object")
+                source = request["path"]
+                if not isinstance(source, str):
+                    raise ValueError('"path" must be a string')
+                digest = "path:" + source_fingerprint(source)
+                if "features" in request:
+                    names = request["features"]
+                    if isinstance(names, str):
+                        names = names.split(",")
+                    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+                        raise ValueError('"features" must be a list of feature names')
+                    features = _features({"features": [",".join(names)]})
+            result = self.analyze(source, digest, features)
+        except (ValueError, KeyError, OSError) as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            if tmp is not None:
+                os.remove(tmp)
+        error = "error" in result
+        self.dispatcher.record(time.perf_counter() - t0, error)
+        self._send((504 if result.pop("timeout", False) else 400) if error else 200, result)
+
+    def analyze(self, source, digest, features):
+        """Cached features + a worker run for the missing ones (if any)."""
+        params = feature_params(self.dispatcher.rhythm_method)
+        keys = {name: result_key(digest, *params[name]) for name in features}
+        result, cached = {}, []
+        for name in features:
+            entry = self.cache.get(keys[name])
+            if entry is not None:
+                result[name] = entry["value"]
+                result["duration"] = entry["duration"]
+                cached.append(name)
+        missing = tuple(n for n in features if n not in cached)
+        if missing:
+            fresh = self.dispatcher.submit(source, missing)
+            if "error" in fresh:
+                return fresh
+            for name in missing:
+                self.cache.put(keys[name], {"duration": fresh["duration"], "value": fresh[name]})
+            result.update(fresh)
+        result["cached"] = cached
+        return result
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(port=8765, workers=2, batch_ms=10.0, max_batch=8, short_s=10.0, rhythm_method="degara",
+          cache_mb=64, ttl=None, use_cache=True, timeout_s=300.0):
+    dispatcher = Dispatcher(workers, batch_ms / 1000.0, max_batch, short_s, rhythm_method, timeout_s)
+    Handler.dispatcher = dispatcher
+    Handler.cache = ResultCache(memory_bytes=int(cache_mb * 1e6), ttl=ttl, enabled=use_cache)
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    signal.signal(signal.SIGTERM, _interrupt)
+    print(f"Analysis server on http://127.0.0.1:{port} ({workers} warm workers, rhythm={rhythm_method})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        dispatcher.close()
+        print(json.dumps(dict(dispatcher.summary(), cache=Handler.cache.stats()), indent=4))
+
+
+# -------------------------------------------------------
+# Latency benchmark against a running server
+# -------------------------------------------------------
+def bench(path, port=8765, clip_s=30.0, n_requests=100, concurrency=4, features=FEATURES, repeat=False):
+    """Latency of n_requests clips; each clip starts one sample later (cache misses) unless repeat."""
+    from essentia.standard import MonoLoader
+    full = MonoLoader(filename=path, sampleRate=SR)()
+    audio = full[:int(clip_s * SR)]
+    counter = iter(range(n_requests))
+    url = f"http://127.0.0.1:{port}/analyze?sr={SR}&features={','.join(features)}"
+    latencies = []
+    lock = threading.Lock()
+
+    def client(n):
+        for _ in range(n):
+            with lock:
+                start = 0 if repeat else next(counter)
+            body = np.ascontiguousarray(full[start:start + len(audio)], dtype=np.float32).tobytes()
+            t0 = time.perf_counter()
+            req = urllib.request.Request(url, data=body, headers={"Content-Type": "audio/x-float32"})
+            with urllib.request.urlopen(req) as r:
+                json.load(r)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client, args=(n_requests // concurrency,)) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000
+    print(f"{len(lat)} requests of {len(audio) / SR:.0f} s clips, concurrency {concurrency}: "
+          f"{len(lat) / wall:.1f} req/s")
+    print(f"latency p50 {np.percentile(lat, 50):.0f} ms  p90 {np.percentile(lat, 90):.0f} ms  "
+          f"p99 {np.percentile(lat, 99):.0f} ms  max {lat.max():.0f} ms")
+    return lat
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local analysis server (key / BPM / chords / HPCP)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("--port", type=int, default=8765)
+    s.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    s.add_argument("--batch-ms", type=float, default=10.0, help="micro-batching window")
+    s.add_argument("--max-batch", type=int, default=8)
+    s.add_argument("--short-s", type=float, default=10.0, help="clips shorter than this are batched")
+    s.add_argument("--rhythm", choices=["degara", "multifeature"], default="degara",
+                   help="RhythmExtractor2013 method (multifeature: ~5x slower)")
+    s.add_argument("--cache-mb", type=float, default=64, help="in-memory result cache size")
+    s.add_argument("--ttl", type=float, default=None, help="result lifetime in seconds (default: no expiry)")
+    s.add_argument("--no-cache", action="store_true")
+    s.add_argument("--timeout", type=float, default=300.0, help="seconds a request waits for its worker")
+    b = sub.add_parser("bench")
+    b.add_argument("file")
+    b.add_argument("--port", type=int, default=8765)
+    b.add_argument("--clip", type=float, default=30.0, help="clip length in seconds")
+    b.add_argument("--requests", type=int, default=100)
+    b.add_argument("--concurrency", type=int, default=4)
+    b.add_argument("--repeat", action="store_true", help="send the same clip every time (cache hits)")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve(args.port, args.workers, args.batch_ms, args.max_batch, args.short_s, args.rhythm,
+              args.cache_mb, args.ttl, not args.no_cache, args.timeout)
+    else:
+        bench(args.file, args.port, args.clip, args.requests, args.concurrency, repeat=args.repeat)
@@ -0,0 +1,64 @@
+import numpy as np
+
+import lazy
+
+try:
+    _fft = lazy.module("scipy.fft")      # imported on first transform
+    HAVE_SCIPY = True
+except ImportError:
+    _fft = np.fft
+    HAVE_SCIPY = False
+
+# -------------------------------------------------------
+# Batched magnitude STFT, same frames and values as
+#
+#   for frame in FrameGenerator(audio, frameSize, hopSize, startFromZero=True):
+#       spec = Spectrum()(Windowing(type="hann")(frame))
+#
+# but computed block-wise with one rfft per block instead of three
+# algorithm calls per frame. Matches Essentia to float32 precision:
+#   - frames start at 0, k * hop; a frame is kept while its last hop
+#     samples still contain audio (at least one frame), and is
+#     zero-padded past the end
+#   - Windowing's hann is symmetric and normalised to sum 2
+#     (zeroPhase only rotates the frame, magnitudes are unchanged)
+# -------------------------------------------------------
+
+
+def frame_count(n_samples, frame_size, hop_size):
+    if n_samples <= 0:
+        return 0
+    # FrameGenerator(startFromZero=True) drops a frame once it would only
+    # contain samples already covered by the previous one plus padding,
+    # and never starts one past the end (hop_size > frame_size)
+    return min(-(-n_samples // hop_size), max(1, -(-(n_samples - frame_size + hop_size) // hop_size)))
+
+
+def frames(audio, frame_size, hop_size):
+    """(n_frames x frame_size) view of the FrameGenerator frames (zero-padded tail)."""
+    audio = np.asarray(audio, dtype=np.float32)
+    n = frame_count(len(audio), frame_size, hop_size)
+    needed = (n - 1) * hop_size + frame_size
+    if needed > len(audio):
+        audio = np.concatenate([audio, np.zeros(needed - len(audio), dtype=np.float32)])
+    return np.lib.stride_tricks.as_strided(
+        audio, shape=(n, frame_size), strides=(audio.strides[0] * hop_size, audio.strides[0]),
+        writeable=False)
+
+
+def hann(frame_size):
+    """Windowing(type="hann", normalized=True)."""
+    i = np.arange(frame_size)
+    w = 0.5 - 0.5 * np.cos(2 * np.pi * i / (frame_size - 1))
+    return (w * 2.0 / w.sum()).astype(np.float32)
+
+
+def magnitude_spectrogram(audio, frame_size=2048, hop_size=512, block=2048):
+    """(n_frames x frame_size // 2 + 1) float32 magnitudes, Spectrum() per frame."""
+    fr = frames(audio, frame_size, hop_size)
+    window = hann(frame_size)
+    out = np.empty((len(fr), frame_size // 2 + 1), dtype=np.float32)
+    # blocks keep the complex temporary at block x n_bins
+    for start in range(0, len(fr), block):
+        out[start:start + block] = np.abs(_fft.rfft(fr[start:start + block] * window, axis=1))
+    return out
@@ -0,0 +1,163 @@
+import numpy as np
+
+import lazy
+
+try:
+    _fft = lazy.module("scipy.fft")      # imported on first transform
+    HAVE_SCIPY = True
+except ImportError:
+    _fft = np.fft
+    HAVE_SCIPY = False
+
+# -------------------------------------------------------
+# Self-similarity + Foote checkerboard novelty, without the N x N matrix
+#
+#   X = feature_frames(audio, 44100, kind="hpcp", frame_rate=10)
+#   res = foote_novelty(X, kernel_sizes=(64, 128))     # half sizes in frames
+#   res["novelty"], res["curves"][64]
+#   times = peak_boundaries(res["novelty"], frame_rate=10)
+#
+# Novelty at frame i is sum_{a,b} C(a, b) * S(i + a, i + b) with the
+# Gaussian-tapered checkerboard C of half size K. Grouping the terms by
+# diagonal d = b - a gives
+#
+#   novelty = sum_d  correlate(D_d, c_d)        D_d[j] = <x_j, x_{j+d}>
+#                                              c_d[a] = C(a, a + d)
+#
+# so only the diagonals |d| <= 2K of S are needed (and by symmetry only
+# d >= 0). They are produced in chunks of lags, correlated with their
+# kernel diagonals by one batched rfft per chunk and summed in the
+# frequency domain: memory is O(N * chunk), time O(N * K * log N).
+# One hour at 10 frames/s with kernels up to 32 s stays under 200 MB.
+# -------------------------------------------------------
+
+
+def _fast_len(n):
+    if HAVE_SCIPY:
+        return _fft.next_fast_len(n, real=True)
+    return 1 << int(np.ceil(np.log2(n)))
+
+
+def normalize_rows(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return np.divide(X, norms, out=np.zeros_like(X), where=norms > 0)
+
+
+def banded_similarity(X, width):
+    """(N x width+1) band of the cosine self-similarity: column d = S(j, j+d)."""
+    X = normalize_rows(X)
+    n = len(X)
+    band = np.zeros((n, width + 1), dtype=np.float32)
+    for d in range(min(width, n - 1) + 1):
+        band[:n - d, d] = np.einsum("ij,ij->i", X[:n - d], X[d:])
+    return band
+
+
+def checkerboard_kernel(half_size, taper=0.5):
+    """(2K+1) x (2K+1) checkerboard, Gaussian taper of std taper*K, sum |C| = 1."""
+    a = np.arange(-half_size, half_size + 1, dtype=float)
+    g = np.exp(-0.5 * (a / (taper * half_size)) ** 2)
+    kernel = np.outer(np.sign(a) * g, np.sign(a) * g)
+    return kernel / np.abs(kernel).sum()
+
+
+def _kernel_diagonals(half_size, taper):
+    """(2K+1) x (2K+1) array: column d holds c_d[a] = C(a, a + d), row a + K."""
+    c = checkerboard_kernel(half_size, taper)
+    size = 2 * half_size + 1
+    diags = np.zeros((size, size))
+    for d in range(size):
+        diags[:size - d, d] = np.diagonal(c, offset=d)
+    # d and -d contribute the same amount (S and C are symmetric)
+    diags[:, 1:] *= 2.0
+    return diags
+
+
+def foote_novelty(X, kernel_sizes=(64, 128), taper=0.5, chunk=64):
+    """Checkerboard novelty for every kernel half-size in `kernel_sizes` (frames).
+
+    Returns {"curves": {K: curve}, "novelty": mean of the max-normalised curves}.
+    """
+    kernel_sizes = [int(k) for k in kernel_sizes]
+    n_frames = len(X)
+    # mirror the features at both ends: with zeros outside, the kernel would
+    # see a change at the very start and end of every track
+    edge = min(max(kernel_sizes), n_frames - 1)
+    X = normalize_rows(np.pad(np.asarray(X), ((edge, edge), (0, 0)), mode="reflect"))
+    n = len(X)
+    width = 2 * max(kernel_sizes)
+    n_fft = _fast_len(n + 2 * width + 1)
+
+    # kernel diagonals, reversed: correlation = convolution with the flipped kernel
+    kernel_diags = {k: _kernel_diagonals(k, taper)[::-1].astype(np.float32) for k in kernel_sizes}
+    acc = {k: np.zeros(n_fft // 2 + 1, dtype=np.complex128) for k in kernel_sizes}
+
+    for d0 in range(0, min(width, n - 1) + 1, chunk):
+        lags = np.arange(d0, min(d0 + chunk, width + 1, n))
+        block = np.zeros((n, len(lags)), dtype=np.float32)
+        for j, d in enumerate(lags):
+            block[:n - d, j] = np.einsum("ij,ij->i", X[:n - d], X[d:])
+        spec = _fft.rfft(block, n=n_fft, axis=0)
+        for k, diags in kernel_diags.items():
+            use = lags[lags <= 2 * k]
+            if len(use):
+                # kernel columns transformed chunk by chunk too: O(N * chunk) memory
+                kspec = _fft.rfft(diags[:, use], n=n_fft, axis=0)
+                acc[k] += (spec[:, :len(use)] * kspec).sum(axis=1)
+        del block, spec
+
+    curves = {}
+    for k in kernel_sizes:
+        full = _fft.irfft(acc[k], n=n_fft)
+        curves[k] = np.maximum(full[k + edge:k + edge + n_frames], 0.0).astype(np.float32)
+
+    combined = np.zeros(n_frames, dtype=np.float32)
+    for curve in curves.values():
+        if curve.max() > 0:
+            combined += curve / curve.max()
+    return {"curves": curves, "novelty": combined / max(1, len(curves))}
+
+
+def peak_boundaries(novelty, frame_rate, min_distance_s=8.0, window_s=16.0, delta=0.05, min_height=0.5):
+    """Section boundaries (s): local maxima above a moving-average threshold
+    and above min_height * the highest peak."""
+    novelty = np.asarray(novelty, dtype=float)
+    if len(novelty) < 3:
+        return np.zeros(0)
+    w = max(1, int(window_s * frame_rate))
+    threshold = np.convolve(novelty, np.ones(w) / w, mode="same") + delta
+    is_peak = (novelty[1:-1] > novelty[:-2]) & (novelty[1:-1] >= novelty[2:]) & \
+              (novelty[1:-1] > threshold[1:-1]) & (novelty[1:-1] >= min_height * novelty.max())
+    candidates = np.where(is_peak)[0] + 1
+    # strongest first, then suppress neighbours closer than min_distance_s
+    min_dist = int(min_distance_s * frame_rate)
+    kept = []
+    for p in candidates[np.argsort(-novelty[candidates])]:
+        if all(abs(p - q) >= min_dist for q in kept):
+            kept.append(p)
+    return np.sort(np.array(kept, dtype=int)) / float(frame_rate)
+
+
+# -------------------------------------------------------
+# Frame features at a low frame rate
+# -------------------------------------------------------
+def feature_frames(audio, sr=44100, kind="hpcp", frame_rate=10.0, frame_size=4096):
+    """HPCP (12), MFCC (12, c0 dropped) or log band energies (28) at `frame_rate` frames/s."""
+    hop = int(round(sr / float(frame_rate)))
+    if kind == "hpcp":
+        from pipelines import hpcp_frames
+        return hpcp_frames(audio, sr, frame_size, hop, 12)
+    import spectra
+    mags = spectra.magnitude_spectrogram(audio, frame_size, hop)
+    if kind == "spectrum":
+        import bands
+        return np.log1p(1000.0 * bands.band_energies(mags, sr)).astype(np.float32)
+    if kind == "mfcc":
+        import essentia.standard as es
+        mfcc = es.MFCC(inputSize=mags.shape[1], sampleRate=sr)
+        coeffs = np.array([mfcc(m)[1] for m in mags], dtype=np.float32)
+        # c0 (log energy) would dominate every cosine similarity; centre the rest
+        coeffs = coeffs[:, 1:]
+        return coeffs - coeffs.mean(axis=0)
+    raise ValueError(f"Unknown feature kind: {kind}")
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+import feature_store
+
+# -------------------------------------------------------
+# Per-stage intermediate cache
+#
+# Every pipeline stage (decode, STFT/peaks, HPCP, novelty, ...) stores
+# its output under a fingerprint of
+#     stage name + its own parameters + fingerprints of its inputs
+# so changing e.g. HPCP(size=36) -> 12 only recomputes the HPCP stage
+# and whatever depends on it; decode and peak picking come from disk.
+#
+# Outputs are dicts of numpy arrays (scalars become 0-d arrays) and are
+# written as .npz files in CACHE_DIR/<stage>/<fingerprint>.npz.
+# Large frame-level matrices can go through matrix() instead: they
+# are kept as CACHE_DIR/<stage>/<fingerprint>.feat (feature_store.py)
+# and read back through a memory map, one page of rows at a time.
+# -------------------------------------------------------
+
+CACHE_DIR = os.environ.get("ESSENTIA_CACHE_DIR", "/data/.stage_cache")
+
+
+def source_fingerprint(path):
+    """Cheap fingerprint of an input file (path, size, mtime)."""
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return value
+
+
+def fingerprint(stage, params, upstream=(), version=1):
+    """Fingerprint of one stage run: its params + the fingerprints it consumed."""
+    key = json.dumps({
+        "stage": stage,
+        "version": version,
+        "params": _jsonable(params),
+        "upstream": list(upstream),
+    }, sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+class StageCache:
+    def __init__(self, root=CACHE_DIR, enabled=True, verbose=True):
+        self.root = root
+        self.enabled = enabled
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, stage, fp):
+        return os.path.join(self.root, stage, fp + ".npz")
+
+    def run(self, stage, params, fn, upstream=(), version=1):
+        """Return (outputs, fingerprint) for a stage, computing it only on a miss.
+
+        fn() must return a dict of array-likes. `upstream` is the list of
+        fingerprints of the stages whose outputs fn() consumes.
+        """
+        fp = fingerprint(stage, params, upstream, version)
+        path = self.path(stage, fp)
+
+        if self.enabled and os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                outputs = {k: data[k] for k in data.files}
+            self.hits += 1
+            if self.verbose:
+                print(f"[cache] {stage}: hit ({fp})")
+            return outputs, fp
+
+        outputs = {k: np.asarray(v) for k, v in fn().items()}
+        self.misses += 1
+        if self.verbose:
+            print(f"[cache] {stage}: computed ({fp})")
+
+        if self.enabled:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + f".{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **outputs)
+            os.replace(tmp, path)      # atomic: concurrent runs never see half files
+        return outputs, fp
+
+    def matrix(self, stage, params, fn, upstream=(), version=1, dtype="float32", hop=None,
+               sample_rate=None):
+        """Like run() for one frame-level matrix, kept as a memory-mapped feature file.
+
+        fn() returns a (frames x dims) array. Returns (FeatureMatrix, fingerprint):
+        rows are only read from disk when indexed. dtype="float16" stores
+        per-row scaled half floats. With the cache disabled the float32
+        array itself is returned.
+        """
+        fp = fingerprint(stage, dict(params, dtype=dtype), upstream, version)
+        path = os.path.join(self.root, stage, fp + ".feat")
+
+        if self.enabled and os.path.exists(path):
+            self.hits += 1
+            if self.verbose:
+                print(f"[cache] {stage}: hit ({fp})")
+            return feature_store.open_matrix(path), fp
+
+        X = np.asarray(fn(), dtype=np.float32)
+        self.misses += 1
+        if self.verbose:
+            print(f"[cache] {stage}: computed ({fp})")
+        if not self.enabled:
+            return X, fp
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return feature_store.save(path, X, dtype, hop, sample_rate, fingerprint=fp), fp
+
+    def clear(self, stage=None):
+        target = self.root if stage is None else os.path.join(self.root, stage)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+
+    def info(self):
+        """Number of entries and bytes per stage."""
+        result = {}
+        if not os.path.isdir(self.root):
+            return result
+        for stage in sorted(os.listdir(self.root)):
+            d = os.path.join(self.root, stage)
+            if not os.path.isdir(d):
+                continue
+            files = [os.path.join(d, f) for f in os.listdir(d) if f.endswith((".npz", ".feat"))]
+            result[stage] = {"entries": len(files),
+                             "bytes": sum(os.path.getsize(f) for f in files)}
+        return result
+
+
+# -------------------------------------------------------
+# Ragged per-frame outputs (e.g. SpectralPeaks) <-> flat arrays
+# -------------------------------------------------------
+def pack_ragged(rows, dtype=np.float32):
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(r) for r in rows])
+    flat = np.concatenate(rows).astype(dtype) if len(rows) else np.zeros(0, dtype)
+    return flat, offsets
+
+
+def unpack_ragged(flat, offsets):
+    return [flat[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+# -------------------------------------------------------
+# MAIN: inspect / clear the cache
+#   python3 stage_cache.py info
+#   python3 stage_cache.py clear [stage]
+# -------------------------------------------------------
+if __name__ == "__main__":
+    cache = StageCache()
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "info"
+
+    if cmd == "clear":
+        cache.clear(sys.argv[2] if len(sys.argv) > 2 else None)
+        print("Cleared", cache.root)
+    else:
+        for stage, st in cache.info().items():
+            print(f"{stage:20s} {st['entries']:6d} entries {st['bytes'] / 1e6:10.1f} MB")
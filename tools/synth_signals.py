@@ -0,0 +1,195 @@
+import numpy as np
+
+# -------------------------------------------------------
+# Deterministic synthetic test signals with known ground truth
+#
+# Used by benchmark.py / param_sweep.py instead of /data/My_Song.wav:
+#   click_track       -> known BPM, beat and onset times, accent pattern
+#   tempo_ramp        -> click track with known tempo steps / gradual changes
+#   chord_progression -> known key/scale, chord labels and tuning offset
+#   pitch_sweep       -> known f0 curve (for Melodia / pitch trackers)
+# Every generator takes a seed, so the same call always returns the
+# same samples.
+# -------------------------------------------------------
+
+# Same spelling as Essentia's Key / ChordsDetection outputs
+NOTE_NAMES = ["A", "Bb", "B", "C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab"]
+
+MAJOR_PROGRESSION = [(0, ""), (9, "m"), (5, ""), (7, "")]     # I - vi - IV - V
+MINOR_PROGRESSION = [(0, "m"), (8, ""), (5, "m"), (7, "")]    # i - VI - iv - V (harmonic minor)
+
+
+def note_index(name):
+    return NOTE_NAMES.index(name)
+
+
+def note_freq(semitones_from_a4, tuning_hz=440.0):
+    return tuning_hz * 2.0 ** (semitones_from_a4 / 12.0)
+
+
+def _harmonic_tone(freq, n, sr, n_harmonics=6, decay=0.6, phase=0.0):
+    t = np.arange(n) / float(sr)
+    out = np.zeros(n)
+    for h in range(1, n_harmonics + 1):
+        if freq * h >= sr / 2:
+            break
+        out += decay ** (h - 1) * np.sin(2 * np.pi * freq * h * t + phase * h)
+    return out
+
+
+def _normalize(x, peak=0.8):
+    m = np.abs(x).max()
+    return (x / m * peak).astype(np.float32) if m > 0 else x.astype(np.float32)
+
+
+# -------------------------------------------------------
+# Click track
+# -------------------------------------------------------
+def click_track(bpm, duration, sr=44100, accents=(1.0, 0.5, 0.5, 0.5), offset=0.5,
+                noise_db=-50.0, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    audio = np.zeros(n)
+    beats = np.arange(offset, duration - 0.05, 60.0 / bpm)
+    click_len = int(0.03 * sr)
+    env = np.exp(-np.arange(click_len) / (0.004 * sr))
+    burst = rng.standard_normal(click_len) * env
+    gains = []
+    for i, b in enumerate(beats):
+        g = accents[i % len(accents)]
+        start = int(round(b * sr))
+        end = min(n, start + click_len)
+        audio[start:end] += g * burst[:end - start]
+        gains.append(g)
+    audio += 10 ** (noise_db / 20.0) * rng.standard_normal(n)
+    truth = {"bpm": float(bpm), "beats": beats.tolist(), "onsets": beats.tolist(),
+             "accents": gains}
+    return _normalize(audio), truth
+
+
+def tempo_ramp(segments, sr=44100, offset=0.5, noise_db=-50.0, seed=0):
+    """Click track whose tempo follows [(duration, bpm_start, bpm_end), ...] (linear ramps)."""
+    rng = np.random.default_rng(seed)
+    duration = sum(seg[0] for seg in segments)
+    n = int(duration * sr)
+    audio = np.zeros(n)
+    click_len = int(0.03 * sr)
+    burst = rng.standard_normal(click_len) * np.exp(-np.arange(click_len) / (0.004 * sr))
+
+    def bpm_at(t):
+        start = 0.0
+        for length, b0, b1 in segments:
+            if t < start + length:
+                return b0 + (b1 - b0) * (t - start) / length
+            start += length
+        return segments[-1][2]
+
+    beats = []
+    t = offset
+    while t < duration - 0.05:
+        beats.append(t)
+        start = int(round(t * sr))
+        end = min(n, start + click_len)
+        audio[start:end] += burst[:end - start]
+        t += 60.0 / bpm_at(t)
+    audio += 10 ** (noise_db / 20.0) * rng.standard_normal(n)
+    truth = {"beats": beats, "bpm_at": bpm_at, "segments": list(segments)}
+    return _normalize(audio), truth
+
+
+# -------------------------------------------------------
+# Chord progression
+# -------------------------------------------------------
+def chord_progression(key="C", scale="major", duration=30.0, sr=44100, chord_duration=2.0,
+                      tuning_cents=0.0, seed=0):
+    """Block chords (root, third, fifth + bass) cycling through a diatonic progression."""
+    rng = np.random.default_rng(seed)
+    tuning_hz = 440.0 * 2.0 ** (tuning_cents / 1200.0)
+    root = note_index(key)
+    progression = MAJOR_PROGRESSION if scale == "major" else MINOR_PROGRESSION
+
+    n = int(duration * sr)
+    seg_len = int(chord_duration * sr)
+    fade = int(0.01 * sr)
+    audio = np.zeros(n)
+    chords = []
+
+    for k, start in enumerate(range(0, n, seg_len)):
+        degree, quality = progression[k % len(progression)]
+        chord_root = (root + degree) % 12
+        third = 3 if quality == "m" else 4
+        length = min(seg_len, n - start)
+
+        # semitone offsets from A4, chord voiced around C4..C5, bass an octave down
+        base = chord_root - 12 if chord_root > 3 else chord_root
+        seg = np.zeros(length)
+        for semis, gain in ((base, 1.0), (base + third, 0.8), (base + 7, 0.8), (base - 12, 0.6)):
+            seg += gain * _harmonic_tone(note_freq(semis, tuning_hz), length, sr,
+                                         phase=rng.uniform(0, 2 * np.pi))
+        ramp = np.ones(length)
+        ramp[:fade] = np.linspace(0, 1, fade)
+        ramp[-fade:] = np.linspace(1, 0, fade)
+        audio[start:start + length] += seg * ramp
+        chords.append({"start": start / float(sr), "end": (start + length) / float(sr),
+                       "chord": NOTE_NAMES[chord_root] + quality})
+
+    audio += 1e-4 * rng.standard_normal(n)
+    truth = {"key": key, "scale": scale, "tuning_cents": float(tuning_cents),
+             "tuning_hz": float(tuning_hz), "chords": chords,
+             "boundaries": [c["start"] for c in chords[1:]]}
+    return _normalize(audio), truth
+
+
+def chord_at(truth, t):
+    for c in truth["chords"]:
+        if c["start"] <= t < c["end"]:
+            return c["chord"]
+    return None
+
+
+def chroma_template(truth, size=12):
+    """Expected pitch-class profile (HPCP bin 0 = A) of a chord progression."""
+    prof = np.zeros(12)
+    for c in truth["chords"]:
+        name = c["chord"]
+        minor = name.endswith("m")
+        root = note_index(name[:-1] if minor else name)
+        for iv in (0, 3 if minor else 4, 7):
+            prof[(root + iv) % 12] += c["end"] - c["start"]
+    if size != 12:
+        prof = np.repeat(prof, size // 12) * (np.arange(size) % (size // 12) == 0)
+    return prof / prof.max()
+
+
+# -------------------------------------------------------
+# Pitch sweep
+# -------------------------------------------------------
+def pitch_sweep(f_start=110.0, f_end=880.0, duration=10.0, sr=44100, seed=0):
+    """Exponential glide of a harmonic tone; f0 known at every sample."""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / float(sr)
+    ratio = f_end / f_start
+    f0 = f_start * ratio ** (t / duration)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    audio = np.zeros(n)
+    for h in range(1, 7):
+        audio += 0.6 ** (h - 1) * np.sin(h * phase) * (f0 * h < sr / 2)
+    audio += 1e-4 * rng.standard_normal(n)
+
+    def f0_at(times):
+        times = np.asarray(times, dtype=float)
+        return f_start * ratio ** (np.clip(times, 0, duration) / duration)
+
+    truth = {"f_start": f_start, "f_end": f_end, "duration": duration, "f0_at": f0_at}
+    return _normalize(audio), truth
+
+
+def with_silence(audio, sr, gaps, level_db=-90.0, seed=0):
+    """Replace [start, end) second ranges by near-silence (for energy-gating tests)."""
+    rng = np.random.default_rng(seed)
+    out = audio.copy()
+    for start, end in gaps:
+        a, b = int(start * sr), int(end * sr)
+        out[a:b] = 10 ** (level_db / 20.0) * rng.standard_normal(b - a)
+    return out
@@ -0,0 +1,210 @@
+import argparse
+import json
+import time
+import numpy as np
+
+import lazy
+
+try:
+    # float32 transforms: ~3x faster than numpy.fft (which always computes in float64)
+    _fft = lazy.module("scipy.fft")
+    HAVE_SCIPY = True
+except ImportError:
+    _fft = np.fft
+    HAVE_SCIPY = False
+
+# -------------------------------------------------------
+# Fast global tempo from the autocorrelation of a novelty curve
+#
+#   novelty, frame_rate = flux_novelty(audio, sr)      # or bands_novelty(bands, frame_rate)
+#   result = estimate(novelty, frame_rate)
+#   result["bpm"], result["confidence"], result["candidates"]
+#
+# 1. novelty: half-wave rectified log-magnitude flux (from a batched
+#    numpy STFT, or from FrequencyBands rows the script already has)
+# 2. autocorrelation through one zero-padded rfft, O(N log N)
+# 3. salience per lag = ac(L) + ac(2L)/2 + ac(3L)/3, weighted by a
+#    log-Gaussian tempo prior (centre prior_bpm, width in octaves)
+# 4. octave check: the faster tempo (half lag) wins when its prior-
+#    weighted salience reaches octave_ratio of the best (accented bars
+#    otherwise pull the estimate down an octave); lags are refined by
+#    parabolic interpolation
+# No Essentia needed; a 3-minute track takes well under 100 ms (audio
+# above 22.05 kHz is decimated first, onsets do not need the top octave).
+# -------------------------------------------------------
+
+
+def _frames(audio, frame_size, hop_size):
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < frame_size:
+        audio = np.pad(audio, (0, frame_size - len(audio)))
+    n = 1 + (len(audio) - frame_size) // hop_size
+    return np.lib.stride_tricks.as_strided(
+        audio, shape=(n, frame_size), strides=(audio.strides[0] * hop_size, audio.strides[0]))
+
+
+def flux_novelty(audio, sr=44100, frame_size=2048, hop_size=512, max_frequency=8000.0, block=2048):
+    """Log-compressed spectral flux; returns (novelty, frame_rate)."""
+    frames = _frames(audio, frame_size, hop_size)
+    window = np.hanning(frame_size).astype(np.float32)
+    n_bins = min(frame_size // 2 + 1, int(max_frequency * frame_size / sr) + 1)
+    novelty = np.zeros(len(frames), dtype=np.float32)
+    prev = None
+    # blocks bound the temporary spectrum matrix to block x n_bins
+    for start in range(0, len(frames), block):
+        mag = np.abs(_fft.rfft(frames[start:start + block] * window, axis=1)[:, :n_bins])
+        logmag = np.log1p(100.0 * mag)
+        if prev is not None:
+            logmag = np.vstack([prev, logmag])
+        diff = np.maximum(np.diff(logmag, axis=0), 0.0).sum(axis=1)
+        # the first block has no previous frame: its flux starts at frame 1
+        offset = start + 1 if prev is None else start
+        novelty[offset:offset + len(diff)] = diff
+        prev = logmag[-1:]
+    return novelty, sr / float(hop_size)
+
+
+def bands_novelty(bands, frame_rate):
+    """Same flux from precomputed band energies (e.g. FrequencyBands rows)."""
+    logb = np.log1p(100.0 * np.asarray(bands, dtype=np.float32))
+    novelty = np.zeros(len(logb), dtype=np.float32)
+    novelty[1:] = np.maximum(np.diff(logb, axis=0), 0.0).sum(axis=1)
+    return novelty, float(frame_rate)
+
+
+def autocorrelation(x):
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    size = 1 << int(np.ceil(np.log2(2 * n - 1)))
+    spec = np.fft.rfft(x, size)
+    ac = np.fft.irfft(spec * np.conj(spec), size)[:n]
+    # unbiased: long lags are averaged over fewer products
+    ac /= np.arange(n, 0, -1)
+    return ac / ac[0] if ac[0] > 0 else ac
+
+
+def _parabolic(y, i):
+    if 0 < i < len(y) - 1:
+        a, b, c = y[i - 1], y[i], y[i + 1]
+        den = a - 2 * b + c
+        if den < 0:
+            return i + 0.5 * (a - c) / den
+    return float(i)
+
+
+def prior_weight(bpm, prior_bpm=120.0, prior_width=1.0):
+    return np.exp(-0.5 * (np.log2(np.asarray(bpm, dtype=float) / prior_bpm) / prior_width) ** 2)
+
+
+def estimate(novelty, frame_rate, min_bpm=40.0, max_bpm=240.0, prior_bpm=120.0, prior_width=1.0,
+             octave_ratio=0.8, n_candidates=5, smooth_s=0.5):
+    novelty = np.asarray(novelty, dtype=np.float64)
+    # silent or too short: the same keys as a real estimate, all empty
+    none = {"bpm": 0.0, "confidence": 0.0, "candidates": [], "lag_bpms": np.zeros(0), "salience": np.zeros(0)}
+    if len(novelty) < 4 or not np.any(novelty > 0):
+        return none
+
+    # remove the slowly varying part (loudness changes) before correlating
+    k = min(len(novelty), max(1, int(smooth_s * frame_rate)))
+    local = np.convolve(novelty, np.ones(k) / k, mode="same")
+    onset = np.maximum(novelty - local, 0.0)
+    # widen one-frame spikes so beat periods that fall between two integer
+    # lags are not penalised against their (better aligned) multiples
+    onset = np.convolve(onset, np.hanning(7)[1:-1], mode="same")
+    ac = autocorrelation(onset)
+
+    lags = np.arange(len(ac), dtype=float)
+    lo = max(1, int(np.floor(60.0 * frame_rate / max_bpm)))
+    hi = min(len(ac) // 3 - 1, int(np.ceil(60.0 * frame_rate / min_bpm)))
+    if hi <= lo + 2:
+        return none
+
+    # harmonic salience: a beat period also correlates at 2x and 3x its lag
+    idx = np.arange(lo, hi + 1)
+    salience = ac[idx] + ac[2 * idx] / 2.0 + ac[3 * idx] / 3.0
+    salience = np.maximum(salience, 0.0)
+    bpms = 60.0 * frame_rate / lags[idx]
+    weighted = salience * prior_weight(bpms, prior_bpm, prior_width)
+
+    peaks = np.where((weighted[1:-1] > weighted[:-2]) & (weighted[1:-1] >= weighted[2:]))[0] + 1
+    if len(peaks) == 0:
+        peaks = np.array([int(np.argmax(weighted))])
+    peaks = peaks[np.argsort(-weighted[peaks])]
+
+    def lag_of(p):
+        return lo + _parabolic(weighted, p)
+
+    def strength(lag):
+        # prior-weighted salience at a fractional lag (linear interpolation)
+        i = lag - lo
+        if i < 0 or i > len(weighted) - 1:
+            return 0.0
+        return float(np.interp(i, np.arange(len(weighted)), weighted))
+
+    # octave check: the strongest peak is never beaten by its double lag,
+    # so only the half lag (double tempo) can take over
+    chosen = lag_of(peaks[0])
+    if strength(chosen / 2.0) >= octave_ratio * strength(chosen):
+        p = int(round(chosen / 2.0 - lo))
+        lo_p, hi_p = max(0, p - 2), min(len(weighted) - 1, p + 2)
+        p = lo_p + int(np.argmax(weighted[lo_p:hi_p + 1]))
+        chosen = lag_of(p)
+
+    candidates = [(60.0 * frame_rate / chosen, strength(chosen))]
+    for p in peaks:
+        bpm = 60.0 * frame_rate / lag_of(p)
+        if all(abs(np.log2(bpm / c[0])) > 0.03 for c in candidates):
+            candidates.append((bpm, float(weighted[p])))
+        if len(candidates) >= n_candidates:
+            break
+    total = sum(s for _, s in candidates)
+    candidates = [(float(b), float(s / total) if total > 0 else 0.0) for b, s in candidates]
+    return {"bpm": candidates[0][0], "confidence": candidates[0][1], "candidates": candidates,
+            "lag_bpms": bpms, "salience": weighted}
+
+
+def audio_novelty(audio, sr=44100, frame_size=None, hop_size=None, max_sr=22050):
+    """Flux novelty straight from audio; default framing is ~86 frames/s with 2x overlap."""
+    factor = max(1, int(sr // max_sr))
+    if factor > 1:
+        # pair-average decimation: crude low-pass, enough for an onset envelope
+        audio = np.asarray(audio, dtype=np.float32)
+        n = len(audio) // factor
+        audio = sum(audio[i:i + n * factor:factor] for i in range(factor)) / float(factor)
+    work_sr = sr / float(factor)
+    hop_size = hop_size // factor if hop_size else int(round(work_sr / 86.0))
+    frame_size = frame_size // factor if frame_size else 2 * hop_size
+    return flux_novelty(audio, work_sr, frame_size, hop_size)
+
+
+def estimate_tempo(audio, sr=44100, frame_size=None, hop_size=None, max_sr=22050, **kwargs):
+    novelty, frame_rate = audio_novelty(audio, sr, frame_size, hop_size, max_sr)
+    return estimate(novelty, frame_rate, **kwargs)
+
+
+# -------------------------------------------------------
+# MAIN (tempo-only mode)
+# -------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fast global tempo estimate")
+    parser.add_argument("file")
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--min-bpm", type=float, default=40.0)
+    parser.add_argument("--max-bpm", type=float, default=240.0)
+    parser.add_argument("--prior-bpm", type=float, default=120.0)
+    parser.add_argument("--json-out", default=None)
+    args = parser.parse_args()
+
+    from essentia.standard import MonoLoader
+    audio = MonoLoader(filename=args.file, sampleRate=args.sample_rate)()
+    t0 = time.perf_counter()
+    result = estimate_tempo(audio, args.sample_rate, min_bpm=args.min_bpm,
+                            max_bpm=args.max_bpm, prior_bpm=args.prior_bpm)
+    elapsed = time.perf_counter() - t0
+    print(f"BPM: {result['bpm']:.2f} (confidence {result['confidence']:.2f}, {1000 * elapsed:.1f} ms)")
+    for bpm, conf in result["candidates"]:
+        print(f"  {bpm:7.2f}  {conf:.2f}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"bpm": result["bpm"], "confidence": result["confidence"],
+                       "candidates": result["candidates"], "analysis_ms": 1000 * elapsed}, f, indent=4)
@@ -0,0 +1,231 @@
+import numpy as np
+
+from tempo import HAVE_SCIPY, audio_novelty, prior_weight, _fft
+
+# -------------------------------------------------------
+# Tempogram: tempo salience over time, from a novelty curve
+#
+#   tg = tempogram(audio, sr, kind="fourier")         # or kind="autocorrelation"
+#   tg["tempogram"]   (n_windows x n_bpms), tg["times"], tg["bpms"]
+#   tg["local_bpm"]   smoothed tempo curve, tg["changes"] tempo-change points
+#
+# All analysis windows of the novelty curve are taken at once as a
+# strided (n_windows x window) view and transformed with one batched
+# rfft; nothing loops over windows in Python.
+#   fourier         : |DFT| of each windowed novelty segment, read at the
+#                     BPM grid (zero-padded, linear interpolation between bins)
+#   autocorrelation : windowed autocorrelation (|rfft|^2 -> irfft), read at
+#                     the fractional lag of every BPM
+# The local tempo is a Viterbi path through the tempogram with a cost on
+# log-tempo jumps, so gradual changes are followed and octave flips are not.
+# -------------------------------------------------------
+
+DEFAULT_BPMS = np.arange(40.0, 240.5, 0.5)
+
+
+def window_matrix(x, win_len, hop):
+    """(n_windows x win_len) strided view, windows centred on hop multiples."""
+    x = np.asarray(x, dtype=np.float32)
+    padded = np.pad(x, (win_len // 2, win_len - win_len // 2))
+    view = np.lib.stride_tricks.sliding_window_view(padded, win_len)
+    return view[::hop][:1 + (len(x) - 1) // hop]
+
+
+def _prepare(novelty, frame_rate, window_s, hop_s):
+    win_len = max(4, int(round(window_s * frame_rate)))
+    hop = max(1, int(round(hop_s * frame_rate)))
+    frames = window_matrix(novelty, win_len, hop)
+    times = np.arange(len(frames)) * hop / float(frame_rate)
+    # local mean removed per window: the DC / lag-0 part says nothing about tempo
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    return frames, times, win_len
+
+
+def _fast_len(n):
+    # scipy pads to a 2/3/5/7-smooth size; numpy.fft is fastest on powers of two
+    if HAVE_SCIPY:
+        return _fft.next_fast_len(n, real=True)
+    return 1 << int(np.ceil(np.log2(n)))
+
+
+def _normalize_columns(tg):
+    peak = tg.max(axis=1, keepdims=True)
+    return np.divide(tg, peak, out=np.zeros_like(tg), where=peak > 0)
+
+
+def fourier_tempogram(novelty, frame_rate, window_s=8.0, hop_s=0.5, bpms=DEFAULT_BPMS,
+                      bpm_resolution=0.5):
+    frames, times, win_len = _prepare(novelty, frame_rate, window_s, hop_s)
+    frames = frames * np.hanning(win_len).astype(np.float32)
+    # zero-pad so that neighbouring rfft bins are <= bpm_resolution apart
+    n_fft = _fast_len(int(np.ceil(max(win_len, 60.0 * frame_rate / bpm_resolution))))
+    mag = np.abs(_fft.rfft(frames, n=n_fft, axis=1))
+    pos = np.asarray(bpms, dtype=float) / 60.0 * n_fft / frame_rate
+    i0 = np.minimum(pos.astype(int), mag.shape[1] - 2)
+    frac = (pos - i0).astype(np.float32)
+    tg = mag[:, i0] * (1 - frac) + mag[:, i0 + 1] * frac
+    return {"tempogram": _normalize_columns(tg), "times": times, "bpms": np.asarray(bpms, dtype=float)}
+
+
+def autocorrelation_tempogram(novelty, frame_rate, window_s=8.0, hop_s=0.5, bpms=DEFAULT_BPMS,
+                              upsample=4):
+    frames, times, win_len = _prepare(novelty, frame_rate, window_s, hop_s)
+    frames = frames * np.hanning(win_len).astype(np.float32)
+    n_fft = _fast_len(2 * win_len - 1)
+    power = np.abs(_fft.rfft(frames, n=n_fft, axis=1)) ** 2
+    # a longer inverse transform of the zero-padded power spectrum samples the
+    # autocorrelation every 1/upsample frames (band-limited interpolation):
+    # reading integer lags only would quantise the tempo to 60*frame_rate/lag
+    ac = _fft.irfft(power, n=n_fft * upsample, axis=1)[:, :win_len * upsample]
+    ac = np.maximum(ac, 0.0)
+    lags = 60.0 * frame_rate / np.asarray(bpms, dtype=float) * upsample
+    i0 = np.minimum(lags.astype(int), ac.shape[1] - 2)
+    frac = (lags - i0).astype(np.float32)
+    tg = ac[:, i0] * (1 - frac) + ac[:, i0 + 1] * frac
+    return {"tempogram": _normalize_columns(tg), "times": times, "bpms": np.asarray(bpms, dtype=float)}
+
+
+# -------------------------------------------------------
+# Local tempo curve + change points
+# -------------------------------------------------------
+def local_tempo(tg, bpms, jump_penalty=4.0, prior_bpm=120.0, prior_width=1.5):
+    """Viterbi path maximising log-salience minus jump_penalty * |log2 tempo ratio|."""
+    bpms = np.asarray(bpms, dtype=float)
+    if len(tg) == 0:
+        return np.zeros(0)
+    logb = np.log2(bpms)
+    lam = jump_penalty
+    emission = np.log(tg + 1e-3) + np.log(prior_weight(bpms, prior_bpm, prior_width))
+    idx = np.arange(len(bpms))
+
+    # max_i score_i - lam * |logb_i - logb_j| for every j in O(n_bpms): the
+    # upward part is a running max of (score + lam * logb), the downward part
+    # the same on the reversed axis (L1 distance transform)
+    def best_predecessor(score):
+        up = score + lam * logb
+        up_max = np.maximum.accumulate(up)
+        up_arg = np.maximum.accumulate(np.where(up == up_max, idx, 0))
+        down = (score - lam * logb)[::-1]
+        down_max = np.maximum.accumulate(down)
+        down_arg = (len(idx) - 1 - np.maximum.accumulate(np.where(down == down_max, idx, 0)))[::-1]
+        from_up = up_max - lam * logb
+        from_down = down_max[::-1] + lam * logb
+        use_up = from_up >= from_down
+        return np.where(use_up, from_up, from_down), np.where(use_up, up_arg, down_arg)
+
+    score = emission[0].copy()
+    back = np.zeros(tg.shape, dtype=np.int32)
+    for t in range(1, len(tg)):
+        best, back[t] = best_predecessor(score)
+        score = best + emission[t]
+    path = np.zeros(len(tg), dtype=int)
+    path[-1] = int(np.argmax(score))
+    for t in range(len(tg) - 1, 0, -1):
+        path[t - 1] = back[t, path[t]]
+
+    # sub-grid refinement: parabola through the path bin and its neighbours
+    rows = np.arange(len(tg))
+    p = np.clip(path, 1, len(bpms) - 2)
+    a, b, c = tg[rows, p - 1], tg[rows, p], tg[rows, p + 1]
+    den = a - 2 * b + c
+    shift = np.where(den < 0, 0.5 * (a - c) / np.where(den < 0, den, -1.0), 0.0)
+    step = bpms[1] - bpms[0] if len(bpms) > 1 else 0.0
+    return bpms[p] + np.clip(shift, -0.5, 0.5) * step
+
+
+def _cumulative_sums(t, y):
+    t = t - t.mean()        # same residuals, less cancellation in the sums of t^2
+    return [np.concatenate([[0.0], np.cumsum(v)]) for v in (np.ones_like(t), t, y, t * t, t * y, y * y)]
+
+
+def _segment_costs(sums, i, j):
+    """Residual sum of squares of a least-squares line on the spans [i, j) (i an array, j an int)."""
+    n, st, sy, stt, sty, syy = (c[j] - c[i] for c in sums)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_t = stt - st * st / n
+        cov = sty - st * sy / n
+        rss = syy - sy * sy / n - np.where(var_t > 1e-12, cov * cov / var_t, 0.0)
+    return np.where(n > 0, np.maximum(rss, 0.0), np.inf)
+
+
+def change_points(local_bpm, times, min_change_bpm=3.0, min_duration_s=6.0):
+    """Split the tempo curve into stretches of steady or linearly changing tempo.
+
+    Optimal piecewise-linear segmentation (dynamic programming over all
+    split points, every new segment costs a penalty of min_change_bpm^2
+    per window of min_duration_s). Returns one dict per segment with its
+    start/end time and fitted start/end tempo; "ramp" when they differ by
+    more than min_change_bpm, "steady" otherwise.
+
+    Segment costs come from cumulative sums on demand and split points
+    that can no longer start the last segment are pruned (PELT), so
+    memory stays O(n_windows) (a 2-hour mix at hop_s=0.5 is 14400).
+    """
+    y = np.asarray(local_bpm, dtype=float)
+    t = np.asarray(times, dtype=float)
+    if len(y) == 0:
+        return []
+    hop = t[1] - t[0] if len(t) > 1 else 1.0
+    min_len = max(2, int(round(min_duration_s / hop)))
+    penalty = min_change_bpm ** 2 * min_len
+    sums = _cumulative_sums(t, y)
+
+    n = len(y)
+    best = np.full(n + 1, np.inf)
+    best[0] = 0.0
+    prev = np.zeros(n + 1, dtype=int)
+    # PELT: once best[i] + cost(i, j) > best[j], the split at j beats the one at i
+    # for every later end (a line cost never drops when a span is split), so i is
+    # dropped; with segments of at least min_len that holds from j + min_len on
+    candidates = np.zeros(1, dtype=int)         # split points, ascending
+    expiry = np.full(1, n + 1)                  # first end at which each one is dropped
+    for j in range(min_len, n + 1):
+        keep = expiry > j
+        candidates, expiry = candidates[keep], expiry[keep]
+        i = candidates[candidates <= j - min_len]
+        if len(i) == 0:
+            continue
+        fit = best[i] + _segment_costs(sums, i, j)
+        total = fit + penalty
+        k = int(np.argmin(total))
+        best[j], prev[j] = total[k], i[k]
+        beaten = fit > best[j]
+        expiry[:len(i)][beaten] = np.minimum(expiry[:len(i)][beaten], j + min_len)
+        if np.isfinite(best[j]):
+            candidates, expiry = np.append(candidates, j), np.append(expiry, n + 1)
+    if not np.isfinite(best[n]):
+        bounds = [0, n]
+    else:
+        bounds = [n]
+        while bounds[-1] > 0:
+            bounds.append(prev[bounds[-1]])
+        bounds = bounds[::-1]
+
+    segments = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        seg_t, seg_b = t[a:b], y[a:b]
+        if len(seg_t) >= 2 and np.ptp(seg_t) > 0:
+            slope, icpt = np.polyfit(seg_t, seg_b, 1)
+            b0, b1 = slope * seg_t[0] + icpt, slope * seg_t[-1] + icpt
+        else:
+            b0 = b1 = float(np.median(seg_b))
+        segments.append({"start": float(seg_t[0]), "end": float(seg_t[-1]),
+                         "bpm_start": float(b0), "bpm_end": float(b1),
+                         "kind": "ramp" if abs(b1 - b0) > min_change_bpm else "steady"})
+    return segments
+
+
+def tempogram(audio, sr=44100, kind="fourier", window_s=8.0, hop_s=0.5, bpms=DEFAULT_BPMS,
+              jump_penalty=4.0, min_change_bpm=3.0, min_duration_s=6.0):
+    """Novelty -> tempogram -> local tempo curve -> change points, in one call."""
+    novelty, frame_rate = audio_novelty(audio, sr)
+    if kind == "fourier":
+        out = fourier_tempogram(novelty, frame_rate, window_s, hop_s, bpms)
+    elif kind == "autocorrelation":
+        out = autocorrelation_tempogram(novelty, frame_rate, window_s, hop_s, bpms)
+    else:
+        raise ValueError(f"Unknown tempogram kind: {kind}")
+    out["local_bpm"] = local_tempo(out["tempogram"], out["bpms"], jump_penalty)
+    out["changes"] = change_points(out["local_bpm"], out["times"], min_change_bpm, min_duration_s)
+    out["novelty"], out["frame_rate"] = novelty, frame_rate
+    return out